@@ -0,0 +1,196 @@
+"""Columnar writer of selected series to Parquet, Feather or Arrow IPC.
+
+The `time` coordinate and the values of a selected series are wrapped in
+Arrow buffers without copying, as long as they are contiguous NumPy arrays of
+a fixed-width type, and written with the requested compression. Batches of
+selections, ex. one series per location, are written to a single dataset
+partitioned by their scalar coordinates.
+"""
+from __future__ import annotations
+from pathlib import Path
+from typing import Iterable
+from typing import List
+from typing import Optional
+from typing import Tuple
+import uuid
+import numpy as np
+import pyarrow as pa
+import pyarrow.feather as feather
+import pyarrow.parquet as pq
+import xarray
+from .constants import ARROW_COMPRESSION_DEFAULT
+from .models import ArrowFormat
+
+__all__ = ("to_arrow",)
+
+
+ARROW_FORMAT_SUFFIXES = {
+    '.parquet': ArrowFormat.parquet,
+    '.parq': ArrowFormat.parquet,
+    '.feather': ArrowFormat.feather,
+    '.arrow': ArrowFormat.ipc,
+    '.ipc': ArrowFormat.ipc,
+}
+NO_COMPRESSION = {None, 'none', 'uncompressed'}
+
+
+def numpy_to_arrow(array: np.ndarray) -> pa.Array:
+    """Wrap a 1-D NumPy array in an Arrow array.
+
+    Fixed-width numeric and datetime64 arrays share their memory with the
+    Arrow array. Other types, ex. booleans or strings, are converted.
+    """
+    array = np.ascontiguousarray(array)  # copies only non-contiguous arrays
+    try:
+        arrow_type = pa.from_numpy_dtype(array.dtype)
+    except (pa.ArrowNotImplementedError, NotImplementedError):
+        return pa.array(array)
+    if not pa.types.is_primitive(arrow_type) or pa.types.is_boolean(arrow_type):
+        return pa.array(array)
+    return pa.Array.from_buffers(arrow_type, len(array), [None, pa.py_buffer(array)])
+
+
+def get_scalar_coordinates(x: xarray.DataArray | xarray.Dataset) -> dict:
+    """Return the scalar coordinates of a DataArray, ex. the `lon` and `lat`
+    of a series selected at a location"""
+    return {
+        coordinate: x[coordinate].values.item()
+        for coordinate in x.coords
+        if x[coordinate].ndim == 0
+    }
+
+
+def data_array_to_arrow_table(x: xarray.DataArray | xarray.Dataset) -> pa.Table:
+    """Convert a DataArray to an Arrow table, one column per dimension
+    coordinate plus one for the values. Attributes and scalar coordinates are
+    stored in the schema metadata.
+
+    :param x:
+        :class:`~xarray.DataArray`, typically a time series at a location, or
+        a :class:`~xarray.Dataset` of variables sharing their dimensions, ex.
+        several aggregations of a resampled series, one column each
+    """
+    variables = dict(x.data_vars) if isinstance(x, xarray.Dataset) else {x.name or 'values': x}
+    template = next(iter(variables.values()))
+    columns = {}
+    for axis, dimension in enumerate(template.dims):
+        coordinate = x[dimension].values if dimension in x.coords else np.arange(template.shape[axis])
+        if template.ndim > 1:  # outer product of the coordinates, in C order
+            shape = [1] * template.ndim
+            shape[axis] = -1
+            coordinate = np.broadcast_to(coordinate.reshape(shape), template.shape).ravel()
+        columns[dimension] = numpy_to_arrow(coordinate)
+    for name, variable in variables.items():
+        columns[str(name)] = numpy_to_arrow(variable.transpose(*template.dims).values.ravel())
+
+    metadata = {str(key): str(value) for key, value in x.attrs.items()}
+    metadata.update({key: str(value) for key, value in get_scalar_coordinates(x).items()})
+    return pa.table(columns).replace_schema_metadata(metadata)
+
+
+def infer_arrow_format(path: str | Path) -> ArrowFormat:
+    """Infer the output format from the suffix of `path`, Parquet if unknown"""
+    return ARROW_FORMAT_SUFFIXES.get(Path(path).suffix.lower(), ArrowFormat.parquet)
+
+
+def write_arrow_table(
+    table: pa.Table,
+    path: str | Path,
+    output_format: ArrowFormat = ArrowFormat.parquet,
+    compression: Optional[str] = ARROW_COMPRESSION_DEFAULT,
+) -> None:
+    """Write an Arrow table to a single Parquet, Feather or Arrow IPC file"""
+    path = str(path)
+    if output_format == ArrowFormat.parquet:
+        pq.write_table(table, path, compression='none' if compression in NO_COMPRESSION else compression)
+    elif output_format == ArrowFormat.feather:
+        feather.write_feather(table, path, compression='uncompressed' if compression in NO_COMPRESSION else compression)
+    else:
+        options = pa.ipc.IpcWriteOptions(compression=None if compression in NO_COMPRESSION else compression)
+        with pa.OSFile(path, 'wb') as sink:
+            with pa.ipc.new_file(sink, table.schema, options=options) as writer:
+                writer.write_table(table)
+
+
+def write_arrow_dataset(
+    tables: Iterable[Tuple[dict, pa.Table]],
+    path: str | Path,
+    output_format: ArrowFormat = ArrowFormat.parquet,
+    compression: Optional[str] = ARROW_COMPRESSION_DEFAULT,
+) -> List[Path]:
+    """Write Arrow tables to a single Hive-partitioned dataset.
+
+    Each table is written to `<path>/<key>=<value>/.../<uuid>.<extension>`
+    for the (key, value) pairs of its partition. Files of earlier batches are
+    kept, hence repeated selections append to the same dataset, readable via
+    `pyarrow.dataset.dataset(path, partitioning='hive')`.
+    """
+    extension = 'parquet' if output_format == ArrowFormat.parquet else 'arrow'
+    files = []
+    for partition, table in tables:
+        directory = Path(path).joinpath(*(f'{key}={value}' for key, value in partition.items()))
+        directory.mkdir(parents=True, exist_ok=True)
+        filename = directory / f'{uuid.uuid4().hex}.{extension}'
+        write_arrow_table(
+            table,
+            path=filename,
+            output_format=output_format,
+            compression=compression,
+        )
+        files.append(filename)
+    return files
+
+
+def to_arrow(
+    x: xarray.DataArray | xarray.Dataset | Iterable[xarray.DataArray],
+    path: str | Path,
+    *,
+    output_format: Optional[ArrowFormat] = None,
+    compression: Optional[str] = ARROW_COMPRESSION_DEFAULT,
+    partition: bool = False,
+) -> None:
+    """Write selected series to Parquet, Feather or Arrow IPC.
+
+    :param x:
+        :class:`~xarray.DataArray`, a :class:`~xarray.Dataset` or a batch of
+        DataArrays, ex. the series selected at several locations
+    :param str path:
+        Output file path, or the base directory of a partitioned dataset
+    :param output_format:
+        One of :class:`~rekx.models.ArrowFormat`. Inferred from the suffix
+        of `path` if not given.
+    :param str compression:
+        Compression codec, ex. 'zstd', 'lz4', 'snappy' (Parquet only) or
+        'none'
+    :param bool partition:
+        If True, or if `x` is a batch, write a dataset partitioned by the
+        scalar coordinates of the series, ex. `lon` and `lat`
+    """
+    output_format = ArrowFormat(output_format) if output_format else infer_arrow_format(path)
+    single = isinstance(x, (xarray.DataArray, xarray.Dataset))
+    if single and not partition:
+        write_arrow_table(
+            data_array_to_arrow_table(x),
+            path=path,
+            output_format=output_format,
+            compression=compression,
+        )
+        return
+
+    data_arrays = [x] if single else x
+    write_arrow_dataset(
+        (
+            (
+                {
+                    coordinate: value
+                    for coordinate, value in get_scalar_coordinates(data_array).items()
+                    if coordinate != 'time'  # a single selected timestamp
+                },
+                data_array_to_arrow_table(data_array),
+            )
+            for data_array in data_arrays
+        ),
+        path=path,
+        output_format=output_format,
+        compression=compression,
+    )
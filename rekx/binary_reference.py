@@ -0,0 +1,270 @@
+"""Compact binary reference sets with constant-time chunk lookups.
+
+A binary reference set is a directory holding, for each variable, its chunk
+grid as a dense NumPy array of `(file, offset, length)` records indexed by
+chunk coordinates, and a small `index.json` with the table of referenced
+paths, the Zarr metadata and the few chunks not referenced by a byte range,
+ex. inlined ones. The arrays are memory-mapped, hence opening a reference set
+parses only its index and looking up a chunk reference is an array index,
+whereas a JSON reference set is parsed as a whole and a Parquet one record by
+record.
+
+Reference sets convert to and from Kerchunk's JSON and Parquet formats.
+"""
+from collections.abc import Mapping
+from pathlib import Path
+from typing import Dict
+from typing import Iterator
+from typing import Optional
+from typing import Sequence
+from typing import Tuple
+from typing import Union
+import math
+import fsspec
+import numpy as np
+import typer
+import ujson
+from fsspec.implementations.reference import LazyReferenceMapper
+from rich import print
+from typing_extensions import Annotated
+from .hardcodings import check_mark
+from .journal import atomic_output
+from .models import ReferenceFormat
+from .parquet import write_parquet_references
+from .reference import encode_inline_data
+
+
+BINARY_REFERENCE_VERSION = 1
+INDEX_FILENAME = 'index.json'
+REFERENCE_DTYPE = np.dtype([('file', '<u4'), ('offset', '<u8'), ('length', '<u8')])
+MISSING = np.iinfo(np.uint32).max  # no chunk, ex. filled with the fill value
+IRREGULAR = MISSING - 1  # inlined or whole-file chunk, in the index
+
+
+def is_metadata_key(key: str) -> bool:
+    """Whether a key is Zarr metadata, ex. `.zgroup` or `SIS/.zarray`"""
+    return key.rpartition('/')[2].startswith('.')
+
+
+def get_chunk_grid(zarray: dict) -> Tuple[int, ...]:
+    """Number of chunks along each dimension, a single one for scalars"""
+    return tuple(
+        math.ceil(length / chunk) if chunk else 1
+        for length, chunk in zip(zarray['shape'], zarray['chunks'])
+    ) or (1,)
+
+
+def split_chunk_key(
+    key: str,
+    separators: Dict[str, str],
+) -> Tuple[Optional[str], Optional[Tuple[int, ...]]]:
+    """Split a chunk key, ex. `SIS/3.0.1`, into its variable and chunk
+    coordinates given the dimension separator of each variable"""
+    variable = key.rpartition('/')[0]
+    while variable not in separators and '/' in variable:  # `/` separator
+        variable = variable.rpartition('/')[0]
+    if variable not in separators:
+        return None, None
+    chunk = key[len(variable) + 1:]
+    try:
+        return variable, tuple(int(index) for index in chunk.split(separators[variable]))
+    except ValueError:
+        return None, None
+
+
+def write_binary_references(references: dict, output: Path) -> Path:
+    """Write a Kerchunk reference set as a binary reference set
+
+    Parameters
+    ----------
+    references: dict
+        Kerchunk reference set, with or without the `refs` level
+    output: Path
+        Directory of the binary reference set, replaced if it exists
+    """
+    refs = references.get('refs', references)
+    metadata = {}
+    zarrays = {}
+    for key, value in refs.items():
+        if is_metadata_key(key):
+            metadata[key] = value if isinstance(value, str) else ujson.dumps(value)
+            if key.endswith('/.zarray'):
+                zarrays[key[: -len('/.zarray')]] = ujson.loads(metadata[key])
+    separators = {
+        variable: zarray.get('dimension_separator') or '.'
+        for variable, zarray in zarrays.items()
+    }
+    arrays = {}
+    for variable, zarray in zarrays.items():
+        arrays[variable] = np.zeros(get_chunk_grid(zarray), dtype=REFERENCE_DTYPE)
+        arrays[variable]['file'] = MISSING
+    irregular = {variable: {} for variable in zarrays}
+    paths = {}
+    for key, value in refs.items():
+        if is_metadata_key(key):
+            continue
+        variable, indices = split_chunk_key(key, separators)
+        if variable is None:
+            raise ValueError(f"Reference {key} belongs to no variable")
+        if isinstance(value, (list, tuple)) and len(value) == 3:
+            file = paths.setdefault(value[0], len(paths))
+            arrays[variable][indices] = (file, value[1], value[2])
+        else:
+            arrays[variable][indices] = (IRREGULAR, 0, 0)
+            if isinstance(value, bytes):
+                value = encode_inline_data(value)
+            irregular[variable][key[len(variable) + 1:]] = value
+
+    index = {
+        'version': BINARY_REFERENCE_VERSION,
+        'paths': list(paths),
+        'metadata': metadata,
+        'variables': [
+            {
+                'name': variable,
+                'grid': list(arrays[variable].shape),
+                'separator': separators[variable],
+                'irregular': irregular[variable],
+            }
+            for variable in arrays
+        ],
+    }
+    with atomic_output(output) as temporary_output:
+        temporary_output.mkdir(parents=True)
+        for number, variable in enumerate(arrays):
+            np.save(temporary_output / f'{number}.npy', arrays[variable])
+        with open(temporary_output / INDEX_FILENAME, 'w') as index_file:
+            ujson.dump(index, index_file)
+    return output
+
+
+class BinaryReferences(Mapping):
+    """Read-only mapping of a binary reference set, as Kerchunk references
+
+    Parameters
+    ----------
+    path: Path
+        Directory of the binary reference set
+    """
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        with open(self.path / INDEX_FILENAME) as index_file:
+            index = ujson.load(index_file)
+        if index['version'] != BINARY_REFERENCE_VERSION:
+            raise ValueError(f"Unsupported binary reference version {index['version']}")
+        self.paths = index['paths']
+        self.metadata = index['metadata']
+        self.variables = {variable['name']: variable for variable in index['variables']}
+        self.numbers = {variable['name']: number for number, variable in enumerate(index['variables'])}
+        self.separators = {name: variable['separator'] for name, variable in self.variables.items()}
+        self._arrays = {}
+
+    def chunks(self, variable: str) -> np.ndarray:
+        """Memory-mapped chunk grid of a variable"""
+        if variable not in self._arrays:
+            self._arrays[variable] = np.load(
+                self.path / f'{self.numbers[variable]}.npy',
+                mmap_mode='r',
+            )
+        return self._arrays[variable]
+
+    def lookup(self, variable: str, indices: Sequence[int]) -> Union[list, str, None]:
+        """Reference of the chunk of a variable at the given chunk
+        coordinates, None if missing"""
+        chunks = self.chunks(variable)
+        reference = chunks[tuple(indices)]
+        file = int(reference['file'])
+        if file == MISSING:
+            return None
+        if file == IRREGULAR:
+            chunk = self.separators[variable].join(map(str, indices))
+            return self.variables[variable]['irregular'][chunk]
+        return [self.paths[file], int(reference['offset']), int(reference['length'])]
+
+    def __getitem__(self, key: str):
+        if key in self.metadata:
+            return self.metadata[key]
+        variable, indices = split_chunk_key(key, self.separators)
+        if variable is None:
+            raise KeyError(key)
+        try:
+            reference = self.lookup(variable, indices)
+        except IndexError:
+            raise KeyError(key)
+        if reference is None:
+            raise KeyError(key)
+        return reference
+
+    def __iter__(self) -> Iterator[str]:
+        yield from self.metadata
+        for variable in self.variables:
+            separator = self.separators[variable]
+            chunks = self.chunks(variable)
+            for indices in np.argwhere(chunks['file'] != MISSING):
+                yield f"{variable}/{separator.join(map(str, indices.tolist()))}"
+
+    def __len__(self) -> int:
+        return len(self.metadata) + sum(
+            int(np.count_nonzero(self.chunks(variable)['file'] != MISSING))
+            for variable in self.variables
+        )
+
+    def to_references(self) -> dict:
+        """Kerchunk reference set"""
+        return {'version': 1, 'refs': dict(self.items())}
+
+
+def get_reference_format(path: Path) -> ReferenceFormat:
+    """Format of a reference set, from its content if it exists, else from
+    its suffix"""
+    path = Path(path)
+    if (path / INDEX_FILENAME).exists():
+        return ReferenceFormat.binary
+    if path.is_dir() or path.suffix in ('.parquet', '.parq'):
+        return ReferenceFormat.parquet
+    if path.suffix == '.json':
+        return ReferenceFormat.json
+    return ReferenceFormat.binary
+
+
+def load_references(path: Path) -> dict:
+    """Load a JSON, Parquet or binary reference set as a Kerchunk reference set"""
+    path = Path(path)
+    reference_format = get_reference_format(path)
+    if reference_format == ReferenceFormat.binary:
+        return BinaryReferences(path).to_references()
+    if reference_format == ReferenceFormat.parquet:
+        mapper = LazyReferenceMapper(root=str(path), fs=fsspec.filesystem('file'))
+        refs = {}
+        for key in mapper:
+            if key == '.zmetadata':  # index of the Parquet store, written along
+                continue
+            value = mapper[key]
+            if isinstance(value, bytes):
+                value = encode_inline_data(value)
+            elif isinstance(value, (list, tuple)):  # NumPy integers out of Parquet
+                value = [str(value[0]), *map(int, value[1:])]
+            refs[key] = value
+        return {'version': 1, 'refs': refs}
+    with open(path) as json_file:
+        return ujson.load(json_file)
+
+
+def convert_references(
+    input: Annotated[Path, typer.Argument(help='JSON, Parquet or binary reference set')],
+    output: Annotated[Path, typer.Argument(help='Converted reference set')],
+    format: Annotated[Optional[ReferenceFormat], typer.Option(help='Format of the output, by default from its suffix : [code].json[/code], [code].parquet[/code] or binary otherwise')] = None,
+):
+    """Convert a reference set between the JSON, Parquet and binary formats"""
+    references = load_references(input)
+    format = format or get_reference_format(output)
+    if format == ReferenceFormat.binary:
+        write_binary_references(references, output)
+    elif format == ReferenceFormat.parquet:
+        with atomic_output(output) as temporary_output:
+            write_parquet_references(references, temporary_output)
+    else:
+        with atomic_output(output) as temporary_output:
+            with open(temporary_output, 'w') as json_file:
+                ujson.dump(references, json_file)
+    print(f"{check_mark} Converted [code]{input}[/code] to [code]{output}[/code] ({format.value})")
@@ -0,0 +1,408 @@
+"""Caching of decompressed chunks for the reference-based readers.
+
+Kerchunk references point to compressed byte ranges inside the original
+NetCDF/HDF5 files. Every time a chunk is requested, Zarr fetches the byte
+range and decompresses it again, even when the very same chunk has been
+decoded moments before for a neighbouring site or timestamp.
+
+The `DecompressingReferenceStore` wraps the Zarr store of a reference set,
+decodes each chunk once using the codecs declared in the `.zarray` metadata
+and keeps the decoded chunk in a `ChunkCache`. The metadata served to Zarr is
+stripped from its compressor and filters, hence Zarr reads the cached chunks
+as-is without decoding them a second time.
+
+Cached chunks are keyed on the fingerprint of the reference set, hence
+chunks decoded before a reference set is regenerated are not served again
+and age out of the bounded spill directory.
+"""
+from collections import OrderedDict
+from pathlib import Path
+from threading import Lock
+from typing import Optional
+from typing import Tuple
+from typing import Union
+import hashlib
+import json
+import os
+import fsspec
+import numcodecs
+from numcodecs.compat import ensure_contiguous_ndarray
+import numpy as np
+from zarr.abc.store import Store
+from zarr.core.buffer import BufferPrototype
+from zarr.storage import FsspecStore
+from zarr.storage import WrapperStore
+from .constants import CHUNK_CACHE_SIZE_DEFAULT
+from .constants import CHUNK_CACHE_SPILL_SIZE_DEFAULT
+from .constants import DISK_CACHE_SIZE_DEFAULT
+from .journal import fingerprint
+
+
+ChunkKey = Tuple[str, str, str]  # (reference fingerprint, variable, chunk key)
+
+
+class ChunkCache:
+    """Bounded in-memory LRU cache of decompressed chunks.
+
+    Chunks are evicted in least-recently-used order once the total size of
+    the cached chunks exceeds `maximum_size` bytes. If a `cache_directory` is
+    given, evicted chunks are spilled to it and read back from there on a
+    later request instead of being fetched and decompressed again. Spilled
+    chunks are in turn removed least-recently-used first once they exceed
+    `maximum_spill_size` bytes.
+
+    Parameters
+    ----------
+    maximum_size: int
+        Maximum size of the in-memory cache in bytes
+    cache_directory: Path, optional
+        Local directory to spill evicted chunks to
+    maximum_spill_size: int
+        Maximum size of the spilled chunks in bytes
+    """
+
+    def __init__(
+        self,
+        maximum_size: int,
+        cache_directory: Optional[Path] = None,
+        maximum_spill_size: int = CHUNK_CACHE_SPILL_SIZE_DEFAULT,
+    ):
+        self.maximum_size = maximum_size
+        self.maximum_spill_size = maximum_spill_size
+        self.cache_directory = Path(cache_directory) if cache_directory else None
+        if self.cache_directory:
+            self.cache_directory.mkdir(parents=True, exist_ok=True)
+        self.size = 0
+        self.hits = 0
+        self.spill_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._chunks = OrderedDict()
+        self._spill_size = None
+        self._lock = Lock()
+
+    def __len__(self):
+        return len(self._chunks)
+
+    def __contains__(self, key: ChunkKey):
+        return key in self._chunks or (
+            self.cache_directory is not None and self._spill_path(key).exists()
+        )
+
+    def _spill_path(self, key: ChunkKey) -> Path:
+        digest = hashlib.sha1('\x00'.join(key).encode()).hexdigest()
+        return self.cache_directory / f'{digest}.npy'
+
+    def get(self, key: ChunkKey) -> Optional[np.ndarray]:
+        """Return a cached chunk or `None`, counting hits and misses"""
+        with self._lock:
+            chunk = self._chunks.get(key)
+            if chunk is not None:
+                self._chunks.move_to_end(key)
+                self.hits += 1
+                return chunk
+
+        if self.cache_directory is not None:
+            spill_path = self._spill_path(key)
+            try:
+                chunk = np.load(spill_path)
+            except (FileNotFoundError, ValueError):  # evicted meanwhile
+                chunk = None
+            if chunk is not None:
+                os.utime(spill_path)  # mark as recently used
+                self.spill_hits += 1
+                self.put(key, chunk)
+                return chunk
+
+        self.misses += 1
+        return None
+
+    def put(self, key: ChunkKey, chunk: np.ndarray) -> None:
+        """Add a chunk to the cache and evict least-recently-used chunks"""
+        if chunk.nbytes > self.maximum_size:
+            self._spill(key, chunk)
+            return
+
+        chunk.setflags(write=False)  # shared among readers
+        evicted = []
+        with self._lock:
+            if key in self._chunks:
+                self.size -= self._chunks.pop(key).nbytes
+            self._chunks[key] = chunk
+            self.size += chunk.nbytes
+            while self.size > self.maximum_size:
+                evicted_key, evicted_chunk = self._chunks.popitem(last=False)
+                self.size -= evicted_chunk.nbytes
+                self.evictions += 1
+                evicted.append((evicted_key, evicted_chunk))
+
+        for evicted_key, evicted_chunk in evicted:
+            self._spill(evicted_key, evicted_chunk)
+
+    def _spill(self, key: ChunkKey, chunk: np.ndarray) -> None:
+        if self.cache_directory is None:
+            return
+        spill_path = self._spill_path(key)
+        if spill_path.exists():
+            return
+        temporary_path = spill_path.with_name(f'{spill_path.stem}.{os.getpid()}.tmp')
+        with open(temporary_path, 'wb') as spill_file:
+            np.save(spill_file, chunk)
+        temporary_path.replace(spill_path)
+        with self._lock:
+            if self._spill_size is None:
+                self._spill_size = sum(path.stat().st_size for path in self.cache_directory.glob('*.npy'))
+            else:
+                self._spill_size += spill_path.stat().st_size
+            full = self._spill_size > self.maximum_spill_size
+        if full:
+            self.evict_spilled()
+
+    def evict_spilled(self) -> int:
+        """Remove least-recently-used spilled chunks down to the maximum
+        spill size, returning the number of bytes removed"""
+        entries = []
+        for path in self.cache_directory.glob('*.npy'):
+            try:
+                status = path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((status.st_mtime, status.st_size, path))
+        entries.sort()
+        total_size = sum(size for _, size, _ in entries)
+        removed = 0
+        for _, size, path in entries:
+            if total_size - removed <= self.maximum_spill_size:
+                break
+            path.unlink(missing_ok=True)
+            removed += size
+        with self._lock:
+            self._spill_size = total_size - removed
+        return removed
+
+    def clear(self) -> None:
+        with self._lock:
+            self._chunks.clear()
+            self.size = 0
+
+    def statistics(self) -> dict:
+        """Return the cache counters"""
+        requests = self.hits + self.spill_hits + self.misses
+        return {
+            'Chunks': len(self._chunks),
+            'Size': self.size,
+            'Maximum size': self.maximum_size,
+            'Hits': self.hits,
+            'Spill hits': self.spill_hits,
+            'Misses': self.misses,
+            'Evictions': self.evictions,
+            'Hit ratio': (self.hits + self.spill_hits) / requests if requests else 0,
+        }
+
+
+_chunk_cache = None
+
+
+def get_chunk_cache(
+    maximum_size: int,
+    cache_directory: Optional[Path] = None,
+    maximum_spill_size: int = CHUNK_CACHE_SPILL_SIZE_DEFAULT,
+) -> ChunkCache:
+    """Return the chunk cache shared by all selections in this process.
+
+    The shared cache is recreated only if the requested sizes or spill
+    directory differ from the existing one.
+    """
+    global _chunk_cache
+    cache_directory = Path(cache_directory) if cache_directory else None
+    if (
+        _chunk_cache is None
+        or _chunk_cache.maximum_size != maximum_size
+        or _chunk_cache.maximum_spill_size != maximum_spill_size
+        or _chunk_cache.cache_directory != cache_directory
+    ):
+        _chunk_cache = ChunkCache(
+            maximum_size=maximum_size,
+            cache_directory=cache_directory,
+            maximum_spill_size=maximum_spill_size,
+        )
+    return _chunk_cache
+
+
+def fingerprint_reference(reference: Path) -> str:
+    """Identify a reference set by its path, size and modification time,
+    which change whenever it is regenerated"""
+    reference = Path(reference).resolve()
+    return f'{reference}@{fingerprint(reference)}'
+
+
+def split_chunk_key(key: str) -> Tuple[str, str]:
+    """Split a Zarr key, ex. 'SIS/0.12.4', into variable and chunk key"""
+    variable, _, chunk_key = key.rpartition('/')
+    return variable, chunk_key
+
+
+def is_metadata_key(key: str) -> bool:
+    """Check if a Zarr key refers to metadata, ex. '.zarray' or '.zattrs'"""
+    return split_chunk_key(key)[1].startswith('.')
+
+
+class DecompressingReferenceStore(WrapperStore):
+    """Read-only Zarr store serving decompressed chunks out of a `ChunkCache`.
+
+    Parameters
+    ----------
+    store: Store
+        The Zarr store of the Kerchunk reference set, ex. an `FsspecStore` of
+        a `ReferenceFileSystem`
+    reference: str
+        Fingerprint of the reference set, part of the cache keys, see
+        `fingerprint_reference`
+    cache: ChunkCache
+        The cache of decompressed chunks
+    """
+
+    def __init__(
+        self,
+        store: Store,
+        reference: str,
+        cache: ChunkCache,
+    ):
+        super().__init__(store)
+        self.reference = str(reference)
+        self.cache = cache
+        self.cache_title = 'Decompressed chunks'
+        self._codecs = {}
+
+    def _with_store(self, store: Store) -> "DecompressingReferenceStore":
+        return type(self)(store=store, reference=self.reference, cache=self.cache)
+
+    async def read_zarray(self, variable: str, prototype: BufferPrototype) -> dict:
+        return json.loads((await self._store.get(f'{variable}/.zarray', prototype)).to_bytes())
+
+    async def codecs(self, variable: str, prototype: BufferPrototype) -> tuple:
+        """Return the decoding pipeline of a variable, compressor first, and
+        its data type"""
+        if variable not in self._codecs:
+            zarray = await self.read_zarray(variable, prototype)
+            codecs = [numcodecs.get_codec(codec) for codec in zarray.get('filters') or []]
+            if zarray.get('compressor'):
+                codecs.append(numcodecs.get_codec(zarray['compressor']))
+            self._codecs[variable] = (
+                list(reversed(codecs)),
+                np.dtype(zarray['dtype']),
+            )
+        return self._codecs[variable]
+
+    async def decode(self, variable: str, data: bytes, prototype: BufferPrototype) -> np.ndarray:
+        codecs, dtype = await self.codecs(variable, prototype)
+        for codec in codecs:
+            data = codec.decode(data)
+        return ensure_contiguous_ndarray(data).view(dtype)
+
+    async def get(self, key: str, prototype: BufferPrototype, byte_range=None):
+        variable, chunk_key = split_chunk_key(key)
+        if chunk_key == '.zarray':
+            if not await self._store.exists(key):
+                return None
+            zarray = await self.read_zarray(variable, prototype)
+            zarray['compressor'] = None
+            zarray['filters'] = None
+            return prototype.buffer.from_bytes(json.dumps(zarray).encode())
+
+        if not variable or is_metadata_key(key) or byte_range is not None:  # partial reads of shards only
+            return await self._store.get(key, prototype, byte_range)
+
+        cache_key = (self.reference, variable, chunk_key)
+        chunk = self.cache.get(cache_key)
+        if chunk is None:
+            buffer = await self._store.get(key, prototype)
+            if buffer is None:  # missing chunks hold the fill value
+                return None
+            chunk = await self.decode(variable, buffer.to_bytes(), prototype)
+            self.cache.put(cache_key, chunk)
+        return prototype.buffer.from_array_like(chunk.reshape(-1).view(np.uint8))
+
+    async def set(self, key, value):
+        raise PermissionError('The decompressing reference store is read-only')
+
+    async def delete(self, key):
+        raise PermissionError('The decompressing reference store is read-only')
+
+
+def collect_cache_statistics(store: Union[Store, fsspec.FSMap]) -> dict:
+    """Collect the counters of each caching layer of a reference store"""
+    cache_statistics = {}
+    while hasattr(store, 'cache'):
+        cache_statistics[store.cache_title] = store.cache.statistics()
+        store = store._store
+    return cache_statistics
+
+
+REFERENCE_SUFFIXES = {'.json', '.parquet', '.parq'}
+
+
+def is_reference_set(path: Path) -> bool:
+    """Whether a path is a JSON, Parquet or binary reference set, not a
+    NetCDF file"""
+    from .binary_reference import INDEX_FILENAME
+
+    path = Path(path)
+    return path.suffix in REFERENCE_SUFFIXES or (path / INDEX_FILENAME).exists()
+
+
+def open_reference_mapper(
+    reference: Path,
+    chunk_cache_size: int = CHUNK_CACHE_SIZE_DEFAULT,
+    chunk_cache_directory: Optional[Path] = None,
+    disk_cache_directory: Optional[Path] = None,
+    disk_cache_size: int = DISK_CACHE_SIZE_DEFAULT,
+) -> Union[Store, fsspec.FSMap]:
+    """Open a JSON, Parquet or binary reference set for Xarray's Zarr engine.
+
+    Without caching, returns the mapper of the reference set. If
+    `disk_cache_directory` is given, raw byte ranges are read from and
+    stored to a persistent local `ByteRangeCache`. If `chunk_cache_size` is
+    greater than 0, the store is further wrapped in a
+    `DecompressingReferenceStore` backed by the shared chunk cache. Chunks
+    of a binary reference set are looked up in its memory-mapped chunk grids.
+    """
+    from .binary_reference import INDEX_FILENAME
+    from .binary_reference import BinaryReferences
+
+    references = str(reference)
+    if (Path(reference) / INDEX_FILENAME).exists():
+        references = BinaryReferences(reference)
+    mapper = fsspec.get_mapper(
+        "reference://",
+        fo=references,
+        remote_protocol="file",
+        remote_options={"skip_instance_cache": True},
+    )
+    if not chunk_cache_size and not disk_cache_directory:
+        return mapper
+
+    store = FsspecStore.from_mapper(mapper, read_only=True)
+    if disk_cache_directory:
+        from .disk_cache import ByteRangeCache
+        from .disk_cache import CachingByteRangeStore
+
+        store = CachingByteRangeStore(
+            store=store,
+            cache=ByteRangeCache(
+                cache_directory=disk_cache_directory,
+                maximum_size=disk_cache_size,
+            ),
+        )
+    if not chunk_cache_size:
+        return store
+
+    cache = get_chunk_cache(
+        maximum_size=chunk_cache_size,
+        cache_directory=chunk_cache_directory,
+    )
+    return DecompressingReferenceStore(
+        store=store,
+        reference=fingerprint_reference(reference),
+        cache=cache,
+    )
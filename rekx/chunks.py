@@ -0,0 +1,289 @@
+"""Chunk grid geometry of variables in Kerchunk reference sets.
+
+Helpers to translate selections in coordinate space (locations, bounding
+boxes, time ranges) into integer index ranges, the index ranges into the keys
+of the chunks that overlap them and the chunk keys into the byte ranges they
+refer to in the source files. Time selections are applied by integer
+position so that only the overlapping time chunks are read.
+"""
+from collections.abc import MutableMapping
+from itertools import product
+from typing import Dict
+from typing import Iterable
+from typing import List
+from typing import Optional
+from typing import Tuple
+import json
+import numpy as np
+import pandas as pd
+import xarray as xr
+
+
+SPATIAL_DIMENSIONS = [('lon', 'lat'), ('longitude', 'latitude')]
+
+
+def read_zarray(mapper: MutableMapping, variable: str) -> dict:
+    """Read the Zarr array metadata of a variable"""
+    return json.loads(mapper[f'{variable}/.zarray'])
+
+
+def read_array_dimensions(mapper: MutableMapping, variable: str) -> List[str]:
+    """Read the dimension names of a variable, ex. ['time', 'lat', 'lon']"""
+    zattrs = json.loads(mapper[f'{variable}/.zattrs'])
+    return zattrs['_ARRAY_DIMENSIONS']
+
+
+def get_spatial_dimensions(dimensions: Iterable[str]) -> Tuple[str, str]:
+    """Return the names of the (x, y) dimensions among `dimensions`"""
+    for x, y in SPATIAL_DIMENSIONS:
+        if {x, y} <= set(dimensions):
+            return x, y
+    raise ValueError(f'No known spatial dimensions among {list(dimensions)}')
+
+
+def nearest_indices(index: pd.Index, values: Iterable) -> np.ndarray:
+    """Return the integer positions of the labels nearest to `values`"""
+    return index.get_indexer(list(values), method='nearest')
+
+
+def range_indices(index: pd.Index, minimum, maximum) -> Tuple[int, int]:
+    """Return the first and last integer positions of labels within
+    [minimum, maximum], for ascending or descending coordinates.
+
+    Sorted coordinates are searched by bisection, unsorted ones scanned.
+    """
+    if index.is_monotonic_increasing:
+        start, stop = index.slice_locs(minimum, maximum)
+    elif index.is_monotonic_decreasing:
+        start, stop = index.slice_locs(maximum, minimum)
+    else:
+        values = index.values
+        positions = np.flatnonzero(
+            (values >= np.asarray(minimum, dtype=values.dtype))
+            & (values <= np.asarray(maximum, dtype=values.dtype))
+        )
+        start, stop = (positions[0], positions[-1] + 1) if positions.size else (0, 0)
+    if start >= stop:
+        raise ValueError(f'No coordinates within [{minimum}, {maximum}]')
+    return int(start), int(stop) - 1
+
+
+def chunk_range(start: int, stop: int, chunk_size: int) -> range:
+    """Return the chunk indices overlapping the inclusive index range
+    [start, stop] of a dimension chunked by `chunk_size`"""
+    return range(start // chunk_size, stop // chunk_size + 1)
+
+
+def get_chunk_sizes(data_array: xr.DataArray) -> Dict[str, int]:
+    """Return the chunk size per dimension of a variable as stored.
+
+    Read from the encoding of the variable, the `chunks` of the `.zarray` for
+    Kerchunk references and Zarr stores or the `chunksizes` of netCDF4
+    files. Contiguous dimensions count as a single chunk.
+    """
+    chunks = data_array.encoding.get('chunks') or data_array.encoding.get('chunksizes')
+    if not chunks or len(chunks) != data_array.ndim:
+        return dict(data_array.sizes)
+    return dict(zip(data_array.dims, chunks))
+
+
+def time_chunk_slice(
+    data_array: xr.DataArray,
+    start_time=None,
+    end_time=None,
+) -> Tuple[slice, range]:
+    """Resolve a time range to the integer slice of the timestamps within
+    [start_time, end_time] and the range of time chunks it overlaps. Open
+    ends extend to the start or end of the series."""
+    time_index = data_array.indexes['time']
+    try:
+        first, last = range_indices(
+            time_index,
+            start_time if start_time is not None else time_index.min(),
+            end_time if end_time is not None else time_index.max(),
+        )
+    except ValueError:
+        return slice(0, 0), range(0)
+    chunk_size = get_chunk_sizes(data_array)['time']
+    return slice(first, last + 1), chunk_range(first, last, chunk_size)
+
+
+def select_time_chunks(
+    data_array: xr.DataArray,
+    start_time=None,
+    end_time=None,
+    timestamps=None,
+    method: Optional[str] = None,
+) -> Tuple[xr.DataArray, List[int]]:
+    """Select a time range or timestamps by integer position.
+
+    Labels are resolved once against the time index into the time chunks
+    they overlap. A time range is read as a single slice, timestamps as one
+    slice per run of consecutive chunks, hence only the overlapping chunks
+    are fetched and decoded.
+
+    Parameters
+    ----------
+    data_array: xr.DataArray
+        Variable with a `time` dimension, ex. a series at a location
+    start_time, end_time: optional
+        Inclusive bounds of a time range, either of which may be omitted
+    timestamps: optional
+        Timestamps to select instead of a range
+    method: str, optional
+        Method for inexact matches of `timestamps`, ex. 'nearest'
+
+    Returns
+    -------
+    tuple
+        The selection and the indices of the time chunks it reads
+
+    Raises
+    ------
+    KeyError
+        If one or more `timestamps` cannot be matched
+    """
+    if timestamps is None:
+        positions, time_chunks = time_chunk_slice(data_array, start_time, end_time)
+        return data_array.isel(time=positions), list(time_chunks)
+
+    method = getattr(method, 'value', method)
+    labels = pd.DatetimeIndex(np.atleast_1d(timestamps))
+    positions = data_array.indexes['time'].get_indexer(labels, method=method)
+    if (positions < 0).any():
+        raise KeyError(f'{list(labels[positions < 0])} not found in time')
+    chunk_size = get_chunk_sizes(data_array)['time']
+    time_chunks = chunk_indices(positions, chunk_size)
+    if np.ndim(timestamps) == 0:
+        return data_array.isel(time=int(positions[0])), time_chunks
+
+    spans = []
+    for run in chunk_runs(time_chunks):
+        inside = positions[(positions >= run.start * chunk_size) & (positions < run.stop * chunk_size)]
+        spans.append(range(int(inside.min()), int(inside.max()) + 1))
+    selection = xr.concat(
+        [data_array.isel(time=slice(span.start, span.stop)) for span in spans],
+        dim='time',
+    )
+    spanned = np.concatenate([np.arange(span.start, span.stop) for span in spans])
+    return selection.isel(time=np.searchsorted(spanned, positions)), time_chunks
+
+
+def chunk_indices(positions: Iterable[int], chunk_size: int) -> List[int]:
+    """Return the sorted unique chunk indices of integer positions"""
+    return sorted({int(position) // chunk_size for position in positions})
+
+
+def chunk_runs(chunks: List[int]) -> List[range]:
+    """Group sorted chunk indices into runs of consecutive chunks, ex.
+    [0, 1, 2, 5, 6] into [range(0, 3), range(5, 7)]"""
+    runs = []
+    for chunk in chunks:
+        if runs and chunk == runs[-1].stop:
+            runs[-1] = range(runs[-1].start, chunk + 1)
+        else:
+            runs.append(range(chunk, chunk + 1))
+    return runs
+
+
+def generate_chunk_keys(
+    variable: str,
+    chunk_indices_per_dimension: List[Iterable[int]],
+    separator: str = '.',
+) -> List[str]:
+    """Generate the Zarr keys of all combinations of chunk indices"""
+    return [
+        f'{variable}/' + separator.join(map(str, chunk))
+        for chunk in product(*chunk_indices_per_dimension)
+    ]
+
+
+def select_chunk_keys(
+    mapper: MutableMapping,
+    variable: str,
+    index_ranges: Dict[str, Tuple[int, int]],
+    points: Optional[Dict[str, List[int]]] = None,
+) -> List[str]:
+    """Select the keys of the chunks of `variable` overlapping a selection.
+
+    Parameters
+    ----------
+    mapper: MutableMapping
+        The mapper of the Kerchunk reference set
+    variable: str
+        Name of the variable
+    index_ranges: dict
+        Inclusive integer index ranges per dimension, ex. {'time': (0, 23)}.
+        Dimensions not listed are selected entirely.
+    points: dict, optional
+        Groups of integer positions selected together, ex. locations as
+        {'lon': [10, 12], 'lat': [4, 7]} select (10, 4) and (12, 7).
+
+    Returns
+    -------
+    list of str
+        Sorted unique chunk keys
+    """
+    zarray = read_zarray(mapper, variable)
+    dimensions = read_array_dimensions(mapper, variable)
+    separator = zarray.get('dimension_separator', '.')
+    points = points or {}
+
+    # Chunk indices of point selections are combined element-wise
+    point_dimensions = [dimension for dimension in dimensions if dimension in points]
+    point_chunks = sorted({
+        tuple(
+            int(position) // zarray['chunks'][dimensions.index(dimension)]
+            for dimension, position in zip(point_dimensions, point)
+        )
+        for point in zip(*(points[dimension] for dimension in point_dimensions))
+    })
+
+    keys = set()
+    for point_chunk in point_chunks or [()]:
+        chunks_per_dimension = []
+        for axis, dimension in enumerate(dimensions):
+            chunk_size = zarray['chunks'][axis]
+            if dimension in point_dimensions:
+                chunks_per_dimension.append([point_chunk[point_dimensions.index(dimension)]])
+            elif dimension in index_ranges:
+                chunks_per_dimension.append(chunk_range(*index_ranges[dimension], chunk_size))
+            else:
+                chunks_per_dimension.append(range(-(-zarray['shape'][axis] // chunk_size)))
+        keys.update(generate_chunk_keys(variable, chunks_per_dimension, separator))
+
+    return sorted(keys)
+
+
+def get_byte_ranges(
+    references: MutableMapping,
+    keys: Iterable[str],
+) -> List[Tuple[str, str, int, int]]:
+    """Return the (key, url, offset, length) of keys referring to byte
+    ranges, skipping missing keys and inlined data"""
+    byte_ranges = []
+    for key in keys:
+        try:
+            reference = references[key]
+        except KeyError:
+            continue  # missing chunks hold the fill value
+        if isinstance(reference, (list, tuple)) and len(reference) == 3:
+            url, offset, length = reference
+            byte_ranges.append((key, url, int(offset), int(length)))
+    return byte_ranges
+
+
+def coalesce_byte_ranges(
+    byte_ranges: Iterable[Tuple[int, int]],
+    gap: int = 0,
+) -> List[Tuple[int, int]]:
+    """Merge (offset, length) ranges of a single file that overlap or lie
+    within `gap` bytes of each other"""
+    merged = []
+    for offset, length in sorted(byte_ranges):
+        if merged and offset <= merged[-1][0] + merged[-1][1] + gap:
+            last_offset, last_length = merged[-1]
+            merged[-1] = (last_offset, max(last_length, offset + length - last_offset))
+        else:
+            merged.append((offset, length))
+    return merged
@@ -8,18 +8,25 @@ from .diagnose import get_netcdf_metadata
 from .diagnose import collect_netcdf_metadata
 from .diagnose import diagnose_chunking_shapes
 from .diagnose import determine_common_chunking_layout
+from .compression import codecs_benchmark
 from .consistency import check_chunk_consistency
 from .consistency import check_chunk_consistency_json
 from .suggest import suggest_chunking_shape
 from .suggest import suggest_chunking_shape_alternative
 from .suggest import suggest_chunking_shape_alternative_symmetrical
+from .suggest import suggest_chunking_shapes_for_workload
 from .rechunk import modify_chunk_size
 from .rechunk import rechunk
 from .rechunk import generate_rechunk_commands
 from .rechunk import generate_rechunk_commands_for_multiple_netcdf
+from .cluster import rechunk_multiple_netcdf
 from .reference import create_kerchunk_reference
+from .reference import reference_benchmark
+from .binary_reference import convert_references
+from .verify import verify
 from .parquet import parquet_reference
 from .parquet import parquet_multi_reference
+from .parquet import parquet_reference_benchmark
 from .combine import combine_kerchunk_references
 from .combine import combine_kerchunk_references_to_parquet
 from .parquet import combine_parquet_stores_to_parquet
@@ -28,8 +35,13 @@ from .select import select_fast
 from .select import select_time_series
 from .select import select_time_series_from_json
 from .select import select_time_series_from_json_in_memory
+from .select import select_site_statistics
 from .parquet import select_from_parquet
 from .parquet import read_from_parquet
+from .disk_cache import inspect_disk_cache
+from .disk_cache import warm_disk_cache
+from .disk_cache import purge_disk_cache
+from .warm import warm
 from .rich_help_panel_names import rich_help_panel_diagnose
 from .rich_help_panel_names import rich_help_panel_suggest
 from .rich_help_panel_names import rich_help_panel_rechunking
@@ -37,6 +49,7 @@ from .rich_help_panel_names import rich_help_panel_reference
 from .rich_help_panel_names import rich_help_panel_combine
 from .rich_help_panel_names import rich_help_panel_select
 from .rich_help_panel_names import rich_help_panel_select_references
+from .rich_help_panel_names import rich_help_panel_cache
 from rekx.messages import NOT_IMPLEMENTED_CLI
 
 
@@ -111,6 +124,12 @@ app.command(
     no_args_is_help=True,
     rich_help_panel=rich_help_panel_diagnose,
 )(check_chunk_consistency_json)
+app.command(
+    name='codecs',
+    help='Benchmark compression ratio and throughput of codecs over sampled chunks of a variable',
+    no_args_is_help=True,
+    rich_help_panel=rich_help_panel_diagnose,
+)(codecs_benchmark)
 
 # suggest
 
@@ -132,6 +151,12 @@ app.command(
     help='Suggest a good chunking shape [red]Merge to [code]suggest[/code][/red]',
     rich_help_panel=rich_help_panel_suggest,
 )(suggest_chunking_shape_alternative_symmetrical)
+app.command(
+    name="suggest-search",
+    no_args_is_help=True,
+    help='Rank chunking shapes by the chunks and bytes read by a mix of series, map and scan queries',
+    rich_help_panel=rich_help_panel_suggest,
+)(suggest_chunking_shapes_for_workload)
 
 # rechunk 
 
@@ -159,6 +184,12 @@ app.command(
     no_args_is_help=True,
     rich_help_panel=rich_help_panel_rechunking,
 )(generate_rechunk_commands_for_multiple_netcdf)
+app.command(
+    name="rechunk-multiple",
+    help=f'Rechunk multiple files as tasks of a local or remote Dask cluster',
+    no_args_is_help=True,
+    rich_help_panel=rich_help_panel_rechunking,
+)(rechunk_multiple_netcdf)
 
 # create reference sets
 
@@ -180,6 +211,30 @@ app.command(
     no_args_is_help=True,
     rich_help_panel=rich_help_panel_reference,
 )(parquet_multi_reference)
+app.command(
+    "reference-benchmark",
+    help='Benchmark the executors of [code]reference[/code] on existing or synthetic NetCDF files',
+    no_args_is_help=False,
+    rich_help_panel=rich_help_panel_reference,
+)(reference_benchmark)
+app.command(
+    "reference-parquet-benchmark",
+    help='Benchmark the size, open time and lookup latency of Parquet references by record size and path encoding',
+    no_args_is_help=True,
+    rich_help_panel=rich_help_panel_reference,
+)(parquet_reference_benchmark)
+app.command(
+    "reference-convert",
+    help='Convert reference sets between the JSON, Parquet and memory-mapped binary formats',
+    no_args_is_help=True,
+    rich_help_panel=rich_help_panel_reference,
+)(convert_references)
+app.command(
+    "verify",
+    help='Verify the chunks of a reference set against its source files',
+    no_args_is_help=True,
+    rich_help_panel=rich_help_panel_reference,
+)(verify)
 
 # combine reference sets
 
@@ -234,6 +289,12 @@ app.command(
     no_args_is_help=True,
     rich_help_panel=rich_help_panel_select_references,
 )(select_time_series_from_json_in_memory)
+app.command(
+    name='select-statistics',
+    help='  Calculate statistics of time series over many locations at once',
+    no_args_is_help=True,
+    rich_help_panel=rich_help_panel_select,
+)(select_site_statistics)
 app.command(
     name='select-parquet',
     help=f" Select data from a Parquet references store",
@@ -247,6 +308,43 @@ app.command(
     rich_help_panel=rich_help_panel_select_references,
 )(read_from_parquet)
 
+# cache
+
+cache_app = typer.Typer(
+    cls=OrderCommands,
+    add_completion=True,
+    add_help_option=True,
+    no_args_is_help=True,
+    rich_markup_mode="rich",
+    help='Inspect, warm and purge a local cache of chunk byte ranges',
+)
+cache_app.command(
+    name='inspect',
+    help='Inspect the source files and size of a local chunk cache',
+    no_args_is_help=True,
+)(inspect_disk_cache)
+cache_app.command(
+    name='warm',
+    help='Copy the byte ranges of a reference set into a local chunk cache',
+    no_args_is_help=True,
+)(warm_disk_cache)
+cache_app.command(
+    name='purge',
+    help='Purge a local chunk cache entirely, or only stale, old or least-recently-used byte ranges',
+    no_args_is_help=True,
+)(purge_disk_cache)
+app.command(
+    name='warm',
+    help='Read ahead the chunks a selection over locations or a bounding box and a time range will need',
+    no_args_is_help=True,
+    rich_help_panel=rich_help_panel_cache,
+)(warm)
+app.add_typer(
+    cache_app,
+    name='cache',
+    rich_help_panel=rich_help_panel_cache,
+)
+
 
 if __name__ == "__main__":
     app()
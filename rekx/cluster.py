@@ -0,0 +1,258 @@
+"""Rechunk many files on a Dask cluster.
+
+Each file is a task of a Dask graph, submitted to a local cluster by default
+or to the scheduler of an existing cluster. Tasks are prioritised largest
+file first and, where workers declare their memory as a resource, annotated
+with the memory they are estimated to require, hence a worker runs only as
+many of them as its memory allows. Completed files are recorded in a journal,
+so that an interrupted run resumes where it stopped.
+"""
+from contextlib import contextmanager
+from pathlib import Path
+from typing import List
+from typing import Optional
+from typing_extensions import Annotated
+import os
+import netCDF4 as nc
+import numpy as np
+import typer
+import xarray as xr
+from rich import print
+from .constants import VERBOSE_LEVEL_DEFAULT
+from .constants import ZARR_FORMAT_DEFAULT
+from .hardcodings import check_mark
+from .hardcodings import x_mark
+from .journal import fingerprint
+from .journal import open_journal
+from .log import logger
+from .models import XarrayVariableSet
+from .models import select_xarray_variable_set_from_dataset
+from .progress import progress
+from .rechunk import CACHE_ELEMENTS_DEFAULT
+from .rechunk import CACHE_PREEMPTION_DEFAULT
+from .rechunk import CACHE_SIZE_DEFAULT
+from .rechunk import COMPRESSION_FILTER_DEFAULT
+from .rechunk import COMPRESSION_LEVEL_DEFAULT
+from .rechunk import QUANTIZE_MODE_DEFAULT
+from .rechunk import RECHUNK_IN_MEMORY_DEFAULT
+from .rechunk import SHUFFLING_DEFAULT
+from .rechunk import RechunkingBackend
+from .rechunk import RechunkingOutputFormat
+from .rechunk import ZarrBackend
+from .rechunk import build_output_filename
+from .rechunk import parse_chunks
+from .typer_parameters import typer_option_dry_run
+from .typer_parameters import typer_option_journal
+from .typer_parameters import typer_option_resume
+from .typer_parameters import typer_option_number_of_workers
+from .typer_parameters import typer_option_verbose
+
+
+MEMORY_RESOURCE = 'MEMORY'
+
+
+@contextmanager
+def get_dask_client(
+    dask_scheduler: Optional[str] = None,
+    workers: Optional[int] = None,
+    memory_limit: Optional[int] = None,
+):
+    """Connect to the Dask scheduler at `dask_scheduler`, ex.
+    `tcp://10.0.0.1:8786`, or start a local cluster if None or `local`.
+
+    Workers of the local cluster run a single thread each, as HDF5 serialises
+    access within a process, and split the memory of the machine, or
+    `memory_limit` bytes in total, which they declare as a resource.
+    """
+    from dask.distributed import Client
+    from dask.distributed import LocalCluster
+
+    if dask_scheduler and dask_scheduler != 'local':
+        with Client(dask_scheduler) as client:
+            yield client
+        return
+
+    import psutil
+
+    workers = workers or os.cpu_count()
+    memory_per_worker = (memory_limit or psutil.virtual_memory().total) // workers
+    with LocalCluster(
+        n_workers=workers,
+        threads_per_worker=1,
+        memory_limit=memory_per_worker,
+        resources={MEMORY_RESOURCE: memory_per_worker},
+    ) as cluster, Client(cluster) as client:
+        yield client
+
+
+def estimate_rechunk_memory(
+    input: Path,
+    time: Optional[int] = None,
+    cache_size: Optional[int] = CACHE_SIZE_DEFAULT,
+    memory: bool = RECHUNK_IN_MEMORY_DEFAULT,
+) -> int:
+    """Estimate the memory required to rechunk a file in bytes.
+
+    In memory, the uncompressed size of all variables. Otherwise, the largest
+    slab of `time` steps of a variable, plus the chunk cache.
+    """
+    with nc.Dataset(input, mode='r') as dataset:
+        sizes = []
+        for variable in dataset.variables.values():
+            size = int(np.prod(variable.shape, dtype=np.int64)) * variable.dtype.itemsize
+            if not memory and variable.shape and variable.shape[0]:
+                size = size * min(time or variable.shape[0], variable.shape[0]) // variable.shape[0]
+            sizes.append(size)
+    if memory:
+        return sum(sizes)
+    return max(sizes, default=0) + (cache_size or 0)
+
+
+def rechunk_file(
+    input: Path,
+    variable_set: XarrayVariableSet,
+    backend: RechunkingBackend,
+    format: RechunkingOutputFormat,
+    parameters: dict,
+):
+    """Rechunk the selected variables of a single file, as a task of a Dask
+    worker"""
+    with xr.open_dataset(input, engine="netcdf4") as dataset:
+        variables = select_xarray_variable_set_from_dataset(
+            XarrayVariableSet, variable_set, dataset
+        )
+    backend = ZarrBackend() if format == RechunkingOutputFormat.zarr else backend.get_backend()
+    return backend.rechunk(input=input, variables=list(variables), dry_run=False, **parameters)
+
+
+def rechunk_multiple_netcdf(
+    file_paths: Annotated[List[Path], typer.Argument(help="Input NetCDF files.")],
+    output_directory: Annotated[Path, typer.Argument(help="Directory of the rechunked files.")],
+    time: Annotated[int, typer.Option(help="New chunk size for the `time` dimension.")],
+    latitude: Annotated[int, typer.Option(help="New chunk size for the `lat` dimension.")],
+    longitude: Annotated[int, typer.Option(help="New chunk size for the `lon` dimension.")],
+    variable_set: Annotated[XarrayVariableSet, typer.Option(help="Set of Xarray variables to rechunk")] = XarrayVariableSet.all,
+    cache_size: Optional[int] = CACHE_SIZE_DEFAULT,
+    cache_elements: Optional[int] = CACHE_ELEMENTS_DEFAULT,
+    cache_preemption: Optional[float] = CACHE_PREEMPTION_DEFAULT,
+    compression: Annotated[str, typer.Option(help="Compression filter, see [code]rechunk[/code]")] = COMPRESSION_FILTER_DEFAULT,
+    compression_level: int = COMPRESSION_LEVEL_DEFAULT,
+    shuffling: Annotated[bool, typer.Option(help="Shuffle bytes before compressing, internally for Blosc filters")] = SHUFFLING_DEFAULT,
+    least_significant_digit: Annotated[Optional[int], typer.Option(help="Quantize floating point values to this decimal digit")] = None,
+    significant_digits: Annotated[Optional[int], typer.Option(help="Quantize floating point values to this number of significant digits. Requires the [code]netCDF4[/code] backend")] = None,
+    quantize_mode: Annotated[str, typer.Option(help="Quantization algorithm for significant digits : BitGroom, GranularBitRound or BitRound")] = QUANTIZE_MODE_DEFAULT,
+    memory: bool = RECHUNK_IN_MEMORY_DEFAULT,
+    backend: Annotated[RechunkingBackend, typer.Option(help="Backend to use for rechunking, [code]nccopy[/code] or [code]netCDF4[/code]")] = RechunkingBackend.nccopy,
+    format: Annotated[RechunkingOutputFormat, typer.Option(help="Output format")] = RechunkingOutputFormat.netcdf,
+    zarr_format: Annotated[int, typer.Option(help="Zarr format version, 2 or 3")] = ZARR_FORMAT_DEFAULT,
+    shards: Annotated[Optional[str], typer.Option(help="Comma-separated shard lengths along time, lat and lon. Requires Zarr v3")] = None,
+    dask_scheduler: Annotated[Optional[str], typer.Option(help="Address of the Dask scheduler, ex. [code]tcp://10.0.0.1:8786[/code]. A local cluster by default")] = None,
+    workers: Annotated[Optional[int], typer_option_number_of_workers] = None,
+    memory_limit: Annotated[Optional[str], typer.Option(help="Memory shared by the workers of the local cluster, ex. [code]64GiB[/code]. All of the memory by default")] = None,
+    journal: Annotated[Optional[Path], typer_option_journal] = None,
+    resume: Annotated[bool, typer_option_resume] = True,
+    dry_run: Annotated[bool, typer_option_dry_run] = False,
+    verbose: Annotated[int, typer_option_verbose] = VERBOSE_LEVEL_DEFAULT,
+):
+    """Rechunk many NetCDF files as tasks of a Dask cluster"""
+    parameters = {
+        "output_directory": output_directory,
+        "time": time,
+        "latitude": latitude,
+        "longitude": longitude,
+        "compression": compression,
+        "compression_level": compression_level,
+        "shuffling": shuffling,
+        "least_significant_digit": least_significant_digit,
+        "significant_digits": significant_digits,
+    }
+    if format == RechunkingOutputFormat.zarr:
+        parameters["zarr_format"] = zarr_format
+        parameters["shards"] = parse_chunks(shards) if shards else None
+    else:
+        parameters.update({
+            "cache_size": cache_size,
+            "cache_elements": cache_elements,
+            "cache_preemption": cache_preemption,
+            "quantize_mode": quantize_mode,
+            "memory": memory,
+        })
+        if backend == RechunkingBackend.netcdf4:
+            parameters["workers"] = 1  # parallel across files instead
+
+    journal = open_journal('rechunk', output_directory, journal, resume)
+    pending = {}
+    for input in sorted(file_paths, key=os.path.getsize, reverse=True):
+        output_filename = build_output_filename(
+            input=input,
+            time=time,
+            latitude=latitude,
+            longitude=longitude,
+            compression=compression,
+            compression_level=compression_level,
+            shuffling=shuffling,
+            least_significant_digit=least_significant_digit,
+            significant_digits=significant_digits if backend == RechunkingBackend.netcdf4 else None,
+        )
+        if format == RechunkingOutputFormat.zarr:
+            output_filename = Path(output_filename).with_suffix('.zarr')
+        output_filepath = output_directory / output_filename
+        if journal.is_complete(output_filepath, fingerprint(input)):
+            logger.info(f"Skipping {input}, rechunked already into {output_filepath}")
+            continue
+        pending[input] = output_filepath
+
+    if dry_run:
+        journal.close()
+        print(f"[bold]Dry run[/bold] of [bold]operations that would be performed[/bold]:")
+        print(f"> Rechunking {len(pending)} of {len(file_paths)} files into [code]{output_directory}[/code]")
+        return  # Exit for a dry run
+
+    from dask.distributed import as_completed
+    from dask.utils import parse_bytes
+
+    memory_limit = parse_bytes(memory_limit) if memory_limit else None
+    failed = []
+    with journal, get_dask_client(dask_scheduler, workers=workers, memory_limit=memory_limit) as client:
+        if verbose:
+            print(f"Dask dashboard at {client.dashboard_link}")
+        declared = [
+            worker.get('resources', {}).get(MEMORY_RESOURCE)
+            for worker in client.scheduler_info()['workers'].values()
+        ]
+        largest_memory = max(declared) if declared and all(declared) else None
+        futures = {}
+        for input in pending:
+            resources = None
+            if largest_memory:
+                estimate = estimate_rechunk_memory(input, time=time, cache_size=cache_size, memory=memory)
+                resources = {MEMORY_RESOURCE: min(estimate, largest_memory)}  # else never scheduled
+            future = client.submit(
+                rechunk_file,
+                input,
+                variable_set,
+                backend,
+                format,
+                parameters,
+                key=f"rechunk-{input.name}",
+                priority=os.path.getsize(input),
+                resources=resources,
+                pure=False,
+            )
+            futures[future] = input
+
+        with progress:
+            task = progress.add_task("Rechunking", total=len(futures))
+            for future in as_completed(futures):
+                input = futures[future]
+                try:
+                    future.result()
+                    journal.record(pending[input], fingerprint(input), pending[input])
+                except Exception as exception:
+                    logger.error(f"Error rechunking {input} : {exception}")
+                    failed.append(input)
+                progress.update(task, advance=1)
+
+    print(f"{check_mark} Rechunked {len(pending) - len(failed)} files into [code]{output_directory}[/code], skipped {len(file_paths) - len(pending)}")
+    if failed:
+        print(f"{x_mark} Failed to rechunk {len(failed)} files : {', '.join(map(str, failed))}")
@@ -11,9 +11,23 @@ from .typer_parameters import typer_argument_kerchunk_combined_reference
 from .rich_help_panel_names import rich_help_panel_combine
 from rekx.typer_parameters import typer_option_verbose
 from rekx.constants import VERBOSE_LEVEL_DEFAULT
+from .typer_parameters import typer_option_journal
+from .typer_parameters import typer_option_resume
+from .typer_parameters import typer_option_inline_threshold
+from .typer_parameters import typer_option_inline_coordinates
+from .journal import atomic_output
+from .journal import fingerprint
+from .journal import open_journal
+from .hardcodings import check_mark
+from .constants import INLINE_THRESHOLD_DEFAULT
+from .reference import get_reference_options_digest
+from .reference import inline_coordinates as inline_coordinate_variables
+from .parquet import write_parquet_references
+from typing import Optional
 import fsspec
 import ujson
 import kerchunk
+import xarray as xr
 from rich import print
 
 
@@ -36,11 +50,20 @@ def combine_kerchunk_references(
     source_directory: Annotated[Path, typer_argument_source_directory],
     pattern: Annotated[str, typer_option_filename_pattern] = "*.json",
     combined_reference: Annotated[Path, typer_argument_kerchunk_combined_reference] = "combined_kerchunk.json",
+    inline_threshold: Annotated[int, typer_option_inline_threshold] = INLINE_THRESHOLD_DEFAULT,
+    inline_coordinates: Annotated[bool, typer_option_inline_coordinates] = True,
+    journal: Annotated[Optional[Path], typer_option_journal] = None,
+    resume: Annotated[bool, typer_option_resume] = True,
     dry_run: Annotated[bool, typer_option_dry_run] = False,
     verbose: Annotated[int, typer_option_verbose] = VERBOSE_LEVEL_DEFAULT,
 ):
     """Combine multiple JSON references into a single logical aggregate
-    dataset using Kerchunk's `MultiZarrToZarr` function"""
+    dataset using Kerchunk's `MultiZarrToZarr` function
+
+    The concatenated `time` coordinate is written as a single inlined chunk
+    and, with `inline_coordinates`, so are the other coordinates, hence
+    opening the combined reference reads none of the referenced files.
+    """
 
     mode = DisplayMode(verbose)
     with display_context[mode]:
@@ -56,18 +79,30 @@ def combine_kerchunk_references(
             print(f"> Writing combined reference file to [code]{combined_reference}[/code]")
             return  # Exit for a dry run
 
-        from kerchunk.combine import MultiZarrToZarr
-        mzz = MultiZarrToZarr(
-            reference_file_paths,
-            concat_dims=['time'],
-            identical_dims=['lat', 'lon'],
-        )
-        multifile_kerchunk = mzz.translate()
-
         combined_reference_filename = Path(combined_reference)
-        local_fs = fsspec.filesystem('file')
-        with local_fs.open(combined_reference_filename, 'wb') as f:
-            f.write(ujson.dumps(multifile_kerchunk).encode())
+        options = get_reference_options_digest(inline_threshold, inline_coordinates)
+        with open_journal(f'combine-{options}', combined_reference_filename.parent, journal, resume) as journal:
+            sources_fingerprint = fingerprint(reference_file_paths)
+            if journal.is_complete(combined_reference_filename, sources_fingerprint):
+                print(f"{check_mark} Combined reference [code]{combined_reference}[/code] is up to date")
+                return
+
+            from kerchunk.combine import MultiZarrToZarr
+            mzz = MultiZarrToZarr(
+                reference_file_paths,
+                concat_dims=['time'],
+                identical_dims=['lat', 'lon'],
+                inline_threshold=inline_threshold,
+            )
+            multifile_kerchunk = mzz.translate()
+            if inline_coordinates:
+                inline_coordinate_variables(multifile_kerchunk)
+
+            local_fs = fsspec.filesystem('file')
+            with atomic_output(combined_reference_filename) as temporary_filename:
+                with local_fs.open(str(temporary_filename), 'wb') as f:
+                    f.write(ujson.dumps(multifile_kerchunk).encode())
+            journal.record(combined_reference_filename, sources_fingerprint, combined_reference_filename)
 
 
 # @app.command(
@@ -80,10 +115,19 @@ def combine_kerchunk_references_to_parquet(
     source_directory: Annotated[Path, typer_argument_source_directory],
     pattern: Annotated[str, typer_option_filename_pattern] = "*.json",
     combined_reference: Annotated[Path, typer_argument_kerchunk_combined_reference] = "combined_kerchunk.parq",
+    record_size: Annotated[Optional[int], typer.Option(help='References per record of the Parquet store. As many as the chunks of the largest variable by default')] = None,
+    inline_threshold: Annotated[int, typer_option_inline_threshold] = INLINE_THRESHOLD_DEFAULT,
+    inline_coordinates: Annotated[bool, typer_option_inline_coordinates] = True,
+    journal: Annotated[Optional[Path], typer_option_journal] = None,
+    resume: Annotated[bool, typer_option_resume] = True,
     dry_run: Annotated[bool, typer_option_dry_run] = False,
     verbose: Annotated[int, typer_option_verbose] = VERBOSE_LEVEL_DEFAULT,
 ):
-    """Combine multiple JSON references into a single Parquet store using Kerchunk's `MultiZarrToZarr` function"""
+    """Combine multiple JSON references into a single Parquet store using Kerchunk's `MultiZarrToZarr` function
+
+    Inlined coordinates are stored as raw bytes. References are sorted by
+    chunk and their paths dictionary-encoded, see `write_parquet_references`.
+    """
 
     mode = DisplayMode(verbose)
     with display_context[mode]:
@@ -99,35 +143,37 @@ def combine_kerchunk_references_to_parquet(
             print(f"> Writing combined reference file to [code]{combined_reference}[/code]")
             return  # Exit for a dry run
 
-        # Create LazyReferenceMapper to pass to MultiZarrToZarr
-        filesystem = fsspec.filesystem("file")
-        import os
-
-        combined_reference.mkdir(parents=True, exist_ok=True)
-        from fsspec.implementations.reference import LazyReferenceMapper
-        output_lazy = LazyReferenceMapper(
-                root=str(combined_reference),
-                fs=filesystem,
-                cache_size=1000,
-        )
-
-        from kerchunk.combine import MultiZarrToZarr
-
-        # Combine single references
-        mzz = MultiZarrToZarr(
-            reference_file_paths,
-            remote_protocol="file",
-            concat_dims=["time"],
-            identical_dims=["lat", "lon"],
-            out=output_lazy,
-        )
-        multifile_kerchunk = mzz.translate()
-
-        output_lazy.flush()  # Write all non-full reference batches
+        combined_reference = Path(combined_reference)
+        options = get_reference_options_digest(inline_threshold, inline_coordinates, record_size=record_size)
+        with open_journal(f'combine-parquet-{options}', combined_reference.parent, journal, resume) as journal:
+            sources_fingerprint = fingerprint(reference_file_paths)
+            if journal.is_complete(combined_reference, sources_fingerprint):
+                print(f"{check_mark} Combined reference [code]{combined_reference}[/code] is up to date")
+                return
+
+            from kerchunk.combine import MultiZarrToZarr
+
+            # Combine single references
+            mzz = MultiZarrToZarr(
+                reference_file_paths,
+                remote_protocol="file",
+                concat_dims=["time"],
+                identical_dims=["lat", "lon"],
+                inline_threshold=inline_threshold,
+            )
+            multifile_kerchunk = mzz.translate()
+            if inline_coordinates:
+                inline_coordinate_variables(multifile_kerchunk)
+
+            with atomic_output(combined_reference) as temporary_reference:
+                write_parquet_references(
+                    multifile_kerchunk,
+                    temporary_reference,
+                    record_size=record_size,
+                )
+            journal.record(combined_reference, sources_fingerprint, combined_reference)
 
         # Read from the Parquet storage
-        kerchunk.df.refs_to_dataframe(multifile_kerchunk, str(combined_reference))
-
         filesystem = fsspec.implementations.reference.ReferenceFileSystem(
             fo=str(combined_reference),
             target_protocol='file',
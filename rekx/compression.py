@@ -0,0 +1,432 @@
+"""Compression-aware prediction of on-disk chunk sizes.
+
+Candidate chunk shapes are judged by the bytes they occupy and take to decode
+once compressed, not by their uncompressed size. A handful of blocks of each
+candidate shape are sampled from the variable, recompressed under candidate
+codecs, ex. zlib levels with or without shuffling as written by NetCDF4, and
+decoded back. Measurements run in a thread pool, the compressors releasing the
+GIL, and are extrapolated to the whole variable.
+
+The same samples serve to benchmark codecs, timing compression and
+decompression one codec at a time, so as to choose codecs by read latency.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from typing import List
+from typing import Optional
+from typing import Sequence
+from typing import Tuple
+import time as timer
+import numcodecs
+import numpy as np
+import pandas as pd
+import xarray as xr
+from pathlib import Path
+from typing_extensions import Annotated
+import typer
+from humanize import naturalsize
+from rich import print
+from rich.box import SIMPLE_HEAD
+from rich.console import Console
+from rich.table import Table
+from .constants import CODECS_BENCHMARK_DEFAULT
+from .constants import COMPRESSION_SAMPLES_DEFAULT
+from .constants import ZARR_FORMAT_DEFAULT
+from .chunks import get_chunk_sizes
+from .hardcodings import check_mark
+from .utilities import open_variable
+
+
+COMPRESSORS = {
+    'zlib': lambda level, shuffle: numcodecs.Zlib(level=level if level is not None else 4),
+    'zstd': lambda level, shuffle: numcodecs.Zstd(level=level if level is not None else 3),
+    'lz4': lambda level, shuffle: numcodecs.LZ4(acceleration=level if level is not None else 1),
+    'blosc-lz4': lambda level, shuffle: numcodecs.Blosc(cname='lz4', clevel=level if level is not None else 5, shuffle=shuffle),
+    'blosc-zstd': lambda level, shuffle: numcodecs.Blosc(cname='zstd', clevel=level if level is not None else 5, shuffle=shuffle),
+    'blosc-lz': lambda level, shuffle: numcodecs.Blosc(cname='blosclz', clevel=level if level is not None else 5, shuffle=shuffle),
+    'blosc-lz4hc': lambda level, shuffle: numcodecs.Blosc(cname='lz4hc', clevel=level if level is not None else 5, shuffle=shuffle),
+    'blosc-zlib': lambda level, shuffle: numcodecs.Blosc(cname='zlib', clevel=level if level is not None else 5, shuffle=shuffle),
+    'bzip2': lambda level, shuffle: numcodecs.BZ2(level=level if level is not None else 9),
+    'none': lambda level, shuffle: None,
+}
+
+
+BLOSC_SHUFFLES = {
+    numcodecs.Blosc.NOSHUFFLE: 'noshuffle',
+    numcodecs.Blosc.SHUFFLE: 'shuffle',
+    numcodecs.Blosc.BITSHUFFLE: 'bitshuffle',
+}
+
+
+def parse_codec(specification: str, dtype: np.dtype) -> List[numcodecs.abc.Codec]:
+    """Parse a codec specification to a pipeline of Numcodecs codecs.
+
+    Specifications read `<compressor>[:<level>][+<filter>...]`, ex. `zlib:4`,
+    `zlib:4+shuffle`, `zstd:3`, `blosc-lz4:5+bitshuffle` or
+    `zlib:4+shuffle+lsd:2`. Filters are
+
+    - `shuffle` : the byte shuffle of the HDF5 filter, applied before
+      compressing, or the internal shuffle of Blosc
+    - `bitshuffle` : the internal bit shuffle of Blosc
+    - `lsd:<digits>` : lossy quantization of floating point values to a
+      number of significant decimal digits, as the
+      `least_significant_digit` of NetCDF4
+    """
+    dtype = np.dtype(dtype)
+    compressor, *filters = specification.strip().lower().split('+')
+    name, _, level = compressor.partition(':')
+    if name not in COMPRESSORS:
+        raise ValueError(f'Unknown compressor `{name}`, choose among {list(COMPRESSORS)}')
+    blosc = name.startswith('blosc')
+    pipeline = []
+    shuffle = numcodecs.Blosc.NOSHUFFLE
+    for filter in filters:
+        filter_name, _, argument = filter.partition(':')
+        if filter_name == 'lsd':
+            if dtype.kind != 'f':
+                raise ValueError(f'Quantizing `{specification}` requires floating point values, not {dtype}')
+            pipeline.insert(0, numcodecs.Quantize(digits=int(argument), dtype=dtype))
+        elif filter_name == 'shuffle' and blosc:
+            shuffle = numcodecs.Blosc.SHUFFLE
+        elif filter_name == 'shuffle':
+            pipeline.append(numcodecs.Shuffle(elementsize=dtype.itemsize))
+        elif filter_name == 'bitshuffle' and blosc:
+            shuffle = numcodecs.Blosc.BITSHUFFLE
+        elif filter_name == 'bitshuffle':
+            raise ValueError(f'Bit shuffling `{specification}` requires a Blosc compressor')
+        else:
+            raise ValueError(f'Unknown filter `{filter}` of `{specification}`')
+    codec = COMPRESSORS[name](int(level) if level else None, shuffle)
+    if codec is not None:
+        pipeline.append(codec)
+    return pipeline
+
+
+def get_codec_specification(encoding: dict) -> str:
+    """Return the codec specification of a NetCDF4 variable encoding, ex.
+    `zlib:4+shuffle`, `zstd:3+shuffle` or `blosc-lz4:5+bitshuffle`"""
+    blosc = encoding.get('blosc')
+    if isinstance(blosc, dict):
+        compressor = blosc.get('compressor', 'blosc_lz4').replace('_', '-')
+        specification = f"{compressor}:{encoding.get('complevel', 5)}"
+        shuffle = {1: '+shuffle', 2: '+bitshuffle'}.get(blosc.get('shuffle'), '')
+        return specification + shuffle
+    for name in ('zlib', 'zstd', 'bzip2'):
+        if encoding.get(name):
+            specification = f"{name}:{encoding.get('complevel', 4)}"
+            return specification + '+shuffle' if encoding.get('shuffle') else specification
+    return 'none'
+
+
+def get_zarr3_codec(codec: numcodecs.abc.Codec, dtype: np.dtype):
+    """Return the Zarr v3 codec of a Numcodecs codec, a codec of the Zarr v3
+    specification where there is one, ex. for zstd, Blosc and zlib as gzip,
+    else the Zarr wrapper of the Numcodecs codec"""
+    from zarr.codecs import BloscCodec
+    from zarr.codecs import GzipCodec
+    from zarr.codecs import ZstdCodec
+
+    if isinstance(codec, numcodecs.Zstd):
+        return ZstdCodec(level=codec.level)
+    if isinstance(codec, numcodecs.Zlib):
+        return GzipCodec(level=codec.level)
+    if isinstance(codec, numcodecs.Blosc):
+        return BloscCodec(
+            cname=codec.cname.decode() if isinstance(codec.cname, bytes) else codec.cname,
+            clevel=codec.clevel,
+            shuffle=BLOSC_SHUFFLES[codec.shuffle],
+            typesize=np.dtype(dtype).itemsize,
+        )
+    try:
+        import zarr.codecs.numcodecs as wrappers
+    except ImportError:  # Zarr < 3.1.3
+        import numcodecs.zarr3 as wrappers
+    configuration = {key: value for key, value in codec.get_config().items() if key != 'id'}
+    return getattr(wrappers, type(codec).__name__)(**configuration)
+
+
+def get_zarr_codecs(specification: str, dtype: np.dtype, zarr_format: int = ZARR_FORMAT_DEFAULT) -> dict:
+    """Return the Xarray encoding of the codecs of a Zarr array from a codec
+    specification, see `parse_codec`.
+
+    Zarr v2 arrays take a single Numcodecs compressor after their `filters`.
+    Zarr v3 arrays take the array-to-array codecs, ex. quantization, as
+    `filters` and the bytes-to-bytes ones, ex. shuffling and compressors, as
+    `compressors`, see `get_zarr3_codec`.
+    """
+    pipeline = parse_codec(specification, dtype)
+    name = specification.strip().lower().split('+')[0].partition(':')[0]
+    compressor = pipeline.pop() if name != 'none' else None
+    if zarr_format == 2:
+        return {'compressors': [compressor] if compressor else None, 'filters': pipeline or None}
+
+    filters = [get_zarr3_codec(codec, dtype) for codec in pipeline if isinstance(codec, numcodecs.Quantize)]
+    compressors = [get_zarr3_codec(codec, dtype) for codec in pipeline if not isinstance(codec, numcodecs.Quantize)]
+    if compressor is not None:
+        compressors.append(get_zarr3_codec(compressor, dtype))
+    return {'compressors': compressors or None, 'filters': filters or None}
+
+
+def encode(block: np.ndarray, pipeline: Sequence[numcodecs.abc.Codec]) -> bytes:
+    """Encode a block through a codec pipeline"""
+    buffer = np.ascontiguousarray(block)
+    for codec in pipeline:
+        buffer = codec.encode(buffer)
+    return bytes(buffer)
+
+
+def decode(buffer: bytes, pipeline: Sequence[numcodecs.abc.Codec]) -> bytes:
+    """Decode a buffer encoded through a codec pipeline"""
+    for codec in reversed(pipeline):
+        buffer = codec.decode(buffer)
+    return buffer
+
+
+def sample_blocks(
+    data_array: xr.DataArray,
+    chunk_shape: Sequence[int],
+    samples: int = COMPRESSION_SAMPLES_DEFAULT,
+    seed: int = 0,
+) -> List[np.ndarray]:
+    """Read `samples` blocks of `chunk_shape` at random positions of the
+    chunk grid of the variable. Edge blocks are read as they are, hence
+    smaller."""
+    generator = np.random.default_rng(seed)
+    grid = [-(-size // length) for size, length in zip(data_array.shape, chunk_shape)]
+    number_of_chunks = int(np.prod(grid))
+    chosen = generator.choice(number_of_chunks, size=min(samples, number_of_chunks), replace=False)
+    blocks = []
+    for chunk in chosen:
+        origin = np.unravel_index(chunk, grid)
+        indexers = {
+            dimension: slice(index * length, (index + 1) * length)
+            for dimension, index, length in zip(data_array.dims, origin, chunk_shape)
+        }
+        blocks.append(np.asarray(data_array.isel(indexers).values))
+    return blocks
+
+
+def measure_codec(
+    blocks: Sequence[np.ndarray],
+    specification: str,
+    repeats: int = 3,
+) -> dict:
+    """Measure a codec over sampled blocks.
+
+    Returns the `uncompressed` and `compressed` bytes of the blocks, the
+    total `encoding_time` and `decoding_time` and the `maximum_error` of the
+    decoded values. Timings are the best of `repeats` runs to dampen the
+    noise of concurrent measurements.
+    """
+    pipeline = parse_codec(specification, blocks[0].dtype)
+    measurement = dict.fromkeys(('uncompressed', 'compressed', 'encoding_time', 'decoding_time', 'maximum_error'), 0)
+    for block in blocks:
+        encoding_timings, decoding_timings = [], []
+        for _ in range(repeats):
+            start = timer.perf_counter()
+            buffer = encode(block, pipeline)
+            encoding_timings.append(timer.perf_counter() - start)
+            start = timer.perf_counter()
+            decoded = decode(buffer, pipeline)
+            decoding_timings.append(timer.perf_counter() - start)
+        decoded = np.frombuffer(decoded, dtype=block.dtype)
+        error = np.abs(decoded.astype(np.float64) - block.ravel().astype(np.float64))
+        measurement['uncompressed'] += block.nbytes
+        measurement['compressed'] += len(buffer)
+        measurement['encoding_time'] += min(encoding_timings)
+        measurement['decoding_time'] += min(decoding_timings)
+        measurement['maximum_error'] = max(measurement['maximum_error'], float(np.nanmax(error, initial=0)))
+    return measurement
+
+
+def predict_compressed_sizes(
+    data_array: xr.DataArray,
+    chunk_shapes: Sequence[Sequence[int]],
+    codecs: Sequence[str],
+    samples: int = COMPRESSION_SAMPLES_DEFAULT,
+    workers: Optional[int] = None,
+    seed: int = 0,
+) -> pd.DataFrame:
+    """Predict the on-disk size of a variable under candidate chunk shapes
+    and codecs from sampled chunks.
+
+    Parameters
+    ----------
+    data_array: xr.DataArray
+        Variable to sample, read without masking and scaling
+    chunk_shapes: list of list of int
+        Candidate chunk shapes
+    codecs: list of str
+        Candidate codecs, see `parse_codec`
+    samples: int
+        Number of chunks sampled per shape
+    workers: int, optional
+        Number of threads reading and compressing samples
+    seed: int
+        Seed of the random choice of sampled chunks
+
+    Returns
+    -------
+    pd.DataFrame
+        One row per shape and codec : the `Chunk size` uncompressed, the
+        mean `Compressed chunk size`, the compression `Ratio`, the
+        `Predicted size` of the variable and the mean `Decode time` of a chunk
+    """
+    chunk_shapes = [tuple(int(length) for length in shape) for shape in chunk_shapes]
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        blocks = list(executor.map(
+            lambda shape: sample_blocks(data_array, shape, samples=samples, seed=seed),
+            chunk_shapes,
+        ))
+        tasks = [(shape_index, codec) for shape_index in range(len(chunk_shapes)) for codec in codecs]
+        measurements = list(executor.map(
+            lambda task: measure_codec(blocks[task[0]], task[1]),
+            tasks,
+        ))
+
+    rows = []
+    for (shape_index, codec), measurement in zip(tasks, measurements):
+        shape = chunk_shapes[shape_index]
+        number_of_blocks = len(blocks[shape_index])
+        ratio = measurement['uncompressed'] / measurement['compressed']
+        rows.append({
+            'Shape': ' x '.join(map(str, shape)),
+            'Codec': codec,
+            'Chunk size': int(np.prod(shape)) * data_array.dtype.itemsize,
+            'Compressed chunk size': measurement['compressed'] / number_of_blocks,
+            'Ratio': ratio,
+            'Predicted size': data_array.nbytes / ratio,
+            'Decode time': measurement['decoding_time'] / number_of_blocks,
+        })
+    return pd.DataFrame(rows)
+
+
+def print_compression_predictions(predictions: pd.DataFrame, title: Optional[str] = None) -> None:
+    """Print predicted compressed sizes and decode times"""
+    table = Table(title=title, show_header=True, header_style="bold magenta", box=SIMPLE_HEAD)
+    table.add_column("Shape", no_wrap=True)
+    table.add_column("Codec", no_wrap=True)
+    table.add_column("Chunk size", no_wrap=True)
+    table.add_column("Compressed", no_wrap=True)
+    table.add_column("Ratio", no_wrap=True)
+    table.add_column("Predicted size", no_wrap=True)
+    table.add_column("Decode time", no_wrap=True)
+    for _, row in predictions.iterrows():
+        table.add_row(
+            row['Shape'],
+            row['Codec'],
+            naturalsize(row['Chunk size'], binary=True),
+            naturalsize(row['Compressed chunk size'], binary=True),
+            f"{row['Ratio']:.2f}",
+            naturalsize(row['Predicted size'], binary=True),
+            f"{row['Decode time'] * 1e3:.3f} ms",
+        )
+    console = Console()
+    console.print(table)
+
+
+def benchmark_codecs(
+    data_array: xr.DataArray,
+    codecs: Sequence[str],
+    chunk_shape: Optional[Sequence[int]] = None,
+    samples: int = COMPRESSION_SAMPLES_DEFAULT,
+    repeats: int = 3,
+    seed: int = 0,
+) -> pd.DataFrame:
+    """Benchmark codecs over chunks sampled from a variable.
+
+    Codecs are measured one after the other, not concurrently, so that the
+    throughputs are not skewed by competing threads.
+
+    Parameters
+    ----------
+    data_array: xr.DataArray
+        Variable to sample, read without masking and scaling
+    codecs: list of str
+        Codecs to benchmark, see `parse_codec`
+    chunk_shape: list of int, optional
+        Shape of the sampled chunks, by default the current layout
+    samples: int
+        Number of sampled chunks
+    repeats: int
+        Runs per chunk and codec, the best of which is kept
+    seed: int
+        Seed of the random choice of sampled chunks
+
+    Returns
+    -------
+    pd.DataFrame
+        One row per codec, sorted by decode time : the compression `Ratio`,
+        the `Compression` and `Decompression` throughputs in bytes of
+        uncompressed data per second, the mean `Decode time` of a chunk and
+        the `Maximum error` of lossy codecs
+    """
+    if chunk_shape is None:
+        chunk_sizes = get_chunk_sizes(data_array)
+        chunk_shape = [chunk_sizes[dimension] for dimension in data_array.dims]
+    blocks = sample_blocks(data_array, chunk_shape, samples=samples, seed=seed)
+    rows = []
+    for codec in codecs:
+        measurement = measure_codec(blocks, codec, repeats=repeats)
+        rows.append({
+            'Codec': codec,
+            'Ratio': measurement['uncompressed'] / measurement['compressed'],
+            'Compression': measurement['uncompressed'] / measurement['encoding_time'],
+            'Decompression': measurement['uncompressed'] / measurement['decoding_time'],
+            'Decode time': measurement['decoding_time'] / len(blocks),
+            'Maximum error': measurement['maximum_error'],
+        })
+    return pd.DataFrame(rows).sort_values('Decode time', kind='stable').reset_index(drop=True)
+
+
+def print_codec_benchmark(benchmark: pd.DataFrame, title: Optional[str] = None) -> None:
+    """Print a codec benchmark"""
+    table = Table(title=title, show_header=True, header_style="bold magenta", box=SIMPLE_HEAD)
+    table.add_column("Codec", no_wrap=True)
+    table.add_column("Ratio", no_wrap=True)
+    table.add_column("Compression", no_wrap=True)
+    table.add_column("Decompression", no_wrap=True)
+    table.add_column("Decode time", no_wrap=True)
+    table.add_column("Maximum error", no_wrap=True)
+    for _, row in benchmark.iterrows():
+        table.add_row(
+            row['Codec'],
+            f"{row['Ratio']:.2f}",
+            f"{naturalsize(row['Compression'], binary=True)}/s",
+            f"{naturalsize(row['Decompression'], binary=True)}/s",
+            f"{row['Decode time'] * 1e3:.3f} ms",
+            f"{row['Maximum error']:.3g}",
+        )
+    console = Console()
+    console.print(table)
+
+
+def codecs_benchmark(
+    time_series: Annotated[Path, typer.Argument(help='NetCDF file or Kerchunk reference set')],
+    variable: Annotated[str, typer.Argument(help='Variable to sample chunks from')],
+    codecs: Annotated[str, typer.Option(help='Comma-separated codecs, ex. [code]zlib:4+shuffle,blosc-lz4:5+bitshuffle,zlib:4+shuffle+lsd:2[/code]')] = CODECS_BENCHMARK_DEFAULT,
+    chunks: Annotated[Optional[str], typer.Option(help='Comma-separated shape of the sampled chunks, by default the current layout')] = None,
+    samples: Annotated[int, typer.Option(help='Number of sampled chunks')] = COMPRESSION_SAMPLES_DEFAULT,
+    repeats: Annotated[int, typer.Option(help='Runs per chunk and codec, the best of which is kept')] = 3,
+    csv: Annotated[Optional[Path], typer.Option(help='Write the results to a CSV file')] = None,
+) -> None:
+    """Benchmark compression ratio and (de)compression throughput of codecs
+    over sampled chunks of a variable"""
+    data_array = open_variable(time_series, variable)
+    codecs = [codec for codec in codecs.split(',') if codec.strip()]
+    if data_array.dtype.kind != 'f':
+        lossy = [codec for codec in codecs if '+lsd:' in codec]
+        if lossy:
+            print(f'Skipping the quantization of non floating point values of {variable} : {lossy}')
+        codecs = [codec for codec in codecs if codec not in lossy]
+    chunk_shape = [int(length) for length in chunks.split(',')] if chunks else None
+    benchmark = benchmark_codecs(
+        data_array,
+        codecs=codecs,
+        chunk_shape=chunk_shape,
+        samples=samples,
+        repeats=repeats,
+    )
+    print_codec_benchmark(benchmark, title=f'Codecs over {samples} sampled chunks of {variable}')
+    if csv:
+        benchmark.to_csv(csv, index=False)
+        print(f'{check_mark} Benchmark written to [code]{csv}[/code]')
@@ -5,8 +5,25 @@ ROUNDING_PLACES_DEFAULT = 5
 # IN_MEMORY_FLAG_DEFAULT = False
 # MASK_AND_SCALE_FLAG_DEFAULT = False
 TIMESTAMPS_FREQUENCY_DEFAULT = 'h'  # hours
-DEFAULT_RECORD_SIZE = 10000
+DEFAULT_RECORD_SIZE = 10000  # references per record of Parquet stores whose chunk grid is unknown
+RECORD_SIZE_MAXIMUM = 100000  # references per record of Parquet stores, bounds the memory of a loaded record
+PATH_CATEGORICAL_THRESHOLD = 1  # dictionary-encode the paths of a record repeated at least once on average
+INLINE_THRESHOLD_DEFAULT = 500  # bytes, chunks smaller than this are inlined in references
 LATITUDE_MINIMUM = -90
 LATITUDE_MAXIMUM = 90
 LONGITUDE_MINIMUM = -180
 LONGITUDE_MAXIMUM = 180
+CHUNK_CACHE_SIZE_DEFAULT = 0  # bytes, 0 disables the cache of decompressed chunks
+CHUNK_CACHE_SPILL_SIZE_DEFAULT = 10 * 1024**3  # bytes of decompressed chunks spilled to disk
+DISK_CACHE_SIZE_DEFAULT = 10 * 1024**3  # bytes
+DISK_CACHE_MAXIMUM_AGE_DEFAULT = None  # seconds since last access, None for no limit
+ARROW_COMPRESSION_DEFAULT = 'zstd'
+STATISTICS_BLOCK_SIZE_DEFAULT = 2**20  # elements per block of a series consumed by the streaming statistics
+RESAMPLE_AGGREGATIONS_DEFAULT = 'mean'
+SUGGEST_REQUEST_LATENCY_DEFAULT = 0.002  # seconds per chunk read, estimate of the cost model of `suggest`
+SUGGEST_READ_THROUGHPUT_DEFAULT = 200 * 1024**2  # bytes per second, estimate of the cost model of `suggest`
+SUGGEST_FRONT_SIZE_DEFAULT = 10  # rows of the Pareto front to report
+COMPRESSION_SAMPLES_DEFAULT = 8  # chunks sampled per candidate shape to predict compressed sizes
+COMPRESSION_CODECS_DEFAULT = 'zlib:1+shuffle,zlib:4+shuffle,zlib:9+shuffle,zlib:4,zstd:3+shuffle'
+ZARR_FORMAT_DEFAULT = 2  # of rechunked Zarr stores, 3 for sharding
+CODECS_BENCHMARK_DEFAULT = 'none,zlib:1,zlib:4,zlib:9,zlib:1+shuffle,zlib:4+shuffle,zlib:9+shuffle,zstd:1+shuffle,zstd:3+shuffle,zstd:9+shuffle,lz4,lz4+shuffle,blosc-lz4:5+shuffle,blosc-lz4:5+bitshuffle,blosc-zstd:5+bitshuffle'
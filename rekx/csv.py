@@ -4,6 +4,8 @@ with full support for `dask <http://dask.org/>`_ and `dask distributed
 """
 from __future__ import annotations
 from collections.abc import Callable
+from collections.abc import Iterable
+import pandas
 import xarray
 from pathlib import Path
 from dask.base import tokenize
@@ -17,7 +19,7 @@ __all__ = ("to_csv",)
 
 
 def to_csv(
-    x: xarray.DataArray,
+    x: xarray.DataArray | xarray.Dataset | Iterable[xarray.DataArray],
     path: str | Path,
     *,
     nogil: bool = True,
@@ -38,7 +40,9 @@ def to_csv(
     dimensions will be merged ahead of computation.
 
     :param x:
-        :class:`~xarray.DataArray` with one or two dimensions
+        :class:`~xarray.DataArray` with one or two dimensions, or a
+        :class:`~xarray.Dataset` or several aligned DataArrays with one
+        dimension, written as one column per variable sharing a single index
     :param str path:
         Output file path
     :param bool nogil:
@@ -74,7 +78,7 @@ def to_csv(
     and concatenate the partial outputs.
     """
     if not isinstance(x, xarray.DataArray):
-        raise ValueError("first argument must be a DataArray")
+        x = _stack_variables(x)
 
     # Health checks
     if not isinstance(path, Path):
@@ -155,7 +159,7 @@ def to_csv(
         # Step 3: write to file
         if i == 0:
             # First chunk: overwrite file if it already exists
-            dsk[name3, i] = kernels.to_file, path, mode + "b", (prevname, i)
+            dsk[name3, i] = kernels.to_file, path, mode + "b", (prevname, i), None
         else:
             # Next chunks: wait for previous chunk to complete and append
             dsk[name3, i] = (kernels.to_file, path, "ab", (prevname, i), (name3, i - 1))
@@ -167,6 +171,44 @@ def to_csv(
     return Delayed(name4, hlg)
 
 
+def _stack_variables(
+    x: xarray.Dataset | Iterable[xarray.DataArray],
+) -> xarray.DataArray:
+    """Stack aligned 1-D variables into a 2-D DataArray, one column per
+    variable, so that the index is formatted and written once.
+    """
+    if isinstance(x, xarray.Dataset):
+        variables = list(x.data_vars.values())
+    else:
+        try:
+            variables = list(x)
+        except TypeError:
+            raise ValueError("first argument must be a DataArray, a Dataset or several DataArrays")
+    if not variables or not all(isinstance(v, xarray.DataArray) for v in variables):
+        raise ValueError("first argument must be a DataArray, a Dataset or several DataArrays")
+
+    dims = variables[0].dims
+    if len(dims) != 1 or any(v.dims != dims for v in variables):
+        raise ValueError(
+            "multiple variables must be 1-dimensional along the same dimension; got %s"
+            % {v.name: v.dims for v in variables}
+        )
+    names = [v.name for v in variables]
+    if None in names or len(set(names)) != len(names):
+        raise ValueError("multiple variables must have unique names; got %s" % names)
+
+    # Raises if the indexes differ, rather than silently writing NaNs
+    variables = xarray.align(*variables, join="exact")
+    stacked = xarray.concat(
+        variables,
+        dim=pandas.Index(names, name="variable"),
+        coords="minimal",
+        compat="override",
+        join="exact",
+    )
+    return stacked.transpose(dims[0], "variable")
+
+
 def _compress_func(
     path: str, compression: str | None
 ) -> Callable[[bytes], bytes] | None:
@@ -224,6 +266,7 @@ def write_nested_dictionary_to_csv(
                 "Compression",
                 "Level",
                 "Shuffling",
+                "Quantization",
                 "Read time",
             ]
         )
@@ -245,6 +288,7 @@ def write_nested_dictionary_to_csv(
                     metadata.get('Compression', ''),
                     metadata.get('Level', ''),
                     metadata.get('Shuffling', ''),
+                    metadata.get('Quantization', ''),
                     metadata.get('Read time', '')
                 ]
                 writer.writerow(row)
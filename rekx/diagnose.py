@@ -13,9 +13,9 @@ import numpy as np
 import xarray as xr
 from typing import Annotated
 from typing import List
+from typing import Optional
 from pathlib import Path
-from concurrent.futures import ProcessPoolExecutor
-from concurrent.futures import as_completed
+from functools import partial
 from humanize import naturalsize
 from rich import print
 import typer
@@ -28,6 +28,7 @@ from .typer_parameters import typer_option_humanize
 from .typer_parameters import typer_option_repetitions
 from .typer_parameters import typer_option_csv
 from .typer_parameters import typer_option_verbose
+from .typer_parameters import typer_option_number_of_workers
 from .models import XarrayVariableSet
 from .models import select_xarray_variable_set_from_dataset
 from .models import select_netcdf_variable_set_from_dataset
@@ -40,6 +41,7 @@ from .print import print_chunk_shapes_table
 from .print import print_common_chunk_layouts
 from .select import read
 from .csv import write_nested_dictionary_to_csv
+from .scheduler import map_unordered
 # from .rich_help_panel_names import rich_help_panel_diagnose
 
 
@@ -50,6 +52,18 @@ def format_compression(compression_dict):
     return compression_dict
 
 
+def get_quantization(variable) -> str:
+    """Describe the quantization of a NetCDF4 variable, ex. `BitGroom:3` for
+    three significant digits or `lsd:2` for a least significant digit"""
+    quantization = variable.quantization() if hasattr(variable, 'quantization') else None
+    if quantization:
+        significant_digits, mode = quantization
+        return f'{mode}:{significant_digits}'
+    if 'least_significant_digit' in variable.ncattrs():
+        return f"lsd:{variable.getncattr('least_significant_digit')}"
+    return NOT_AVAILABLE
+
+
 def get_netcdf_metadata(
     input_netcdf_path: Path,
     variable: str = None,
@@ -65,7 +79,7 @@ def get_netcdf_metadata(
 
     Collect and report metadata of a NetCDF file, including : 
     file name, file size, dimensions, shape, chunks, cache, type, scale,
-    offset, compression, shuffling and lastly the read time (required to
+    offset, compression, shuffling, quantization and lastly the read time (required to
     retrieve data) for data variables.
 
     Parameters
@@ -129,6 +143,7 @@ def get_netcdf_metadata(
                 'Compression': variable.filters() if 'filters' in dir(variable) else NOT_AVAILABLE,
                 'Level': NOT_AVAILABLE,
                 'Shuffling': variable.filters().get('shuffle', NOT_AVAILABLE),
+                'Quantization': get_quantization(variable),
                 'Read time': NOT_AVAILABLE,
             }
             variables_metadata[variable_name] = variable_metadata  # Add info to variable_metadata
@@ -162,37 +177,33 @@ def get_multiple_netcdf_metadata(
     repetitions: Annotated[int, typer_option_repetitions] = REPETITIONS_DEFAULT,
     humanize: Annotated[bool, typer_option_humanize] = False,
     csv: Path = None,
+    workers: Optional[int] = None,
     verbose: int = VERBOSE_LEVEL_DEFAULT,
 ):
-    """
-    """
+    """Collect the metadata of multiple NetCDF files, largest first, in a
+    pool of `workers` processes"""
     metadata_series = {}
-    with ProcessPoolExecutor() as executor:
-        futures = [
-            executor.submit(
-                get_netcdf_metadata,
-                file_path,
-                variable,
-                variable_set.value,
-                longitude,
-                latitude,
-                repetitions,
-                humanize,
-            )
-            for file_path in file_paths
-        ]
-        for future in as_completed(futures):
-            try:
-                metadata, input_netcdf_path = future.result()
-                # logger.info(f'Metadata : {metadata}')
-                metadata_series[input_netcdf_path.name] = metadata
-            except Exception as e:
-                logger.error(f"Error processing file: {e}")
+    partial_get_netcdf_metadata = partial(
+        get_netcdf_metadata,
+        variable=variable,
+        variable_set=variable_set.value,
+        longitude=longitude,
+        latitude=latitude,
+        repetitions=repetitions,
+        humanize=humanize,
+    )
+    results = map_unordered(partial_get_netcdf_metadata, file_paths, workers=workers)
+    for file_path, result, exception in results:
+        if exception:
+            logger.error(f"Error processing file {file_path} : {exception}")
+            continue
+        metadata, input_netcdf_path = result
+        # logger.info(f'Metadata : {metadata}')
+        metadata_series[input_netcdf_path.name] = metadata
 
     return metadata_series
 
 
-from typing import Optional
 def collect_netcdf_metadata(
     source_directory: Annotated[Path, typer_argument_source_directory],
     pattern: Annotated[str, typer_option_filename_pattern] = "*.nc",
@@ -204,6 +215,7 @@ def collect_netcdf_metadata(
     humanize: Annotated[bool, typer_option_humanize] = False,
     repetitions: Annotated[int, typer_option_repetitions] = REPETITIONS_DEFAULT,
     csv: Annotated[Path, typer_option_csv] = None,
+    workers: Annotated[Optional[int], typer_option_number_of_workers] = None,
     verbose: Annotated[int, typer_option_verbose] = VERBOSE_LEVEL_DEFAULT,
 ):
     """Scan files in the source directory that match the pattern and diagnose the chunking shapes for each variable."""
@@ -222,6 +234,7 @@ def collect_netcdf_metadata(
                     latitude=latitude,
                     repetitions=repetitions,
                     humanize=humanize,
+                    workers=workers,
             )
         except TypeError as e:
             raise ValueError("Error occurred:", e)
@@ -267,6 +280,7 @@ def detect_chunking_shapes(
 def detect_chunking_shapes_parallel(
     file_paths: List[Path],
     variable_set: XarrayVariableSet = XarrayVariableSet.all,
+    workers: Optional[int] = None,
 ):
     """
     Detect and aggregate the chunking shapes of variables within a set of NetCDF files in parallel.
@@ -275,6 +289,9 @@ def detect_chunking_shapes_parallel(
     ----------
     file_paths : list of Path
         A list of file paths pointing to the NetCDF files to be scanned.
+    workers : int, optional
+        Number of worker processes, by default as many as the CPUs and the
+        available memory allow.
 
     Returns
     -------
@@ -284,32 +301,29 @@ def detect_chunking_shapes_parallel(
         values being sets of file names where those chunking shapes are found.
     """
     aggregated_chunking_shapes = {}
-    with ProcessPoolExecutor() as executor:
-        futures = [
-            executor.submit(detect_chunking_shapes, file_path, variable_set.value)
-            for file_path in file_paths
-        ]
-
-        for future in as_completed(futures):
-            try:
-                chunking_shapes, file_name = future.result()
-                # logger.info(f"Scanned file: {file_name}")
-
-                for variable, chunking_shape in chunking_shapes.items():
-                    if variable not in aggregated_chunking_shapes:
-                        aggregated_chunking_shapes[variable] = {}
-                        # logger.info(
-                        #     f"Initial chunk sizes set for {variable} in {file_name}"
-                        # )
-                    if chunking_shape not in aggregated_chunking_shapes[variable]:
-                        aggregated_chunking_shapes[variable][chunking_shape] = set()
-                        # logger.info(
-                        #     f"New chunking shape {chunking_shape} found for variable {variable} in {file_name}"
-                        # )
-                    aggregated_chunking_shapes[variable][chunking_shape].add(file_name)
-
-            except Exception as e:
-                logger.error(f"Error processing file: {e}")
+    partial_detect_chunking_shapes = partial(
+        detect_chunking_shapes, variable_set=variable_set.value
+    )
+    results = map_unordered(partial_detect_chunking_shapes, file_paths, workers=workers)
+    for file_path, result, exception in results:
+        if exception:
+            logger.error(f"Error processing file {file_path} : {exception}")
+            continue
+        chunking_shapes, file_name = result
+        # logger.info(f"Scanned file: {file_name}")
+
+        for variable, chunking_shape in chunking_shapes.items():
+            if variable not in aggregated_chunking_shapes:
+                aggregated_chunking_shapes[variable] = {}
+                # logger.info(
+                #     f"Initial chunk sizes set for {variable} in {file_name}"
+                # )
+            if chunking_shape not in aggregated_chunking_shapes[variable]:
+                aggregated_chunking_shapes[variable][chunking_shape] = set()
+                # logger.info(
+                #     f"New chunking shape {chunking_shape} found for variable {variable} in {file_name}"
+                # )
+            aggregated_chunking_shapes[variable][chunking_shape].add(file_name)
 
     return aggregated_chunking_shapes
 
@@ -334,6 +348,7 @@ def diagnose_chunking_shapes(
     pattern: Annotated[str, typer_option_filename_pattern] = "*.nc",
     variable_set: Annotated[XarrayVariableSet, typer.Option(help="Set of Xarray variables to diagnose")] = XarrayVariableSet.all,
     csv: Annotated[Path, typer_option_csv] = None,
+    workers: Annotated[Optional[int], typer_option_number_of_workers] = None,
     verbose: Annotated[int, typer_option_verbose] = VERBOSE_LEVEL_DEFAULT,
 ):
     """Scan files in the source directory that match the pattern and diagnose the chunking shapes for each variable."""
@@ -345,6 +360,7 @@ def diagnose_chunking_shapes(
             chunking_shapes = detect_chunking_shapes_parallel(
                     file_paths=file_paths,
                     variable_set=variable_set,
+                    workers=workers,
             )
         except TypeError as e:
             raise ValueError("Error occurred:", e)
@@ -367,6 +383,7 @@ def determine_common_chunking_layout(
     source_directory: Annotated[Path, typer_argument_source_directory],
     pattern: Annotated[str, typer_option_filename_pattern] = "*.nc",
     variable_set: Annotated[XarrayVariableSet, typer.Option(help="Set of Xarray variables to diagnose")] = XarrayVariableSet.all,
+    workers: Annotated[Optional[int], typer_option_number_of_workers] = None,
     verbose: Annotated[int, typer_option_verbose] = VERBOSE_LEVEL_DEFAULT,
 ):
     """
@@ -385,6 +402,7 @@ def determine_common_chunking_layout(
         chunking_shapes = detect_chunking_shapes_parallel(
                 file_paths=file_paths,
                 variable_set=variable_set,
+                workers=workers,
                 )
         common_chunking_shapes = {}
         for variable, shapes in chunking_shapes.items():
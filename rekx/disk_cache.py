@@ -0,0 +1,410 @@
+"""Persistent local cache of raw chunk byte ranges.
+
+Kerchunk references point to byte ranges inside the original NetCDF/HDF5
+files, which often live on slow network filesystems. The `ByteRangeCache`
+keeps a copy of the fetched byte ranges in a local directory, ideally on a
+fast local disk, so that repeated queries over the same regions do not hit
+the network again.
+
+Layout of the cache directory ::
+
+    <cache directory>/<hash of source URL>/source.json
+    <cache directory>/<hash of source URL>/<offset>-<length>
+
+The `source.json` file records the fingerprint (size and modification time)
+of the source file at the time its byte ranges were cached. Cached byte
+ranges of a source file whose fingerprint changed are invalidated. The
+modification time of each cached byte range is updated on access and serves
+for least-recently-used and age-based eviction.
+"""
+from collections.abc import Mapping
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from threading import Lock
+import threading
+from typing import Optional
+from typing_extensions import Annotated
+import hashlib
+import json
+import os
+import shutil
+import time
+import fsspec
+import typer
+from humanize import naturalsize
+from rich import print
+from zarr.abc.store import Store
+from zarr.core.buffer import BufferPrototype
+from zarr.storage import WrapperStore
+from .constants import DISK_CACHE_SIZE_DEFAULT
+from .constants import DISK_CACHE_MAXIMUM_AGE_DEFAULT
+from .constants import VERBOSE_LEVEL_DEFAULT
+from .hardcodings import check_mark
+from .progress import DisplayMode
+from .progress import display_context
+from .typer_parameters import typer_argument_disk_cache_directory
+from .typer_parameters import typer_option_disk_cache_size
+from .typer_parameters import typer_option_disk_cache_maximum_age
+from .typer_parameters import typer_option_number_of_workers
+from .typer_parameters import typer_option_dry_run
+from .typer_parameters import typer_option_humanize
+from .typer_parameters import typer_option_verbose
+
+
+SOURCE_FINGERPRINT_FILENAME = 'source.json'
+
+
+def fingerprint_source(url: str) -> dict:
+    """Fingerprint a source file by its size and modification time"""
+    filesystem, path = fsspec.core.url_to_fs(url)
+    information = filesystem.info(path)
+    modification_time = (
+        information.get('mtime')
+        or information.get('LastModified')
+        or information.get('ETag')
+    )
+    return {
+        'url': url,
+        'size': information.get('size'),
+        'mtime': str(modification_time),
+    }
+
+
+class ByteRangeCache:
+    """Local on-disk cache of raw byte ranges of source files.
+
+    Parameters
+    ----------
+    cache_directory: Path
+        Local directory to store the cached byte ranges
+    maximum_size: int
+        Maximum total size of the cached byte ranges in bytes
+    maximum_age: float, optional
+        Maximum age in seconds since the last access of a cached byte range
+    """
+
+    def __init__(
+        self,
+        cache_directory: Path,
+        maximum_size: int = DISK_CACHE_SIZE_DEFAULT,
+        maximum_age: Optional[float] = DISK_CACHE_MAXIMUM_AGE_DEFAULT,
+    ):
+        self.cache_directory = Path(cache_directory)
+        self.cache_directory.mkdir(parents=True, exist_ok=True)
+        self.maximum_size = maximum_size
+        self.maximum_age = maximum_age
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self._validated_sources = {}
+        self._size = None
+        self._lock = Lock()
+        self._sources_lock = Lock()  # sources are validated from many threads
+
+    def source_directory(self, url: str) -> Path:
+        return self.cache_directory / hashlib.sha1(url.encode()).hexdigest()
+
+    def validate_source(self, url: str) -> Path:
+        """Compare the fingerprint of a source file against the cached one.
+
+        Cached byte ranges of a source file that changed since they were
+        cached are removed. Each source is validated once per cache instance.
+        """
+        source_directory = self.source_directory(url)
+        if url in self._validated_sources:
+            return source_directory
+
+        with self._sources_lock:
+            if url in self._validated_sources:  # by another thread meanwhile
+                return source_directory
+            fingerprint = fingerprint_source(url)
+            fingerprint_file = source_directory / SOURCE_FINGERPRINT_FILENAME
+            if fingerprint_file.exists():
+                cached_fingerprint = json.loads(fingerprint_file.read_text())
+                if cached_fingerprint != fingerprint:
+                    shutil.rmtree(source_directory, ignore_errors=True)
+                    self.invalidations += 1
+                    with self._lock:
+                        self._size = None
+
+            if not fingerprint_file.exists():
+                source_directory.mkdir(parents=True, exist_ok=True)
+                fingerprint_file.write_text(json.dumps(fingerprint))
+
+            self._validated_sources[url] = fingerprint
+        return source_directory
+
+    def get(self, url: str, offset: int, length: int) -> Optional[bytes]:
+        """Return a cached byte range or `None`"""
+        path = self.validate_source(url) / f'{offset}-{length}'
+        try:
+            with open(path, 'rb') as cached_file:
+                data = cached_file.read()
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+
+        if len(data) != length:  # truncated, ex. by an interrupted write
+            path.unlink(missing_ok=True)
+            self.misses += 1
+            return None
+
+        os.utime(path)  # mark as recently used
+        self.hits += 1
+        return data
+
+    def put(self, url: str, offset: int, length: int, data: bytes) -> None:
+        """Store a byte range and evict old entries if the cache is full"""
+        path = self.validate_source(url) / f'{offset}-{length}'
+        temporary_path = path.with_name(f'{path.name}.{os.getpid()}.{threading.get_ident()}.tmp')
+        with open(temporary_path, 'wb') as cached_file:
+            cached_file.write(data)
+        temporary_path.replace(path)
+
+        with self._lock:
+            if self._size is None:
+                self._size = sum(entry['size'] for entry in self.entries())
+            else:
+                self._size += len(data)
+            full = self._size > self.maximum_size
+
+        if full:
+            self.evict()
+
+    def entries(self):
+        """Iterate over the cached byte ranges"""
+        for source_directory in self.cache_directory.iterdir():
+            if not source_directory.is_dir():
+                continue
+            for path in source_directory.iterdir():
+                if path.name == SOURCE_FINGERPRINT_FILENAME or path.suffix == '.tmp':
+                    continue
+                try:
+                    status = path.stat()
+                except FileNotFoundError:
+                    continue
+                yield {
+                    'path': path,
+                    'size': status.st_size,
+                    'last access': status.st_mtime,
+                }
+
+    def sources(self):
+        """Iterate over the fingerprints of the cached source files"""
+        for fingerprint_file in self.cache_directory.glob(f'*/{SOURCE_FINGERPRINT_FILENAME}'):
+            yield fingerprint_file.parent, json.loads(fingerprint_file.read_text())
+
+    def evict(self, maximum_size: Optional[int] = None, maximum_age: Optional[float] = None) -> int:
+        """Remove expired and least-recently-used byte ranges.
+
+        Returns
+        -------
+        int
+            The number of bytes removed
+        """
+        maximum_size = self.maximum_size if maximum_size is None else maximum_size
+        maximum_age = self.maximum_age if maximum_age is None else maximum_age
+        entries = sorted(self.entries(), key=lambda entry: entry['last access'])
+        total_size = sum(entry['size'] for entry in entries)
+        now = time.time()
+        removed = 0
+        for entry in entries:
+            expired = maximum_age is not None and now - entry['last access'] > maximum_age
+            if not expired and total_size - removed <= maximum_size:
+                break
+            entry['path'].unlink(missing_ok=True)
+            removed += entry['size']
+
+        with self._lock:
+            self._size = total_size - removed
+        return removed
+
+    def purge(self, stale_only: bool = False) -> int:
+        """Remove all cached byte ranges or only those of changed sources"""
+        removed = 0
+        for source_directory, fingerprint in list(self.sources()):
+            if stale_only:
+                try:
+                    if fingerprint_source(fingerprint['url']) == fingerprint:
+                        continue
+                except FileNotFoundError:
+                    pass
+            removed += sum(path.stat().st_size for path in source_directory.iterdir())
+            shutil.rmtree(source_directory, ignore_errors=True)
+        self._validated_sources.clear()
+        self._size = None
+        return removed
+
+    def statistics(self) -> dict:
+        requests = self.hits + self.misses
+        return {
+            'Hits': self.hits,
+            'Misses': self.misses,
+            'Invalidations': self.invalidations,
+            'Hit ratio': self.hits / requests if requests else 0,
+        }
+
+
+def get_byte_range(references: Mapping, key: str):
+    """Return the (url, offset, length) a key refers to, or `None` for
+    missing keys, inlined data and whole-file references"""
+    try:
+        reference = references[key]
+    except KeyError:
+        return None
+    if isinstance(reference, (list, tuple)) and len(reference) == 3:
+        url, offset, length = reference
+        return url, int(offset), int(length)
+    return None
+
+
+def fetch_byte_range(cache: ByteRangeCache, url: str, offset: int, length: int) -> bytes:
+    """Read a byte range from the cache, or from its source file into the
+    cache"""
+    data = cache.get(url, offset, length)
+    if data is None:
+        filesystem, path = fsspec.core.url_to_fs(url)
+        data = filesystem.cat_file(path, start=offset, end=offset + length)
+        cache.put(url, offset, length, data)
+    return data
+
+
+class CachingByteRangeStore(WrapperStore):
+    """Read-only Zarr store populating a `ByteRangeCache` transparently.
+
+    Parameters
+    ----------
+    store: Store
+        The Zarr store of a Kerchunk reference set, ex. an `FsspecStore` of
+        a `ReferenceFileSystem`
+    cache: ByteRangeCache
+        The local cache of raw byte ranges
+    references: Mapping
+        The references of the reference set, by default those of the
+        `ReferenceFileSystem` of the store
+    """
+
+    def __init__(
+        self,
+        store: Store,
+        cache: ByteRangeCache,
+        references: Optional[Mapping] = None,
+    ):
+        super().__init__(store)
+        self.cache = cache
+        self.references = references if references is not None else store.fs.references
+        self.cache_title = 'Local byte ranges'
+
+    def _with_store(self, store: Store) -> "CachingByteRangeStore":
+        return type(self)(store=store, cache=self.cache, references=self.references)
+
+    def byte_range(self, key: str):
+        """Return the (url, offset, length) a key refers to, or `None`"""
+        return get_byte_range(self.references, key)
+
+    async def get(self, key: str, prototype: BufferPrototype, byte_range=None):
+        reference = self.byte_range(key)
+        if reference is None or byte_range is not None:
+            return await self._store.get(key, prototype, byte_range)
+
+        data = self.cache.get(*reference)
+        if data is not None:
+            return prototype.buffer.from_bytes(data)
+        buffer = await self._store.get(key, prototype)
+        if buffer is not None:
+            self.cache.put(*reference, buffer.to_bytes())
+        return buffer
+
+    async def set(self, key, value):
+        raise PermissionError('The caching byte range store is read-only')
+
+    async def delete(self, key):
+        raise PermissionError('The caching byte range store is read-only')
+
+
+def inspect_disk_cache(
+    cache_directory: Annotated[Path, typer_argument_disk_cache_directory],
+    humanize: Annotated[bool, typer_option_humanize] = False,
+    verbose: Annotated[int, typer_option_verbose] = VERBOSE_LEVEL_DEFAULT,
+):
+    """Report the source files and the size of a local chunk cache"""
+    from .print import print_disk_cache_table
+
+    cache = ByteRangeCache(cache_directory=cache_directory)
+    summary = {}
+    for source_directory, fingerprint in cache.sources():
+        try:
+            stale = fingerprint_source(fingerprint['url']) != fingerprint
+        except FileNotFoundError:
+            stale = True
+        chunks = [
+            path for path in source_directory.iterdir()
+            if path.name != SOURCE_FINGERPRINT_FILENAME
+        ]
+        size = sum(path.stat().st_size for path in chunks)
+        last_access = max((path.stat().st_mtime for path in chunks), default=None)
+        summary[fingerprint['url']] = {
+            'Chunks': len(chunks),
+            'Size': naturalsize(size, binary=True) if humanize else size,
+            'Last access': time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(last_access)) if last_access else '-',
+            'Stale': stale,
+        }
+    print_disk_cache_table(summary, title=str(cache_directory))
+
+
+def warm_disk_cache(
+    reference: Annotated[Path, typer.Argument(help='JSON or Parquet Kerchunk reference set')],
+    cache_directory: Annotated[Path, typer_argument_disk_cache_directory],
+    variable: Annotated[Optional[str], typer.Option(help='Variable to warm the cache for. All variables if not given')] = None,
+    cache_size: Annotated[int, typer_option_disk_cache_size] = DISK_CACHE_SIZE_DEFAULT,
+    workers: Annotated[int, typer_option_number_of_workers] = 8,
+    dry_run: Annotated[bool, typer_option_dry_run] = False,
+    verbose: Annotated[int, typer_option_verbose] = VERBOSE_LEVEL_DEFAULT,
+):
+    """Copy the byte ranges of a reference set into a local chunk cache"""
+    from .cache import open_reference_mapper
+
+    references = open_reference_mapper(reference=reference).fs.references
+    byte_ranges = [
+        get_byte_range(references, key) for key in references
+        if (variable is None or key.rpartition('/')[0] == variable)
+    ]
+    byte_ranges = [byte_range for byte_range in byte_ranges if byte_range is not None]
+    if dry_run:
+        print(f"[bold]Dry run[/bold] of [bold]operations that would be performed[/bold]:")
+        print(f"> Copying {len(byte_ranges)} byte ranges referenced in [code]{reference}[/code] to [code]{cache_directory}[/code]")
+        return  # Exit for a dry run
+
+    cache = ByteRangeCache(cache_directory=cache_directory, maximum_size=cache_size)
+    mode = DisplayMode(verbose)
+    with display_context[mode]:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            warmed_bytes = sum(executor.map(lambda byte_range: len(fetch_byte_range(cache, *byte_range)), byte_ranges))
+
+    print(f"{check_mark} Warmed {len(byte_ranges)} chunks, {naturalsize(warmed_bytes, binary=True)}, in [code]{cache_directory}[/code]")
+    if verbose:
+        print(cache.statistics())
+
+
+def purge_disk_cache(
+    cache_directory: Annotated[Path, typer_argument_disk_cache_directory],
+    stale_only: Annotated[bool, typer.Option(help='Purge only byte ranges of source files that changed since caching')] = False,
+    cache_size: Annotated[Optional[int], typer.Option(help='Evict least-recently-used byte ranges down to this size in bytes')] = None,
+    maximum_age: Annotated[Optional[float], typer_option_disk_cache_maximum_age] = None,
+    dry_run: Annotated[bool, typer_option_dry_run] = False,
+):
+    """Purge a local chunk cache entirely or partially"""
+    cache = ByteRangeCache(cache_directory=cache_directory)
+    if dry_run:
+        print(f"[bold]Dry run[/bold] of [bold]operations that would be performed[/bold]:")
+        print(f"> Purging {sum(1 for _ in cache.entries())} cached byte ranges in [code]{cache_directory}[/code]")
+        return  # Exit for a dry run
+
+    if cache_size is not None or maximum_age is not None:
+        removed = cache.evict(
+            maximum_size=cache_size if cache_size is not None else cache.maximum_size,
+            maximum_age=maximum_age,
+        )
+    else:
+        removed = cache.purge(stale_only=stale_only)
+    print(f"{check_mark} Removed {naturalsize(removed, binary=True)} from [code]{cache_directory}[/code]")
@@ -0,0 +1,154 @@
+"""Journal of completed units of work, for long-running jobs to resume.
+
+Commands over many files, ex. creating references, combining them or
+rechunking, record each completed unit of work, ex. a source file, in a
+SQLite journal along with a fingerprint of its sources and its output. A
+restarted command skips the units recorded as complete whose sources did not
+change since and whose output still exists.
+
+Outputs are written to a temporary path next to their final one and renamed
+once complete, hence a partial output left behind by an interrupted job is
+never mistaken for a complete one.
+"""
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterable
+from typing import List
+from typing import Optional
+from typing import Union
+import hashlib
+import os
+import shutil
+import sqlite3
+import time
+
+
+JOURNAL_FILENAME = '.rekx-journal.sqlite'
+
+
+def fingerprint(paths: Union[Path, Iterable[Path]]) -> str:
+    """Fingerprint one or more source files by name, size and modification
+    time, without reading them"""
+    if isinstance(paths, (str, Path)):
+        status = os.stat(paths)
+        return f'{status.st_size}:{status.st_mtime_ns}'
+    digest = hashlib.md5()
+    for path in sorted(map(str, paths)):
+        digest.update(f'{path}={fingerprint(Path(path))};'.encode())
+    return digest.hexdigest()
+
+
+def get_temporary_path(path: Path) -> Path:
+    """Return the temporary path of an output while being written, in the
+    same directory, hence on the same filesystem, and with the same suffix"""
+    path = Path(path)
+    return path.parent / f'.partial-{os.getpid()}-{path.name}'
+
+
+@contextmanager
+def atomic_output(path: Path):
+    """Yield a temporary path to write a file or directory to, renamed to
+    `path` on success and removed on failure. If nothing is written,
+    `path` is left as is."""
+    path = Path(path)
+    temporary = get_temporary_path(path)
+    remove(temporary)
+    try:
+        yield temporary
+    except BaseException:
+        remove(temporary)
+        raise
+    if not temporary.exists():
+        return
+    if temporary.is_dir() and path.exists():
+        previous = path.parent / f'.previous-{os.getpid()}-{path.name}'
+        os.replace(path, previous)
+        os.replace(temporary, path)
+        remove(previous)
+    else:
+        os.replace(temporary, path)
+
+
+def remove(path: Path) -> None:
+    """Remove a file or directory, if any"""
+    if path.is_dir() and not path.is_symlink():
+        shutil.rmtree(path, ignore_errors=True)
+    elif path.exists() or path.is_symlink():
+        path.unlink()
+
+
+class Journal:
+    """Journal of the completed units of work of a command.
+
+    Only the process driving a command writes to the journal, as workers
+    return their results. The journal can be used as a context manager.
+
+    Parameters
+    ----------
+    path: Path
+        SQLite database, shared by several commands
+    command: str
+        Name of the command whose units are recorded
+    """
+    def __init__(self, path: Path, command: str):
+        self.path = Path(path)
+        self.command = command
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.connection = sqlite3.connect(self.path, timeout=60)
+        self.connection.execute(
+            'CREATE TABLE IF NOT EXISTS units ('
+            'command TEXT, unit TEXT, fingerprint TEXT, output TEXT, completed REAL, '
+            'PRIMARY KEY (command, unit))'
+        )
+        self.connection.commit()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exception):
+        self.close()
+
+    def close(self) -> None:
+        self.connection.close()
+
+    def is_complete(self, unit: str, fingerprint: str) -> bool:
+        """Whether a unit is recorded as complete under the same fingerprint
+        and its output, if any, still exists"""
+        row = self.connection.execute(
+            'SELECT fingerprint, output FROM units WHERE command = ? AND unit = ?',
+            (self.command, str(unit)),
+        ).fetchone()
+        if row is None or row[0] != fingerprint:
+            return False
+        return row[1] is None or Path(row[1]).exists()
+
+    def record(self, unit: str, fingerprint: str, output: Optional[Path] = None) -> None:
+        """Record a unit as complete"""
+        self.connection.execute(
+            'INSERT OR REPLACE INTO units VALUES (?, ?, ?, ?, ?)',
+            (self.command, str(unit), fingerprint, str(output) if output else None, time.time()),
+        )
+        self.connection.commit()
+
+    def pending(self, paths: Iterable[Path]) -> List[Path]:
+        """Select the source files whose unit is not complete"""
+        return [path for path in paths if not self.is_complete(path, fingerprint(path))]
+
+    def forget(self) -> None:
+        """Forget all units of the command"""
+        self.connection.execute('DELETE FROM units WHERE command = ?', (self.command,))
+        self.connection.commit()
+
+
+def open_journal(
+    command: str,
+    output_directory: Path,
+    journal: Optional[Path] = None,
+    resume: bool = True,
+) -> Journal:
+    """Open the journal of a command, by default in its output directory.
+    Without `resume`, previously completed units are forgotten."""
+    journal = Journal(journal or Path(output_directory) / JOURNAL_FILENAME, command=command)
+    if not resume:
+        journal.forget()
+    return journal
@@ -22,6 +22,29 @@ class XarrayVariableSet(str, enum.Enum):
     time = 'time'
 
 
+class ArrowFormat(str, enum.Enum):
+    parquet = 'parquet'
+    feather = 'feather'
+    ipc = 'ipc'  # Arrow IPC file format
+
+
+class ReferenceFormat(str, enum.Enum):
+    json = 'json'
+    parquet = 'parquet'
+    binary = 'binary'  # memory-mapped chunk grids, see `binary_reference`
+
+
+class Executor(str, enum.Enum):
+    thread = 'thread'  # shared memory, for I/O-bound tasks
+    process = 'process'  # for CPU-bound tasks holding the GIL
+    serial = 'serial'  # in the calling process, ex. for profiling
+
+
+class WarmingTarget(str, enum.Enum):
+    page_cache = 'page-cache'  # posix_fadvise(WILLNEED) on the source files
+    disk_cache = 'disk-cache'  # copy byte ranges into the local chunk cache
+
+
 def select_xarray_variable_set_from_dataset(
     xarray_variable_set: Type[enum.Enum],
     variable_set: List[enum.Enum],
@@ -8,9 +8,9 @@ import fsspec
 from fsspec.implementations.reference import LazyReferenceMapper
 from kerchunk.hdf import SingleHdf5ToZarr
 import traceback
-import multiprocessing
 from functools import partial
 from kerchunk.combine import MultiZarrToZarr
+from typing import List
 from typing import Optional
 from typing_extensions import Annotated
 from .typer_parameters import typer_option_verbose
@@ -19,9 +19,40 @@ from .typer_parameters import typer_argument_source_directory
 from .typer_parameters import typer_option_filename_pattern
 from .typer_parameters import typer_option_dry_run
 from .typer_parameters import typer_argument_kerchunk_combined_reference
+from .typer_parameters import typer_option_journal
+from .typer_parameters import typer_option_resume
+from .typer_parameters import typer_option_number_of_workers
+from .typer_parameters import typer_option_executor
+from .typer_parameters import typer_option_reference_variable_set
+from .typer_parameters import typer_option_reference_variables
+from .typer_parameters import typer_option_reference_start_time
+from .typer_parameters import typer_option_reference_end_time
+from .typer_parameters import typer_option_inline_threshold
+from .typer_parameters import typer_option_inline_coordinates
 from .progress import DisplayMode
 from .progress import display_context
+from .journal import atomic_output
+from .journal import fingerprint
+from .journal import open_journal
+from .log import logger
+from .scheduler import map_unordered
+from .models import Executor
+from .models import XarrayVariableSet
+from .reference import REFERENCE_EXECUTOR_DEFAULT
+from .reference import inline_coordinates
+from .reference import get_reference_options_digest
+from .reference import prune_references
 import kerchunk
+import kerchunk.df
+import math
+import tempfile
+import ujson
+import numpy as np
+import pandas as pd
+from humanize import naturalsize
+from rich.box import SIMPLE_HEAD
+from rich.console import Console
+from rich.table import Table
 import xarray as xr
 from .rich_help_panel_names import rich_help_panel_combine
 from .rich_help_panel_names import rich_help_panel_reference
@@ -31,23 +62,49 @@ from .typer_parameters import typer_argument_latitude_in_degrees
 from .typer_parameters import typer_argument_timestamps
 from .typer_parameters import typer_option_start_time
 from .typer_parameters import typer_option_end_time
+from .typer_parameters import typer_option_resample
+from .typer_parameters import typer_option_resample_aggregations
 from .typer_parameters import typer_option_mask_and_scale
 from .models import MethodForInexactMatches
+from .models import ArrowFormat
 from .typer_parameters import typer_option_neighbor_lookup
 from .typer_parameters import typer_option_tolerance
 from .typer_parameters import typer_option_in_memory
 from .typer_parameters import typer_option_statistics
 from .typer_parameters import typer_option_csv
+from .typer_parameters import typer_option_arrow
+from .typer_parameters import typer_option_arrow_format
+from .typer_parameters import typer_option_arrow_compression
+from .typer_parameters import typer_option_arrow_partition
 from .typer_parameters import typer_option_variable_name_as_suffix
 from .typer_parameters import typer_option_rounding_places
+from .typer_parameters import typer_option_chunk_cache_size
+from .typer_parameters import typer_option_chunk_cache_directory
+from .typer_parameters import typer_option_disk_cache_directory
+from .typer_parameters import typer_option_disk_cache_size
 from .constants import ROUNDING_PLACES_DEFAULT
+from .constants import RESAMPLE_AGGREGATIONS_DEFAULT
+from .constants import ARROW_COMPRESSION_DEFAULT
 from .constants import DEFAULT_RECORD_SIZE
+from .constants import RECORD_SIZE_MAXIMUM
+from .constants import PATH_CATEGORICAL_THRESHOLD
+from .constants import INLINE_THRESHOLD_DEFAULT
+from .constants import CHUNK_CACHE_SIZE_DEFAULT
+from .constants import DISK_CACHE_SIZE_DEFAULT
+from .cache import open_reference_mapper
+from .cache import collect_cache_statistics
+from .print import print_chunk_cache_statistics
+from .log import logger
 import time as timer
 from .utilities import set_location_indexers
+from .chunks import select_time_chunks
 from .messages import ERROR_IN_SELECTING_DATA
 from rekx.hardcodings import exclamation_mark
+from rekx.hardcodings import check_mark
 from rekx.statistics import print_series_statistics
+from .resample import resample_series
 from .csv import to_csv
+from .arrow import to_arrow
 from typing import Any
 from datetime import datetime
 from rich import print
@@ -63,31 +120,115 @@ from rich import print
 # )
 
 
+def get_record_size(references: dict) -> int:
+    """Number of references per record of a Parquet store, as many as the
+    chunks of the largest variable, so that resolving the chunks of any
+    variable loads a single record, up to `RECORD_SIZE_MAXIMUM`"""
+    refs = references.get('refs', references)
+    number_of_chunks = [1]
+    for key, value in refs.items():
+        if key.endswith('/.zarray'):
+            zarray = ujson.loads(value)
+            number_of_chunks.append(
+                math.prod(
+                    math.ceil(length / chunk) if chunk else 1
+                    for length, chunk in zip(zarray['shape'], zarray['chunks'])
+                )
+            )
+    return min(max(number_of_chunks), RECORD_SIZE_MAXIMUM)
+
+
+def get_chunk_sort_key(key: str):
+    """Sort key of a reference : variable, metadata first, then chunk index"""
+    variable, _, chunk = key.rpartition('/')
+    if chunk.startswith('.'):
+        return variable, 0, ()
+    return variable, 1, tuple(int(index) for index in chunk.split('.'))
+
+
+def write_parquet_references(
+    references: dict,
+    output_parquet_store: Path,
+    record_size: Optional[int] = None,
+    categorical_threshold: int = PATH_CATEGORICAL_THRESHOLD,
+) -> Path:
+    """Write a reference set to a Parquet store
+
+    References are sorted by variable and chunk index, hence records are
+    written once complete and neighbouring rows, referencing neighbouring
+    byte ranges, compress well. Paths are dictionary-encoded.
+
+    Parameters
+    ----------
+    references: dict
+        Kerchunk reference set
+    output_parquet_store: Path
+        Directory of the Parquet store
+    record_size: int, optional
+        References per record, see `get_record_size` for the default
+    categorical_threshold: int
+        Dictionary-encode the paths of a record if each is repeated this
+        many times on average, 0 to store plain strings
+    """
+    refs = references.get('refs', references)
+    sorted_references = {
+        'version': 1,
+        'refs': {key: refs[key] for key in sorted(refs, key=get_chunk_sort_key)},
+    }
+    kerchunk.df.refs_to_dataframe(
+        sorted_references,
+        str(output_parquet_store),  # does not handle Path
+        record_size=record_size or get_record_size(sorted_references),
+        categorical_threshold=categorical_threshold,
+    )
+    return output_parquet_store
+
+
 def create_parquet_store(
     input_file: Path,
     output_parquet_store: Path,
-    record_size: int = DEFAULT_RECORD_SIZE,
+    record_size: Optional[int] = None,
+    inline_threshold: int = INLINE_THRESHOLD_DEFAULT,
+    inline_coordinate_variables: bool = True,
+    variable_set: XarrayVariableSet = XarrayVariableSet.all,
+    variables: Optional[List[str]] = None,
+    start_time: Optional[datetime] = None,
+    end_time: Optional[datetime] = None,
 ):
-    """ """
+    """Reference an HDF5/NetCDF file in a Parquet store, in which inlined
+    chunks are stored as raw bytes rather than encoded. References can be
+    pruned, see `prune_references`. Returns None, creating no store, if no
+    time step of the file is in the requested period."""
     log_messages = []
     log_messages.append('Logging execution of create_parquet_store()')
-    output_parquet_store.mkdir(parents=True, exist_ok=True)
 
     try:
-        log_messages.append(f'Creating a filesystem mapper for {output_parquet_store}')
-        filesystem = fsspec.filesystem("file")
-        output = LazyReferenceMapper.create(
-            root=str(output_parquet_store),  # does not handle Path
-            fs=filesystem,
-            record_size=record_size,
-        )
-        log_messages.append(f'Created the filesystem mapper {output}')
-
         log_messages.append(f'Kerchunking the file {input_file}')
-        single_zarr = SingleHdf5ToZarr(str(input_file), out=output)
-        single_zarr.translate()
+        single_zarr = SingleHdf5ToZarr(str(input_file), inline_threshold=inline_threshold)
+        references = single_zarr.translate()
+        references = prune_references(
+            references,
+            input_file,
+            variable_set=variable_set,
+            variables=variables,
+            start_time=start_time,
+            end_time=end_time,
+        )
+        if references is None:
+            log_messages.append(f'No time step of {input_file} in the requested period')
+            return None
+        if inline_coordinate_variables:
+            inline_coordinates(references)
         log_messages.append(f'Kerchunked the file {input_file}')
 
+        log_messages.append(f'Writing the references to {output_parquet_store}')
+        output_parquet_store.mkdir(parents=True, exist_ok=True)
+        write_parquet_references(
+            references,
+            output_parquet_store,
+            record_size=record_size,
+        )
+
     except Exception as e:
         print(f"Failed processing file [code]{input_file}[/code] : {e}")
         log_messages.append(f"Exception occurred: {e}")
@@ -109,17 +250,36 @@ def create_parquet_store(
 def create_single_parquet_store(
     input_file_path,
     output_directory,
-    record_size: int = DEFAULT_RECORD_SIZE,
+    record_size: Optional[int] = None,
+    inline_threshold: int = INLINE_THRESHOLD_DEFAULT,
+    inline_coordinate_variables: bool = True,
+    variable_set: XarrayVariableSet = XarrayVariableSet.all,
+    variables: Optional[List[str]] = None,
+    start_time: Optional[datetime] = None,
+    end_time: Optional[datetime] = None,
     verbose: int = 0,
 ):
-    """Helper function for create_multiple_parquet_stores()"""
+    """Helper function for create_multiple_parquet_stores()
+
+    Returns None if no time step of the file is in the requested period."""
     filename = input_file_path.stem
     single_parquet_store = output_directory / f"{filename}.parquet"
-    create_parquet_store(
-        input_file_path,
-        output_parquet_store=single_parquet_store,
-        record_size=record_size,
-    )
+    with atomic_output(single_parquet_store) as temporary_parquet_store:
+        parquet_store = create_parquet_store(
+            input_file_path,
+            output_parquet_store=temporary_parquet_store,
+            record_size=record_size,
+            inline_threshold=inline_threshold,
+            inline_coordinate_variables=inline_coordinate_variables,
+            variable_set=variable_set,
+            variables=variables,
+            start_time=start_time,
+            end_time=end_time,
+        )
+    if parquet_store is None:
+        if verbose > 0:
+            print(f'No time step of [code]{input_file_path}[/code] in the requested period')
+        return None
     if verbose > 0:
         print(f'Created the [code]{single_parquet_store}[/code] Parquet store')
 
@@ -131,16 +291,28 @@ def create_single_parquet_store(
         )
         print(dataset)
 
+    return single_parquet_store
+
 
 def create_multiple_parquet_stores(
     source_directory: Path,
     output_directory: Path,
     pattern: str = "*.nc",
-    record_size: int = DEFAULT_RECORD_SIZE,
-    workers: int = 4,
+    record_size: Optional[int] = None,
+    inline_threshold: int = INLINE_THRESHOLD_DEFAULT,
+    inline_coordinate_variables: bool = True,
+    variable_set: XarrayVariableSet = XarrayVariableSet.all,
+    variables: Optional[List[str]] = None,
+    start_time: Optional[datetime] = None,
+    end_time: Optional[datetime] = None,
+    workers: Optional[int] = None,
+    executor: Executor = REFERENCE_EXECUTOR_DEFAULT,
+    journal: Optional[Path] = None,
+    resume: bool = True,
     verbose: int = 0,
 ):
-    """ """
+    """Create a Parquet store for each file, skipping the files recorded as
+    complete in the journal"""
     input_file_paths = list(source_directory.glob(pattern))
     if verbose:
         print(f'Input file paths : {input_file_paths}')
@@ -149,15 +321,41 @@ def create_multiple_parquet_stores(
         )
         return
     output_directory.mkdir(parents=True, exist_ok=True)
-    with multiprocessing.Pool(processes=workers) as pool:
-        print(f'Creating Parquet stores in [code]{output_directory}[/code]')
+    options = get_reference_options_digest(
+        inline_threshold,
+        inline_coordinate_variables,
+        variable_set,
+        variables,
+        start_time,
+        end_time,
+        record_size=record_size,
+    )
+    with open_journal(f'reference-multi-parquet-{options}', output_directory, journal, resume) as journal:
+        pending_file_paths = journal.pending(input_file_paths)
+        print(f'Creating Parquet stores in [code]{output_directory}[/code], skipping {len(input_file_paths) - len(pending_file_paths)} complete')
         partial_create_parquet_references = partial(
             create_single_parquet_store,
             output_directory=output_directory,
             record_size=record_size,
+            inline_threshold=inline_threshold,
+            inline_coordinate_variables=inline_coordinate_variables,
+            variable_set=variable_set,
+            variables=variables,
+            start_time=start_time,
+            end_time=end_time,
             verbose=verbose,
         )
-        pool.map(partial_create_parquet_references, input_file_paths)
+        results = map_unordered(
+            partial_create_parquet_references,
+            pending_file_paths,
+            workers=workers,
+            executor=executor,
+        )
+        for input_file_path, single_parquet_store, exception in results:
+            if exception:
+                logger.error(f"Error creating a Parquet store for {input_file_path} : {exception}")
+                continue
+            journal.record(input_file_path, fingerprint(input_file_path), single_parquet_store)
     if verbose:
         print(f'Done!')
 
@@ -177,6 +375,7 @@ def combine_multiple_parquet_stores(
             root=str(output_parquet_store),
             fs=filesystem,
             record_size=record_size,
+            categorical_threshold=PATH_CATEGORICAL_THRESHOLD,
         )
         input_references = list(source_directory.glob(pattern))
         input_references = list(map(str, input_references))
@@ -199,6 +398,116 @@ def combine_multiple_parquet_stores(
         # return
 
 
+def get_directory_size(directory: Path) -> int:
+    """Size of the files in a directory, in bytes"""
+    return sum(path.stat().st_size for path in Path(directory).rglob('*') if path.is_file())
+
+
+def benchmark_parquet_references(
+    references: dict,
+    record_sizes: List[Optional[int]],
+    lookups: int = 100,
+    seed: int = 0,
+) -> pd.DataFrame:
+    """Benchmark Parquet stores of a reference set written with different
+    record sizes, with and without dictionary-encoded paths
+
+    Parameters
+    ----------
+    references: dict
+        Kerchunk reference set
+    record_sizes: list of int
+        References per record, None for `get_record_size`
+    lookups: int
+        Number of chunk references resolved, chosen at random
+    seed: int
+        Seed of the random choice of resolved references
+
+    Returns
+    -------
+    pd.DataFrame
+        One row per setting : the `Record size`, whether `Dictionary` encoded,
+        the `Size` on disk in bytes, the `Open time` and the mean `Lookup time`
+        of a reference from a freshly opened store, in seconds
+    """
+    refs = references.get('refs', references)
+    chunk_keys = [
+        key for key in refs
+        if not key.rpartition('/')[2].startswith('.') and isinstance(refs[key], list)
+    ]
+    random = np.random.default_rng(seed)
+    sample = [chunk_keys[index] for index in random.choice(len(chunk_keys), min(lookups, len(chunk_keys)), replace=False)] if chunk_keys else []
+    filesystem = fsspec.filesystem('file')
+    rows = []
+    for record_size in record_sizes:
+        for dictionary in (True, False):
+            with tempfile.TemporaryDirectory(prefix='rekx-parquet-benchmark-') as directory:
+                store = Path(directory) / 'references.parquet'
+                write_parquet_references(
+                    references,
+                    store,
+                    record_size=record_size,
+                    categorical_threshold=PATH_CATEGORICAL_THRESHOLD if dictionary else 0,
+                )
+                start = timer.perf_counter()
+                mapper = LazyReferenceMapper(root=str(store), fs=filesystem)
+                open_time = timer.perf_counter() - start
+                start = timer.perf_counter()
+                for key in sample:
+                    mapper[key]
+                lookup_time = (timer.perf_counter() - start) / max(len(sample), 1)
+                rows.append({
+                    'Record size': record_size or get_record_size(references),
+                    'Dictionary': dictionary,
+                    'Size': get_directory_size(store),
+                    'Open time': open_time,
+                    'Lookup time': lookup_time,
+                })
+    return pd.DataFrame(rows)
+
+
+def print_parquet_references_benchmark(benchmark: pd.DataFrame, title: Optional[str] = None) -> None:
+    """Print a benchmark of Parquet reference stores"""
+    table = Table(title=title, show_header=True, header_style="bold magenta", box=SIMPLE_HEAD)
+    table.add_column("Record size", no_wrap=True)
+    table.add_column("Dictionary", no_wrap=True)
+    table.add_column("Size", no_wrap=True)
+    table.add_column("Open time", no_wrap=True)
+    table.add_column("Lookup time", no_wrap=True)
+    for _, row in benchmark.iterrows():
+        table.add_row(
+            str(row['Record size']),
+            str(row['Dictionary']),
+            naturalsize(row['Size'], binary=True),
+            f"{row['Open time'] * 1e3:.3f} ms",
+            f"{row['Lookup time'] * 1e6:.1f} µs",
+        )
+    console = Console()
+    console.print(table)
+
+
+def parquet_reference_benchmark(
+    input_file: Annotated[Path, typer.Argument(help='HDF5/NetCDF file to reference')],
+    record_sizes: Annotated[str, typer.Option(help='Comma-separated references per record, [code]auto[/code] for as many as the chunks of the largest variable')] = f'auto,1000,{DEFAULT_RECORD_SIZE},{RECORD_SIZE_MAXIMUM}',
+    lookups: Annotated[int, typer.Option(help='Number of chunk references resolved, chosen at random')] = 100,
+    inline_threshold: Annotated[int, typer_option_inline_threshold] = INLINE_THRESHOLD_DEFAULT,
+    verbose: Annotated[int, typer_option_verbose] = VERBOSE_LEVEL_DEFAULT,
+):
+    """Compare the on-disk size, open time and lookup latency of Parquet
+    reference stores written with different settings"""
+    single_zarr = SingleHdf5ToZarr(str(input_file), inline_threshold=inline_threshold)
+    references = single_zarr.translate()
+    record_sizes = [
+        None if record_size.strip() == 'auto' else int(record_size)
+        for record_size in record_sizes.split(',')
+    ]
+    if verbose:
+        print(f"Benchmarking {len(references['refs'])} references to [code]{input_file}[/code]")
+    benchmark = benchmark_parquet_references(references, record_sizes, lookups=lookups)
+    print_parquet_references_benchmark(benchmark, title=f'Parquet references to {input_file.name}')
+    return benchmark
+
+
 # @app.command(
 #     "reference-parquet",
 #     no_args_is_help=True,
@@ -208,7 +517,13 @@ def combine_multiple_parquet_stores(
 def parquet_reference(
     input_file: Path,
     output_directory: Optional[Path] = '.',
-    record_size: int = DEFAULT_RECORD_SIZE,
+    record_size: Optional[int] = None,
+    inline_threshold: Annotated[int, typer_option_inline_threshold] = INLINE_THRESHOLD_DEFAULT,
+    inline_coordinates: Annotated[bool, typer_option_inline_coordinates] = True,
+    variable_set: Annotated[XarrayVariableSet, typer_option_reference_variable_set] = XarrayVariableSet.all,
+    variables: Annotated[Optional[List[str]], typer_option_reference_variables] = None,
+    start_time: Annotated[Optional[datetime], typer_option_reference_start_time] = None,
+    end_time: Annotated[Optional[datetime], typer_option_reference_end_time] = None,
     dry_run: Annotated[bool, typer_option_dry_run] = False,
     verbose: Annotated[int, typer_option_verbose] = VERBOSE_LEVEL_DEFAULT,
 ):
@@ -227,6 +542,12 @@ def parquet_reference(
         input_file_path=input_file,
         output_directory=output_directory,
         record_size=record_size,
+        inline_threshold=inline_threshold,
+        inline_coordinate_variables=inline_coordinates,
+        variable_set=variable_set,
+        variables=variables,
+        start_time=start_time,
+        end_time=end_time,
         verbose=verbose,
     )
 
@@ -241,8 +562,17 @@ def parquet_multi_reference(
     source_directory: Path,
     output_directory: Optional[Path] = '.',
     pattern: str = "*.nc",
-    record_size: int = DEFAULT_RECORD_SIZE,
-    workers: int = 4,
+    record_size: Optional[int] = None,
+    inline_threshold: Annotated[int, typer_option_inline_threshold] = INLINE_THRESHOLD_DEFAULT,
+    inline_coordinates: Annotated[bool, typer_option_inline_coordinates] = True,
+    variable_set: Annotated[XarrayVariableSet, typer_option_reference_variable_set] = XarrayVariableSet.all,
+    variables: Annotated[Optional[List[str]], typer_option_reference_variables] = None,
+    start_time: Annotated[Optional[datetime], typer_option_reference_start_time] = None,
+    end_time: Annotated[Optional[datetime], typer_option_reference_end_time] = None,
+    workers: Annotated[Optional[int], typer_option_number_of_workers] = None,
+    executor: Annotated[Executor, typer_option_executor] = REFERENCE_EXECUTOR_DEFAULT,
+    journal: Annotated[Optional[Path], typer_option_journal] = None,
+    resume: Annotated[bool, typer_option_resume] = True,
     dry_run: Annotated[bool, typer_option_dry_run] = False,
     verbose: Annotated[int, typer_option_verbose] = VERBOSE_LEVEL_DEFAULT,
 ):
@@ -269,7 +599,16 @@ def parquet_multi_reference(
         output_directory=output_directory,
         pattern=pattern,
         record_size=record_size,
+        inline_threshold=inline_threshold,
+        inline_coordinate_variables=inline_coordinates,
+        variable_set=variable_set,
+        variables=variables,
+        start_time=start_time,
+        end_time=end_time,
         workers=workers,
+        executor=executor,
+        journal=journal,
+        resume=resume,
         verbose=verbose,
     )
 
@@ -284,6 +623,10 @@ def combine_parquet_stores_to_parquet(
     source_directory: Annotated[Path, typer_argument_source_directory],
     pattern: Annotated[str, typer_option_filename_pattern] = "*.parquet",
     combined_reference: Annotated[Path, typer_argument_kerchunk_combined_reference] = "combined_kerchunk.parq",
+    record_size: Annotated[int, typer.Option(help='References per record of the combined Parquet store')] = DEFAULT_RECORD_SIZE,
+    inline_threshold: Annotated[int, typer_option_inline_threshold] = INLINE_THRESHOLD_DEFAULT,
+    journal: Annotated[Optional[Path], typer_option_journal] = None,
+    resume: Annotated[bool, typer_option_resume] = True,
     dry_run: Annotated[bool, typer.Option("--dry-run", help="Run the command without making any changes.")] = False,
     verbose: Annotated[int, typer_option_verbose] = VERBOSE_LEVEL_DEFAULT,
 ):
@@ -303,36 +646,44 @@ def combine_parquet_stores_to_parquet(
             print(f"> Writing combined reference file to [code]{combined_reference}[/code]")
             return  # Exit for a dry run
 
-        # Create LazyReferenceMapper to pass to MultiZarrToZarr
-        filesystem = fsspec.filesystem("file")
-        import os
-
-        combined_reference.mkdir(parents=True, exist_ok=True)
-        print(f'Combined reference name : {combined_reference}')
-        from fsspec.implementations.reference import LazyReferenceMapper
-        output_lazy = LazyReferenceMapper(
-                root=str(combined_reference),
-                fs=filesystem,
-                cache_size=1000,
-        )
-
-        from kerchunk.combine import MultiZarrToZarr
-
-        # Combine single references
-        mzz = MultiZarrToZarr(
-            reference_file_paths,
-            remote_protocol="file",
-            concat_dims=["time"],
-            identical_dims=["lat", "lon"],
-            out=output_lazy,
-        )
-        multifile_kerchunk = mzz.translate()
-
-        output_lazy.flush()  # Write all non-full reference batches
+        combined_reference = Path(combined_reference)
+        options = get_reference_options_digest(inline_threshold, record_size=record_size)
+        with open_journal(f'combine-parquet-stores-{options}', combined_reference.parent, journal, resume) as journal:
+            sources_fingerprint = fingerprint(reference_file_paths)
+            if journal.is_complete(combined_reference, sources_fingerprint):
+                print(f"{check_mark} Combined reference [code]{combined_reference}[/code] is up to date")
+                return
+
+            # Create LazyReferenceMapper to pass to MultiZarrToZarr
+            filesystem = fsspec.filesystem("file")
+            with atomic_output(combined_reference) as temporary_reference:
+                temporary_reference.mkdir(parents=True, exist_ok=True)
+                print(f'Combined reference name : {combined_reference}')
+                from fsspec.implementations.reference import LazyReferenceMapper
+                output_lazy = LazyReferenceMapper.create(
+                        root=str(temporary_reference),
+                        fs=filesystem,
+                        record_size=record_size,
+                        categorical_threshold=PATH_CATEGORICAL_THRESHOLD,
+                )
+
+                from kerchunk.combine import MultiZarrToZarr
+
+                # Combine single references
+                mzz = MultiZarrToZarr(
+                    reference_file_paths,
+                    remote_protocol="file",
+                    concat_dims=["time"],
+                    identical_dims=["lat", "lon"],
+                    inline_threshold=inline_threshold,
+                    out=output_lazy,
+                )
+                mzz.translate()
+
+                output_lazy.flush()  # Write all non-full reference batches
+            journal.record(combined_reference, sources_fingerprint, combined_reference)
 
         # Read from the Parquet storage
-        kerchunk.df.refs_to_dataframe(multifile_kerchunk, str(combined_reference))
-
         filesystem = fsspec.implementations.reference.ReferenceFileSystem(
             fo=str(combined_reference),
             target_protocol='file',
@@ -378,6 +729,8 @@ def select_from_parquet(
     timestamps: Annotated[Optional[Any], typer_argument_timestamps] = None,
     start_time: Annotated[Optional[datetime], typer_option_start_time] = None,
     end_time: Annotated[Optional[datetime], typer_option_end_time] = None,
+    resample: Annotated[Optional[str], typer_option_resample] = None,
+    how: Annotated[str, typer_option_resample_aggregations] = RESAMPLE_AGGREGATIONS_DEFAULT,
     time: Annotated[Optional[int], typer.Option(help="New chunk size for the 'time' dimension")] = None,
     lat: Annotated[Optional[int], typer.Option(help="New chunk size for the 'lat' dimension")] = None,
     lon: Annotated[Optional[int], typer.Option(help="New chunk size for the 'lon' dimension")]= None,
@@ -388,9 +741,17 @@ def select_from_parquet(
     in_memory: Annotated[bool, typer_option_in_memory] = False,
     statistics: Annotated[bool, typer_option_statistics] = False,
     csv: Annotated[Path, typer_option_csv] = None,
+    arrow: Annotated[Optional[Path], typer_option_arrow] = None,
+    arrow_format: Annotated[Optional[ArrowFormat], typer_option_arrow_format] = None,
+    compression: Annotated[str, typer_option_arrow_compression] = ARROW_COMPRESSION_DEFAULT,
+    partition: Annotated[bool, typer_option_arrow_partition] = False,
     # output_filename: Annotated[Path, typer_option_output_filename] = 'series_in',  #Path(),
     variable_name_as_suffix: Annotated[bool, typer_option_variable_name_as_suffix] = True,
     rounding_places: Annotated[Optional[int], typer_option_rounding_places] = ROUNDING_PLACES_DEFAULT,
+    chunk_cache_size: Annotated[int, typer_option_chunk_cache_size] = CHUNK_CACHE_SIZE_DEFAULT,
+    chunk_cache_directory: Annotated[Optional[Path], typer_option_chunk_cache_directory] = None,
+    disk_cache_directory: Annotated[Optional[Path], typer_option_disk_cache_directory] = None,
+    disk_cache_size: Annotated[int, typer_option_disk_cache_size] = DISK_CACHE_SIZE_DEFAULT,
     verbose: Annotated[int, typer_option_verbose] = VERBOSE_LEVEL_DEFAULT,
 ) -> None:
     """Select data from a Parquet store"""
@@ -414,14 +775,29 @@ def select_from_parquet(
     # timer_end = timer.time()
     # logger.debug(f"Mapper creation took {timer_end - timer_start:.2f} seconds")
     timer_start = timer.time()
-    dataset = xr.open_dataset(
-        str(parquet_store),  # does not handle Path
-        engine="kerchunk",
-        storage_options=dict(skip_instance_cache=True, remote_protocol="file"),
-        # backend_kwargs={"consolidated": False},
-        # chunks=None,
-        # mask_and_scale=mask_and_scale,
-    )
+    if chunk_cache_size or disk_cache_directory:
+        mapper = open_reference_mapper(
+            reference=parquet_store,
+            chunk_cache_size=chunk_cache_size,
+            chunk_cache_directory=chunk_cache_directory,
+            disk_cache_directory=disk_cache_directory,
+            disk_cache_size=disk_cache_size,
+        )
+        dataset = xr.open_dataset(
+            mapper,
+            engine="zarr",
+            backend_kwargs={"consolidated": False},
+            chunks=None,
+        )
+    else:
+        dataset = xr.open_dataset(
+            str(parquet_store),  # does not handle Path
+            engine="kerchunk",
+            storage_options=dict(skip_instance_cache=True, remote_protocol="file"),
+            # backend_kwargs={"consolidated": False},
+            # chunks=None,
+            # mask_and_scale=mask_and_scale,
+        )
     timer_end = timer.time()
     logger.debug(f"Dataset opening via Xarray took {timer_end - timer_start:.2f} seconds")
 
@@ -475,22 +851,14 @@ def select_from_parquet(
     if start_time or end_time:
         timestamps = None  # we don't need a timestamp anymore!
 
-        if start_time and not end_time:  # set `end_time` to end of series
-            end_time = location_time_series.time.values[-1]
-
-        elif end_time and not start_time:  # set `start_time` to beginning of series
-            start_time = location_time_series.time.values[0]
-
-        else:  # Convert `start_time` & `end_time` to the correct string format
-            start_time = start_time.strftime('%Y-%m-%d %H:%M:%S')
-            end_time = end_time.strftime('%Y-%m-%d %H:%M:%S')
-    
         timer_start = timer.time()
-        location_time_series = (
-            location_time_series.sel(time=slice(start_time, end_time))
+        location_time_series, time_chunks = select_time_chunks(
+            data_array=location_time_series,
+            start_time=start_time,
+            end_time=end_time,
         )
         timer_end = timer.time()
-        logger.debug(f"Time slicing with `start_time` and `end_time` took {timer_end - timer_start:.2f} seconds")
+        logger.debug(f"Time slicing with `start_time` and `end_time` over {len(time_chunks)} time chunks took {timer_end - timer_start:.2f} seconds")
 
     if timestamps is not None and not start_time and not end_time:
         if len(timestamps) == 1:
@@ -498,11 +866,13 @@ def select_from_parquet(
         
         try:
             timer_start = timer.time()
-            location_time_series = (
-                location_time_series.sel(time=timestamps, method=neighbor_lookup)
+            location_time_series, time_chunks = select_time_chunks(
+                data_array=location_time_series,
+                timestamps=timestamps,
+                method=neighbor_lookup,
             )
             timer_end = timer.time()
-            logger.debug(f"Time selection with `timestamps` took {timer_end - timer_start:.2f} seconds")
+            logger.debug(f"Time selection with `timestamps` over {len(time_chunks)} time chunks took {timer_end - timer_start:.2f} seconds")
 
         except KeyError:
             print(f"No data found for one or more of the given {timestamps}.")
@@ -525,6 +895,10 @@ def select_from_parquet(
     data_retrieval_end_time = timer.time()
     logger.debug(f"Data retrieval took {data_retrieval_end_time - data_retrieval_start_time:.2f} seconds")
 
+    if verbose and (chunk_cache_size or disk_cache_directory):
+        for title, cache_statistics in collect_cache_statistics(mapper).items():
+            print_chunk_cache_statistics(cache_statistics, title=title)
+
     timer_start = timer.time()
     results = {
         location_time_series.name: location_time_series.to_numpy(),
@@ -550,6 +924,16 @@ def select_from_parquet(
         timer_end = timer.time()
         logger.debug(f"Printing statistics in the console took {timer_end - timer_start:.2f} seconds")
 
+    if resample:
+        timer_start = timer.time()
+        location_time_series = resample_series(
+            data_array=location_time_series,
+            frequency=resample,
+            how=how,
+        )
+        timer_end = timer.time()
+        logger.debug(f"Resampling to {resample} took {timer_end - timer_start:.2f} seconds")
+
     if csv:
         timer_start = timer.time()
         to_csv(
@@ -559,6 +943,18 @@ def select_from_parquet(
         timer_end = timer.time()
         logger.debug(f"Exporting to CSV took {timer_end - timer_start:.2f} seconds")
 
+    if arrow:
+        timer_start = timer.time()
+        to_arrow(
+            x=location_time_series,
+            path=arrow,
+            output_format=arrow_format,
+            compression=compression,
+            partition=partition,
+        )
+        timer_end = timer.time()
+        logger.debug(f"Exporting to {arrow_format or 'Arrow'} took {timer_end - timer_start:.2f} seconds")
+
     # return location_time_series
 
 
@@ -644,18 +1040,10 @@ def read_from_parquet(
     if start_time or end_time:
         timestamps = None  # we don't need a timestamp anymore!
 
-        if start_time and not end_time:  # set `end_time` to end of series
-            end_time = location_time_series.time.values[-1]
-
-        elif end_time and not start_time:  # set `start_time` to beginning of series
-            start_time = location_time_series.time.values[0]
-
-        else:  # Convert `start_time` & `end_time` to the correct string format
-            start_time = start_time.strftime('%Y-%m-%d %H:%M:%S')
-            end_time = end_time.strftime('%Y-%m-%d %H:%M:%S')
-    
-        location_time_series = (
-            location_time_series.sel(time=slice(start_time, end_time))
+        location_time_series, _ = select_time_chunks(
+            data_array=location_time_series,
+            start_time=start_time,
+            end_time=end_time,
         )
 
     if timestamps is not None and not start_time and not end_time:
@@ -663,8 +1051,10 @@ def read_from_parquet(
             start_time = end_time = timestamps[0]
         
         try:
-            location_time_series = (
-                location_time_series.sel(time=timestamps, method=neighbor_lookup)
+            location_time_series, _ = select_time_chunks(
+                data_array=location_time_series,
+                timestamps=timestamps,
+                method=neighbor_lookup,
             )
 
         except KeyError:
@@ -60,7 +60,11 @@ from rich.table import Table
 
 def format_compression(compression_dictionary):
     if isinstance(compression_dictionary, dict):
-        filters = [key for key, value in compression_dictionary.items() if value and key != 'complevel']
+        filters = [
+            value.get('compressor', key) if isinstance(value, dict) else key  # ex. blosc_lz4
+            for key, value in compression_dictionary.items()
+            if value and key != 'complevel'
+        ]
         compression_level = compression_dictionary.get('complevel', None)  # old naming habits!
         return {'Filters':', '.join(filters), 'Level': compression_level}
     return compression_dictionary
@@ -200,3 +204,46 @@ def print_metadata_series_long_table(
             table.add_row("")  # Add an empty line between 'files' for clarity
 
     console.print(table)
+
+
+def print_chunk_cache_statistics(
+    cache_statistics: dict,
+    title: str = 'Chunk cache',
+):
+    """Print the counters of a chunk cache"""
+    table = Table(
+        title=title,
+        show_header=True,
+        header_style="bold magenta",
+        box=SIMPLE_HEAD,
+    )
+    table.add_column("Counter", justify="right", style="magenta", no_wrap=True)
+    table.add_column("Value", style="cyan")
+    for key, value in cache_statistics.items():
+        table.add_row(key, f'{value:.2f}' if isinstance(value, float) else str(value))
+
+    console = Console()
+    console.print(table)
+
+
+def print_disk_cache_table(
+    summary: dict,
+    title: str = 'Chunk cache',
+):
+    """Print the source files of a local cache of raw chunk byte ranges"""
+    table = Table(
+        title=title,
+        show_header=True,
+        header_style="bold magenta",
+        box=SIMPLE_HEAD,
+    )
+    table.add_column("Source", style="dim", no_wrap=True)
+    for key in next(iter(summary.values()), {}).keys():
+        table.add_column(key, no_wrap=True)
+
+    for source, details in summary.items():
+        row = [source] + [str(value) for value in details.values()]
+        table.add_row(*row)
+
+    console = Console()
+    console.print(table)
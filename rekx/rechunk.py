@@ -3,26 +3,42 @@ from typing_extensions import Annotated
 from typing import Any
 from typing import Optional
 from typing import List
+from typing import Tuple
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from functools import partial
 from datetime import datetime
 from threading import Lock
 import typer
 from .typer_parameters import OrderCommands
 from .log import logger
 from pathlib import Path
+import numpy as np
 import xarray as xr
 import netCDF4 as nc
 from netCDF4 import Dataset
 from enum import Enum
 from .typer_parameters import typer_option_dry_run
 from rekx.typer_parameters import typer_option_verbose
+from rekx.typer_parameters import typer_option_number_of_workers
 from rekx.constants import VERBOSE_LEVEL_DEFAULT
+from rekx.constants import ZARR_FORMAT_DEFAULT
 from .rich_help_panel_names import rich_help_panel_rechunking
 from rich import print
 from rekx.messages import NOT_IMPLEMENTED_CLI
+import os
 import subprocess
 import shlex
 from .models import XarrayVariableSet
 from .models import select_xarray_variable_set_from_dataset
+from .scheduler import map_unordered
+from .scheduler import order_by_size
+from .compression import encode
+from .journal import atomic_output
+from .compression import get_codec_specification
+from .compression import get_zarr_codecs
+from .compression import parse_codec
 
 
 CACHE_SIZE_DEFAULT = 16777216
@@ -31,9 +47,40 @@ CACHE_PREEMPTION_DEFAULT = 0.75
 COMPRESSION_FILTER_DEFAULT = 'zlib'
 COMPRESSION_LEVEL_DEFAULT = 4
 SHUFFLING_DEFAULT = None
+QUANTIZE_MODE_DEFAULT = 'BitGroom'
 RECHUNK_IN_MEMORY_DEFAULT = False
 DRY_RUN_DEFAULT = True
 SPATIAL_SYMMETRY_DEFAULT = True
+COMPRESSION_FILTERS = (
+    'zlib',
+    'zstd',
+    'bzip2',
+    'szip',
+    'blosc_lz',
+    'blosc_lz4',
+    'blosc_lz4hc',
+    'blosc_zlib',
+    'blosc_zstd',
+)
+COMPRESSION_FILTER_ALIASES = {
+    'lz4': 'blosc_lz4',
+    'blosc': 'blosc_lz4',
+}
+HDF5_FILTER_IDENTIFIERS = {  # registered HDF5 filter plugins
+    'bzip2': 307,
+    'zstd': 32015,
+    'blosc': 32001,
+}
+BLOSC_COMPRESSOR_CODES = {
+    'blosc_lz': 0,
+    'blosc_lz4': 1,
+    'blosc_lz4hc': 2,
+    'blosc_zlib': 4,
+    'blosc_zstd': 5,
+}
+NETCDF4_SHUFFLING_FILTERS = ('zlib',)  # shuffled through the HDF5 shuffle filter by netCDF4
+SZIP_OPTIONS_MASK = 32  # nearest neighbour coding
+SZIP_PIXELS_PER_BLOCK = 32
 
 
 # app = typer.Typer(
@@ -74,6 +121,263 @@ def modify_chunk_size(
             print(f"Variable '{variable}' in file '{netcdf_file}' is not chunked. Skipping.")
 
 
+def normalise_compression_filter(compression: Optional[str]) -> Optional[str]:
+    """Return the NetCDF4 name of a compression filter, ex. `blosc_lz4` for
+    `lz4`, or None for no compression"""
+    if compression is None or compression.lower() in ('none', ''):
+        return None
+    compression = compression.lower().replace('-', '_')
+    compression = COMPRESSION_FILTER_ALIASES.get(compression, compression)
+    if compression not in COMPRESSION_FILTERS:
+        raise ValueError(
+            f"Unknown compression filter `{compression}`, choose among {list(COMPRESSION_FILTERS) + list(COMPRESSION_FILTER_ALIASES)} or `none`"
+        )
+    return compression
+
+
+def build_netcdf4_compression_options(
+    compression: Optional[str] = COMPRESSION_FILTER_DEFAULT,
+    compression_level: int = COMPRESSION_LEVEL_DEFAULT,
+    shuffling: bool = SHUFFLING_DEFAULT,
+    least_significant_digit: Optional[int] = None,
+    significant_digits: Optional[int] = None,
+    quantize_mode: str = QUANTIZE_MODE_DEFAULT,
+) -> dict:
+    """Build the compression keyword arguments of
+    `netCDF4.Dataset.createVariable`.
+
+    Filters other than zlib and szip are HDF5 plugins, bundled with the
+    wheels of netCDF4 or installed by hdf5plugin. Blosc shuffles internally
+    and zlib through the HDF5 shuffle filter. netCDF4 ignores shuffling
+    along with zstd and bzip2, hence it is not requested. Quantization is either
+    `least_significant_digit`, the number of decimal digits to retain, or
+    `significant_digits` under `quantize_mode`, one of `BitGroom`,
+    `GranularBitRound` and `BitRound`, and is written in the attributes of
+    the variable.
+    """
+    if least_significant_digit is not None and significant_digits is not None:
+        raise ValueError("Quantize either to a least significant digit or to significant digits, not both")
+    compression = normalise_compression_filter(compression)
+    options = {}
+    if compression and compression_level > 0:
+        options['compression'] = compression
+        options['complevel'] = compression_level
+        if compression.startswith('blosc'):
+            options['blosc_shuffle'] = 1 if shuffling else 0
+        elif compression == 'szip':
+            options['szip_coding'] = 'nn'
+            options['szip_pixels_per_block'] = SZIP_PIXELS_PER_BLOCK
+        elif compression in NETCDF4_SHUFFLING_FILTERS:
+            options['shuffle'] = bool(shuffling)
+        elif shuffling:
+            logger.warning(f"netCDF4 does not shuffle bytes along with {compression}, compressing without shuffling")
+    if least_significant_digit is not None:
+        options['least_significant_digit'] = least_significant_digit
+    if significant_digits is not None:
+        options['significant_digits'] = significant_digits
+        options['quantize_mode'] = quantize_mode
+    return options
+
+
+def build_nccopy_compression_options(
+    compression: Optional[str] = COMPRESSION_FILTER_DEFAULT,
+    compression_level: int = COMPRESSION_LEVEL_DEFAULT,
+    shuffling: bool = SHUFFLING_DEFAULT,
+) -> str:
+    """Build the compression options of `nccopy`.
+
+    Deflate is requested through `-d`. Other filters replace it through
+    `-F` and their registered HDF5 filter identifiers, which `nccopy` loads
+    from the `HDF5_PLUGIN_PATH`.
+    """
+    compression = normalise_compression_filter(compression)
+    if compression is None or compression_level <= 0:
+        return "-d 0"
+    shuffling_option = " -s" if shuffling and not compression.startswith('blosc') else ""
+    if compression == 'zlib':
+        return f"-d {compression_level}{shuffling_option}"
+    if compression == 'szip':
+        parameters = f"4,{SZIP_OPTIONS_MASK},{SZIP_PIXELS_PER_BLOCK}"
+    elif compression.startswith('blosc'):
+        # typesize, block size and such are filled in by the filter itself
+        parameters = f"{HDF5_FILTER_IDENTIFIERS['blosc']},0,0,0,0,{compression_level},{1 if shuffling else 0},{BLOSC_COMPRESSOR_CODES[compression]}"
+    else:
+        parameters = f"{HDF5_FILTER_IDENTIFIERS[compression]},{compression_level}"
+    return f"-d 0 -F '*,{parameters}'{shuffling_option}"
+
+
+def build_output_filename(
+    input: Path,
+    time: Optional[int] = None,
+    latitude: Optional[int] = None,
+    longitude: Optional[int] = None,
+    compression: Optional[str] = COMPRESSION_FILTER_DEFAULT,
+    compression_level: int = COMPRESSION_LEVEL_DEFAULT,
+    shuffling: bool = SHUFFLING_DEFAULT,
+    least_significant_digit: Optional[int] = None,
+    significant_digits: Optional[int] = None,
+) -> str:
+    """Name a rechunked file after its chunking shape, compression and
+    quantization"""
+    output_filename = f"{input.stem}"
+    output_filename += f"_{time}"
+    output_filename += f"_{latitude}"
+    output_filename += f"_{longitude}"
+    output_filename += f"_{compression}"
+    output_filename += f"_{compression_level}"
+    if shuffling and compression_level > 0:
+        output_filename += f"_shuffled"
+    if least_significant_digit is not None:
+        output_filename += f"_lsd{least_significant_digit}"
+    if significant_digits is not None:
+        output_filename += f"_nsd{significant_digits}"
+    output_filename += f"{input.suffix}"
+    return output_filename
+
+
+def get_hdf5_plugin_environment() -> dict:
+    """Return the environment of a subprocess pointing the HDF5 library to
+    the filter plugins of hdf5plugin, if installed"""
+    environment = dict(os.environ)
+    try:
+        import hdf5plugin
+    except ImportError:
+        return environment
+    environment.setdefault('HDF5_PLUGIN_PATH', hdf5plugin.PLUGIN_PATH)
+    return environment
+
+
+def build_codec_specification(
+    compression: Optional[str] = COMPRESSION_FILTER_DEFAULT,
+    compression_level: int = COMPRESSION_LEVEL_DEFAULT,
+    shuffling: bool = SHUFFLING_DEFAULT,
+    least_significant_digit: Optional[int] = None,
+) -> str:
+    """Translate compression options to a codec specification, ex.
+    `zstd:3+shuffle+lsd:2`, see `rekx.compression.parse_codec`"""
+    compression = normalise_compression_filter(compression)
+    specification = 'none'
+    if compression and compression_level > 0:
+        specification = f"{compression.replace('_', '-')}:{compression_level}"
+        specification += '+shuffle' if shuffling else ''
+    if least_significant_digit is not None:
+        specification += f'+lsd:{least_significant_digit}'
+    return specification
+
+
+def get_output_codec_specification(
+    variable: nc.Variable,
+    options: dict,
+) -> Optional[str]:
+    """Codec specification of the filters an output variable was created
+    with, as reported by netCDF4, since netCDF4 may ignore some requested
+    options, ex. shuffling along with zstd. None if its filters cannot be
+    reproduced by a codec pipeline, ex. checksums, hence for a serial copy"""
+    filters = variable.filters() or {}
+    if filters.get('szip') or filters.get('fletcher32'):
+        return None
+    specification = get_codec_specification(filters)
+    if 'least_significant_digit' in options:
+        specification += f"+lsd:{options['least_significant_digit']}"
+    return specification
+
+
+@lru_cache(maxsize=None)
+def open_hdf5_file(path: Path):
+    """Open an HDF5 file read-only, once per process"""
+    import h5py
+    return h5py.File(path, 'r')
+
+
+def compress_slab(
+    input: Path,
+    name: str,
+    origin: Tuple[int, ...],
+    slab_shape: Tuple[int, ...],
+    chunk_shape: Tuple[int, ...],
+    specification: str,
+) -> Tuple[str, List[Tuple[Tuple[int, ...], bytes]]]:
+    """Read a slab of a variable and compress it chunk by chunk.
+
+    Returns the name of the variable and the offset and encoded bytes of each
+    chunk. Edge chunks are padded to the full chunk shape, as stored by HDF5.
+    """
+    dataset = open_hdf5_file(input)[name]
+    region = tuple(slice(start, start + length) for start, length in zip(origin, slab_shape))
+    slab = dataset[region]
+    pipeline = parse_codec(specification, slab.dtype)
+    grid = [-(-size // length) for size, length in zip(slab.shape, chunk_shape)]
+    chunks = []
+    for index in np.ndindex(*grid):
+        block = slab[tuple(slice(i * length, (i + 1) * length) for i, length in zip(index, chunk_shape))]
+        if block.shape != tuple(chunk_shape):
+            padded = np.zeros(chunk_shape, dtype=block.dtype)
+            padded[tuple(slice(0, length) for length in block.shape)] = block
+            block = padded
+        offset = tuple(start + i * length for start, i, length in zip(origin, index, chunk_shape))
+        chunks.append((offset, encode(block, pipeline)))
+    return name, chunks
+
+
+def copy_chunks_in_parallel(
+    input: Path,
+    output: Path,
+    layouts: dict,
+    workers: Optional[int] = None,
+) -> None:
+    """Copy variables chunk by chunk, reading and compressing in a pool of
+    processes and writing from a single ordered writer.
+
+    Each task reads a slab of a variable, one row of output chunks spanning
+    the last dimension, and compresses its chunks. HDF5 writes are
+    serialised : the compressed chunks are written as they are, bypassing
+    the filter pipeline, through the direct chunk write of HDF5, in the order
+    of the tasks.
+
+    Parameters
+    ----------
+    input: Path
+        NetCDF4/HDF5 source file
+    output: Path
+        NetCDF4 file holding the variables, created with matching chunk
+        shapes and filters
+    layouts: dict
+        Shape, chunk shape and codec specification of each variable
+    workers: int, optional
+        Number of processes, by default the number of CPUs
+    """
+    import h5py
+
+    tasks = []
+    for name, (shape, chunk_shape, specification) in layouts.items():
+        slab_shape = list(chunk_shape)
+        if len(shape) > 1:
+            slab_shape[-1] = shape[-1]
+        grid = [-(-size // length) for size, length in zip(shape, slab_shape)]
+        for index in np.ndindex(*grid):
+            origin = tuple(i * length for i, length in zip(index, slab_shape))
+            tasks.append((input, name, origin, tuple(slab_shape), tuple(chunk_shape), specification))
+
+    workers = workers or os.cpu_count()
+    with h5py.File(output, 'r+') as file, ProcessPoolExecutor(max_workers=workers) as executor:
+        for name, (shape, _, _) in layouts.items():
+            if file[name].shape != tuple(shape):  # unlimited dimensions
+                file[name].resize(shape)
+
+        def write(future):
+            name, chunks = future.result()
+            for offset, buffer in chunks:
+                file[name].id.write_direct_chunk(offset, buffer)
+
+        pending = deque()
+        for task in tasks:
+            pending.append(executor.submit(compress_slab, *task))
+            if len(pending) >= 2 * workers:  # bound the compressed slabs in memory
+                write(pending.popleft())
+        while pending:
+            write(pending.popleft())
+
+
 from abc import ABC, abstractmethod
 class RechunkingBackendBase(ABC):
     @abstractmethod
@@ -96,6 +400,9 @@ class nccopyBackend(RechunkingBackendBase):
         compression: str = "zlib",
         compression_level: int = 4,
         shuffling: bool = None,
+        least_significant_digit: Optional[int] = None,
+        significant_digits: Optional[int] = None,
+        quantize_mode: str = QUANTIZE_MODE_DEFAULT,
         memory: bool = False,
         dry_run: bool = False,  # return command as a string ?
     ):#**kwargs):
@@ -105,6 +412,7 @@ class nccopyBackend(RechunkingBackendBase):
         [ ] [-kind_code]
         [x] [-d n]  # deflate
         [x] [-s]  # shuffling
+        [x] [-F filterspec]  # zstd, bzip2, szip and blosc filters
         [x] [-c chunkspec]  # chunking sizes
         [ ] [-u]
         [x] [-w]  # read and process data in-memory, write out in the end
@@ -122,8 +430,13 @@ class nccopyBackend(RechunkingBackendBase):
             if all([time, latitude, longitude])
             else ""
         )
-        compression_options = f"-d {compression_level}" if compression == "zlib" else ""
-        shuffling_option = f"-s" if shuffling and compression_level > 0 else ""
+        if least_significant_digit is not None or significant_digits is not None:
+            raise ValueError("Quantization is supported by the netCDF4 backend only")
+        compression_options = build_nccopy_compression_options(
+            compression=compression,
+            compression_level=compression_level,
+            shuffling=shuffling,
+        )
         # --------------------------------------------------------------------
         cache_size = f"-h {cache_size} " if cache_size else ""  # cache size in bytes
         cache_elements = f"-e {cache_elements}" if cache_elements else ""
@@ -138,42 +451,68 @@ class nccopyBackend(RechunkingBackendBase):
         #     command += f"{variable_option} "
         command += f"{chunking_shape} "
         command += f"{compression_options} "
-        command += f"{shuffling_option} "
         command += f"{cache_options} "
         command += f"{memory_option} "
         command += f"{input} "
-        output_filename = f"{input.stem}"
-        output_filename += f"_{time}"
-        output_filename += f"_{latitude}"
-        output_filename += f"_{longitude}"
-        output_filename += f"_{compression}"
-        output_filename += f"_{compression_level}"
-        if shuffling and compression_level > 0:
-            output_filename += f"_shuffled"
-        output_filename += f"{input.suffix}"
+        output_filename = build_output_filename(
+            input=input,
+            time=time,
+            latitude=latitude,
+            longitude=longitude,
+            compression=compression,
+            compression_level=compression_level,
+            shuffling=shuffling,
+        )
         output_directory.mkdir(parents=True, exist_ok=True)
         output_filepath = output_directory / output_filename
-        command += f"{output_filepath}"
 
         if dry_run:
-            return command
+            return command + f"{output_filepath}"
 
         else:
             output_directory.mkdir(parents=True, exist_ok=True)
-            args = shlex.split(command)
-            subprocess.run(args)
+            with atomic_output(output_filepath) as temporary_filepath:
+                args = shlex.split(command) + [str(temporary_filepath)]
+                subprocess.run(args, env=get_hdf5_plugin_environment(), check=True)
+            return output_filepath
 
 
 class NetCDF4Backend(RechunkingBackendBase):
     def rechunk(
-        input_filepath: Path, 
-        output_filepath: Path, 
-        time: int = None,
-        lat: int = None,
-        lon: int = None,
-    ) -> None:
+        self,
+        input: Path,
+        variables: List[str],
+        output_directory: Path,
+        time: Optional[int] = None,
+        latitude: Optional[int] = None,
+        longitude: Optional[int] = None,
+        cache_size: Optional[int] = CACHE_SIZE_DEFAULT,
+        cache_elements: Optional[int] = CACHE_ELEMENTS_DEFAULT,
+        cache_preemption: Optional[float] = CACHE_PREEMPTION_DEFAULT,
+        compression: str = COMPRESSION_FILTER_DEFAULT,
+        compression_level: int = COMPRESSION_LEVEL_DEFAULT,
+        shuffling: bool = SHUFFLING_DEFAULT,
+        least_significant_digit: Optional[int] = None,
+        significant_digits: Optional[int] = None,
+        quantize_mode: str = QUANTIZE_MODE_DEFAULT,
+        memory: bool = False,
+        workers: Optional[int] = None,
+        dry_run: bool = False,
+    ):
         """Rechunk data stored in a NetCDF4 file.
 
+        The selected `variables` are written with the requested chunk sizes,
+        compression filter and quantization, all other variables are copied
+        as they are. Data are copied one time chunk at a time, or at once if
+        `memory` is set.
+
+        Unless `workers` is 1, the selected variables of an HDF5-based source
+        are read and compressed concurrently, slab by slab, in a pool of
+        processes, and written by a single writer, see
+        `copy_chunks_in_parallel`. Szip and quantization to significant
+        digits are applied by the netCDF library itself, hence copied
+        serially.
+
         Notes
         -----
         Text partially quoted from
@@ -193,56 +532,213 @@ class NetCDF4Backend(RechunkingBackendBase):
         Basically, the chunk size for each dimension should match as closely as
         possible the size of the data block that users will read from the file.
         `chunksizes` cannot be set if `contiguous=True`.
+
+        Filters and quantization are recorded in the output file, the former
+        in the HDF5 filter pipeline of each variable and the latter in its
+        attributes, hence reported by `inspect`.
         """
-        # Check if any chunking has been requested
-        if time is None and lat is None and lon is None:
-            logger.info(f"No chunking requested for {input_filepath}. Exiting function.")
-            return
-
-        # logger.info(f"Rechunking of {input_filepath} with chunk sizes: time={time}, lat={lat}, lon={lon}")
-        new_chunks = {"time": time, "lat": lat, "lon": lon}
-        with nc.Dataset(input_filepath, mode="r") as input_dataset:
-            with nc.Dataset(output_filepath, mode="w") as output_dataset:
-                for name in input_dataset.ncattrs():
-                    output_dataset.setncattr(name, input_dataset.getncattr(name))
-                for name, dimension in input_dataset.dimensions.items():
-                    output_dataset.createDimension(
-                        name, (len(dimension) if not dimension.isunlimited() else None)
-                    )
-                for name, variable in input_dataset.variables.items():
-                    # logger.debug(f"Processing variable: {name}")
-                    if name in new_chunks:
-                        chunk_size = new_chunks[name]
-                        import dask.array as da
-
-                        if chunk_size is not None:
-                            # logger.debug(f"Chunking variable `{name}` with chunk sizes: {chunk_size}")
-                            x = da.from_array(
-                                variable, chunks=(chunk_size,) * len(variable.shape)
-                            )
-                            debug(locals())
-                            output_dataset.createVariable(
-                                name,
-                                variable.datatype,
-                                variable.dimensions,
-                                zlib=True,
-                                complevel=4,
-                                chunksizes=(chunk_size,) * len(variable.shape),
+        compression_options = build_netcdf4_compression_options(
+            compression=compression,
+            compression_level=compression_level,
+            shuffling=shuffling,
+            least_significant_digit=least_significant_digit,
+            significant_digits=significant_digits,
+            quantize_mode=quantize_mode,
+        )
+        shuffling = bool(compression_options.get('shuffle') or compression_options.get('blosc_shuffle'))
+        output_filename = build_output_filename(
+            input=input,
+            time=time,
+            latitude=latitude,
+            longitude=longitude,
+            compression=compression,
+            compression_level=compression_level,
+            shuffling=shuffling,
+            least_significant_digit=least_significant_digit,
+            significant_digits=significant_digits,
+        )
+        output_filepath = output_directory / output_filename
+        if dry_run:
+            options = ', '.join(f"{key}={value}" for key, value in compression_options.items())
+            return f"netCDF4 {input} -> {output_filepath} [time/{time},lat/{latitude},lon/{longitude}] {options}"
+
+        new_chunks = {
+            'time': time,
+            'lat': latitude,
+            'lon': longitude,
+        }
+        parallel = False
+        if workers != 1 and significant_digits is None and normalise_compression_filter(compression) != 'szip':
+            import h5py
+            parallel = h5py.is_hdf5(input)
+        layouts = {}
+        output_directory.mkdir(parents=True, exist_ok=True)
+        with atomic_output(output_filepath) as temporary_filepath:
+            with nc.Dataset(input, mode="r") as input_dataset:
+                input_dataset.set_auto_maskandscale(False)  # copy raw values
+                with nc.Dataset(temporary_filepath, mode="w") as output_dataset:
+                    output_dataset.setncatts(input_dataset.__dict__)
+                    for name, dimension in input_dataset.dimensions.items():
+                        output_dataset.createDimension(
+                            name, (len(dimension) if not dimension.isunlimited() else None)
+                        )
+                    for name, variable in input_dataset.variables.items():
+                        attributes = variable.__dict__.copy()
+                        options = {'fill_value': attributes.pop('_FillValue', None)}
+                        if name in variables and variable.dimensions:
+                            options['chunksizes'] = [
+                                min(new_chunks.get(dimension) or size, size) or 1
+                                for dimension, size in zip(variable.dimensions, variable.shape)
+                            ]
+                            options.update(compression_options)
+                            if variable.dtype.kind != 'f':  # quantize floating point values only
+                                for key in ('least_significant_digit', 'significant_digits', 'quantize_mode'):
+                                    options.pop(key, None)
+                        else:
+                            logger.debug(f"Variable `{name}` not in chunking list, copying as is.")
+                        output_variable = output_dataset.createVariable(
+                            name,
+                            variable.datatype,
+                            variable.dimensions,
+                            **options,
+                        )
+                        output_variable.set_auto_maskandscale(False)
+                        output_variable.setncatts(attributes)
+                        if 'chunksizes' in options and cache_size:
+                            output_variable.set_var_chunk_cache(
+                                size=cache_size,
+                                nelems=cache_elements,
+                                preemption=cache_preemption,
                             )
-                            output_dataset[name].setncatts(input_dataset[name].__dict__)
-                            output_dataset[name][:] = x
+                        specification = None
+                        if 'chunksizes' in options and parallel:
+                            specification = get_output_codec_specification(output_variable, options)
+                        if specification:
+                            layouts[name] = (variable.shape, options['chunksizes'], specification)
+                        elif 'chunksizes' in options and not memory:
+                            block_length = options['chunksizes'][0]
+                            for start in range(0, variable.shape[0], block_length):
+                                stop = min(start + block_length, variable.shape[0])  # unlimited dimensions grow to the slice
+                                output_variable[start:stop] = variable[start:stop]
                         else:
-                            # logger.debug(f"No chunk sizes specified for `{name}`, copying as is.")
-                            output_dataset.createVariable(name, variable.datatype, variable.dimensions)
-                            output_dataset[name].setncatts(input_dataset[name].__dict__)
-                            output_dataset[name][:] = variable[:]
-                    else:
-                        # logger.debug(f"Variable `{name}` not in chunking list, copying as is.")
-                        output_dataset.createVariable(name, variable.datatype, variable.dimensions)
-                        output_dataset[name].setncatts(input_dataset[name].__dict__)
-                        output_dataset[name][:] = variable[:]
+                            output_variable[...] = variable[...]
+
+            if layouts:
+                copy_chunks_in_parallel(input, temporary_filepath, layouts, workers=workers)
 
-        # logger.info(f"Completed rechunking from {input_filepath} to {output_filepath}")
+        logger.info(f"Completed rechunking from {input} to {output_filepath}")
+        return output_filepath
+
+
+class ZarrBackend(RechunkingBackendBase):
+    def rechunk(
+        self,
+        input: Path,
+        variables: List[str],
+        output_directory: Path,
+        time: Optional[int] = None,
+        latitude: Optional[int] = None,
+        longitude: Optional[int] = None,
+        compression: str = COMPRESSION_FILTER_DEFAULT,
+        compression_level: int = COMPRESSION_LEVEL_DEFAULT,
+        shuffling: bool = SHUFFLING_DEFAULT,
+        least_significant_digit: Optional[int] = None,
+        significant_digits: Optional[int] = None,
+        zarr_format: int = ZARR_FORMAT_DEFAULT,
+        shards: Optional[List[int]] = None,
+        dry_run: bool = False,
+        **kwargs,
+    ):
+        """Rechunk a NetCDF file into a Zarr store.
+
+        Source chunks are streamed through Dask, one block per output chunk,
+        or per shard if `shards` is given, so that no chunk is written by two
+        tasks. Values are copied as stored, without decoding, together with
+        their attributes.
+
+        Parameters
+        ----------
+        shards: list of int, optional
+            Shard lengths along `time`, `lat` and `lon`, multiples of the
+            chunk lengths, grouping many chunks in a single object of a Zarr
+            v3 store
+
+        Notes
+        -----
+        The metadata of all arrays are consolidated, hence opening the store
+        requires a single read. Options of the NetCDF backends, ex. the chunk
+        cache, are ignored.
+        """
+        if significant_digits is not None:
+            raise ValueError("Quantization to significant digits is not supported in Zarr, use a least significant digit")
+        if shards and zarr_format != 3:
+            raise ValueError("Sharding requires Zarr v3")
+        specification = build_codec_specification(
+            compression=compression,
+            compression_level=compression_level,
+            shuffling=shuffling,
+            least_significant_digit=least_significant_digit,
+        )
+        compression = normalise_compression_filter(compression)
+        new_chunks = {'time': time, 'lat': latitude, 'lon': longitude}
+        new_shards = dict(zip(new_chunks, shards)) if shards else {}
+        for dimension, shard in new_shards.items():
+            if not new_chunks[dimension] or shard % new_chunks[dimension]:
+                raise ValueError(f"Shards along `{dimension}` ({shard}) must be multiples of chunks ({new_chunks[dimension]})")
+        output_filename = build_output_filename(
+            input=input,
+            time=time,
+            latitude=latitude,
+            longitude=longitude,
+            compression=compression,
+            compression_level=compression_level,
+            shuffling=shuffling,
+            least_significant_digit=least_significant_digit,
+        )
+        output_filepath = output_directory / Path(output_filename).with_suffix('.zarr')
+        if dry_run:
+            shards_string = f" shards [{','.join(map(str, shards))}]" if shards else ""
+            return f"zarr v{zarr_format} {input} -> {output_filepath} [time/{time},lat/{latitude},lon/{longitude}]{shards_string} {specification}"
+
+        write_chunks = {
+            dimension: new_shards.get(dimension, length)
+            for dimension, length in new_chunks.items()
+            if length
+        }
+        output_directory.mkdir(parents=True, exist_ok=True)
+        with xr.open_dataset(input, engine="netcdf4", decode_cf=False, chunks=write_chunks) as dataset:
+            encoding = {}
+            for name, variable in dataset.variables.items():
+                variable.encoding = {}
+                if '_FillValue' in variable.attrs:
+                    encoding[name] = {'_FillValue': variable.attrs.pop('_FillValue')}
+                if name not in variables:
+                    continue
+                variable_encoding = encoding.setdefault(name, {})
+                variable_encoding['chunks'] = [
+                    min(new_chunks.get(dimension) or size, size) or 1
+                    for dimension, size in zip(variable.dims, variable.shape)
+                ]
+                if new_shards:
+                    variable_encoding['shards'] = [
+                        min(new_shards.get(dimension, size), size) or 1
+                        for dimension, size in zip(variable.dims, variable.shape)
+                    ]
+                variable_specification = specification
+                if variable.dtype.kind != 'f':  # quantize floating point values only
+                    variable_specification = specification.split('+lsd:')[0]
+                variable_encoding.update(get_zarr_codecs(variable_specification, variable.dtype, zarr_format))
+            with atomic_output(output_filepath) as temporary_filepath:
+                dataset.to_zarr(
+                    temporary_filepath,
+                    mode='w',
+                    encoding=encoding,
+                    consolidated=True,
+                    zarr_format=zarr_format,
+                )
+
+        logger.info(f"Completed rechunking from {input} to {output_filepath}")
+        return output_filepath
 
 
 class XarrayBackend(RechunkingBackendBase):
@@ -311,6 +807,12 @@ class RechunkingBackend(str, enum.Enum):
             raise ValueError(f"No known backend for {self.name}.")
 
 
+@enum.unique
+class RechunkingOutputFormat(str, enum.Enum):
+    netcdf = 'netcdf'
+    zarr = 'zarr'
+
+
 # @app.command(
 #     "rechunk",
 #     no_args_is_help=True,
@@ -327,13 +829,20 @@ def rechunk(
     cache_size: Optional[int] = CACHE_SIZE_DEFAULT,
     cache_elements: Optional[int] = CACHE_ELEMENTS_DEFAULT,
     cache_preemption: Optional[float] = CACHE_PREEMPTION_DEFAULT,
-    compression: str = COMPRESSION_FILTER_DEFAULT,
+    compression: Annotated[str, typer.Option(help=f"Compression filter, one of {', '.join(COMPRESSION_FILTERS + tuple(COMPRESSION_FILTER_ALIASES))} or [code]none[/code]")] = COMPRESSION_FILTER_DEFAULT,
     compression_level: int = COMPRESSION_LEVEL_DEFAULT,
-    shuffling: str = SHUFFLING_DEFAULT,
+    shuffling: Annotated[bool, typer.Option(help="Shuffle bytes before compressing, internally for Blosc filters")] = SHUFFLING_DEFAULT,
+    least_significant_digit: Annotated[Optional[int], typer.Option(help="Quantize floating point values to this decimal digit. Requires the [code]netCDF4[/code] backend")] = None,
+    significant_digits: Annotated[Optional[int], typer.Option(help="Quantize floating point values to this number of significant digits. Requires the [code]netCDF4[/code] backend")] = None,
+    quantize_mode: Annotated[str, typer.Option(help="Quantization algorithm for significant digits : BitGroom, GranularBitRound or BitRound")] = QUANTIZE_MODE_DEFAULT,
     memory: bool = RECHUNK_IN_MEMORY_DEFAULT,
     dry_run: Annotated[bool, typer_option_dry_run] = DRY_RUN_DEFAULT,
-    backend: Annotated[RechunkingBackend, typer.Option(help="Backend to use for rechunking. [code]nccopy[/code] [red]Not Implemented Yet![/red]")] = RechunkingBackend.nccopy,
-    dask_scheduler: Annotated[str, typer.Option(help="The port:ip of the dask scheduler")] = None,
+    backend: Annotated[RechunkingBackend, typer.Option(help="Backend to use for rechunking, [code]nccopy[/code] or [code]netCDF4[/code]")] = RechunkingBackend.nccopy,
+    format: Annotated[RechunkingOutputFormat, typer.Option(help="Output format. [code]zarr[/code] streams chunks into a Zarr store regardless of the backend")] = RechunkingOutputFormat.netcdf,
+    zarr_format: Annotated[int, typer.Option(help="Zarr format version, 2 or 3")] = ZARR_FORMAT_DEFAULT,
+    shards: Annotated[Optional[str], typer.Option(help="Comma-separated shard lengths along time, lat and lon, multiples of the chunk lengths. Requires Zarr v3")] = None,
+    workers: Annotated[Optional[int], typer_option_number_of_workers] = None,
+    dask_scheduler: Annotated[str, typer.Option(help="Address of a Dask scheduler to run the rechunking on, ex. [code]tcp://10.0.0.1:8786[/code], or [code]local[/code] for a local cluster")] = None,
     verbose: Annotated[int, typer_option_verbose] = VERBOSE_LEVEL_DEFAULT,
 ):
     """
@@ -343,11 +852,6 @@ def rechunk(
         import time as timer
         rechunking_timer_start = timer.time()
 
-    # if dask_scheduler:
-    #     from dask.distributed import Client
-    #     client = Client(dask_scheduler)
-    #     typer.echo(f"Using Dask scheduler at {dask_scheduler}")
-
     with xr.open_dataset(input, engine="netcdf4") as dataset:
     # with Dataset(input, 'r') as dataset:
         selected_variables = select_xarray_variable_set_from_dataset(
@@ -366,9 +870,19 @@ def rechunk(
             "shuffling": shuffling,
             "compression": compression,
             "compression_level": compression_level,
+            "least_significant_digit": least_significant_digit,
+            "significant_digits": significant_digits,
+            "quantize_mode": quantize_mode,
             "memory": memory,
         }
-        backend = backend.get_backend()
+        if format == RechunkingOutputFormat.zarr:
+            backend = ZarrBackend()
+            rechunk_parameters["zarr_format"] = zarr_format
+            rechunk_parameters["shards"] = parse_chunks(shards) if shards else None
+        else:
+            backend = backend.get_backend()
+        if isinstance(backend, NetCDF4Backend):
+            rechunk_parameters["workers"] = workers
         # ------------------------------------------------- Deduplicate Me ---
         if dry_run:
             command = backend.rechunk(**rechunk_parameters, dry_run=dry_run)
@@ -377,6 +891,12 @@ def rechunk(
             # print(f"    {rechunk_parameters}")
             return  # Exit for a dry run
 
+        elif dask_scheduler:
+            from .cluster import get_dask_client
+            with get_dask_client(dask_scheduler) as client:
+                typer.echo(f"Using Dask scheduler at {dask_scheduler}")
+                command = client.submit(backend.rechunk, **rechunk_parameters, dry_run=False, pure=False).result()
+
         else:
             command = backend.rechunk(**rechunk_parameters, dry_run=False)
         # ------------------------------------------------- Deduplicate Me ---
@@ -519,10 +1039,6 @@ def generate_rechunk_commands(
     #     print(commands)
 
 
-from concurrent.futures import ProcessPoolExecutor
-from concurrent.futures import as_completed
-
-
 def generate_rechunk_commands_for_multiple_netcdf(
     file_paths: Annotated[List[Path], typer.Argument(help="Input NetCDF files.")],
     output: Annotated[Optional[Path], typer.Argument(help="Path to the output NetCDF file.")],
@@ -539,39 +1055,50 @@ def generate_rechunk_commands_for_multiple_netcdf(
     shuffling: Annotated[bool, typer.Option(help=f'Shuffle... [reverse bold orange] Testing [/reverse bold orange]')] = SHUFFLING_DEFAULT,
     memory: bool = RECHUNK_IN_MEMORY_DEFAULT,
     # backend: Annotated[RechunkingBackend, typer.Option(help="Backend to use for rechunking. [code]nccopy[/code] [red]Not Implemented Yet![/red]")] = RechunkingBackend.nccopy,
-    dask_scheduler: Annotated[str, typer.Option(help="The port:ip of the dask scheduler")] = None,
+    dask_scheduler: Annotated[str, typer.Option(help="Address of a Dask scheduler to process files on, or [code]local[/code] for a local cluster")] = None,
     commands_file: Path = 'rechunk_commands.txt',
     dry_run: Annotated[bool, typer_option_dry_run] = False,
     verbose: Annotated[int, typer_option_verbose] = VERBOSE_LEVEL_DEFAULT,
 ):
     """
     Generate variations of rechunking commands based on `nccopy`.
+
+    Files are processed largest first in a pool of processes, or as tasks of a Dask
+    cluster given the address of its scheduler, `dask_scheduler`, or
+    `local` for a local cluster.
     """
-    command_series = {}
-    with ProcessPoolExecutor() as executor:
+    partial_generate_rechunk_commands = partial(
+        generate_rechunk_commands,
+        output=output,
+        time=time,
+        latitude=latitude,
+        longitude=longitude,
+        spatial_symmetry=spatial_symmetry,
+        variable_set=variable_set,
+        cache_size=cache_size,
+        cache_elements=cache_elements,
+        cache_preemption=cache_preemption,
+        compression=compression,
+        compression_level=compression_level,
+        shuffling=shuffling,
+        memory=memory,
+        dask_scheduler=dask_scheduler,
+        commands_file=commands_file,
+        dry_run=dry_run,
+        verbose=verbose,
+    )
+    if not dask_scheduler:
+        for file_path, _, exception in map_unordered(partial_generate_rechunk_commands, file_paths):
+            if exception:
+                logger.error(f"Error processing {file_path} : {exception}")
+        return
+
+    from dask.distributed import as_completed
+    from .cluster import get_dask_client
+    with get_dask_client(dask_scheduler) as client:
         futures = [
-            executor.submit(
-                generate_rechunk_commands,
-                file_path,  # input
-                output,
-                time,
-                latitude,
-                longitude,
-                spatial_symmetry,
-                variable_set,
-                cache_size,
-                cache_elements,
-                cache_preemption,
-                compression,
-                compression_level,
-                shuffling,
-                memory,
-                dask_scheduler,
-                commands_file,
-                dry_run,
-                verbose,
-            )
-            for file_path in file_paths
+            client.submit(partial_generate_rechunk_commands, file_path)
+            for file_path in order_by_size(file_paths)
         ]
         for future in as_completed(futures):
             try:
@@ -580,6 +1107,5 @@ def generate_rechunk_commands_for_multiple_netcdf(
             except Exception as e:
                 logger.error(f"Error processing : {e}")
 
-
 if __name__ == "__main__":
     app()
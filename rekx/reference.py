@@ -6,6 +6,7 @@
 import typer
 from rekx.typer_parameters import OrderCommands
 from typing_extensions import Annotated
+from typing import Optional
 from pathlib import Path
 from .rich_help_panel_names import rich_help_panel_reference
 from .typer_parameters import typer_argument_source_directory
@@ -13,17 +14,59 @@ from .typer_parameters import typer_argument_output_directory
 from .typer_parameters import typer_option_filename_pattern
 from .typer_parameters import typer_option_dry_run
 from .typer_parameters import typer_option_number_of_workers
+from .typer_parameters import typer_option_executor
+from .typer_parameters import typer_option_reference_variable_set
+from .typer_parameters import typer_option_reference_variables
+from .typer_parameters import typer_option_reference_start_time
+from .typer_parameters import typer_option_reference_end_time
+from .typer_parameters import typer_option_inline_threshold
+from .typer_parameters import typer_option_inline_coordinates
 from .typer_parameters import typer_option_verbose
+from .typer_parameters import typer_option_journal
+from .typer_parameters import typer_option_resume
 from .constants import VERBOSE_LEVEL_DEFAULT
+from .constants import INLINE_THRESHOLD_DEFAULT
 from .progress import DisplayMode
 from .progress import display_context
-import multiprocessing
+from .journal import atomic_output
+from .journal import fingerprint
+from .journal import open_journal
+from .log import logger
+from .models import Executor
+from .models import XarrayVariableSet
+from .models import select_xarray_variable_set_from_dataset
+from .scheduler import map_unordered
 import kerchunk
 import fsspec
 import ujson
 from kerchunk.hdf import SingleHdf5ToZarr
 from rich import print
+from rich.box import SIMPLE_HEAD
+from rich.console import Console
+from rich.table import Table
+from functools import partial
+from typing import Dict
+from typing import List
+from typing import Set
+from datetime import datetime
+from typing import Tuple
+import base64
 import hashlib
+import math
+import tempfile
+import time as timer
+import netCDF4
+import numpy as np
+import pandas as pd
+import xarray as xr
+
+
+# h5py runs every HDF5 call under its global lock, `phil`, hence threads do
+# not scan files in parallel. A thread scanning a file overlaps the others
+# fetching the coordinate chunks to inline through fsspec and pruning and
+# encoding their references, without starting processes or pickling results.
+# Processes do scan in parallel, see `reference-benchmark` to choose per host.
+REFERENCE_EXECUTOR_DEFAULT = Executor.thread
 
 
 # app = typer.Typer(
@@ -56,16 +99,271 @@ def generate_file_md5(file_path):
         return hash_value
 
 
+def encode_inline_data(data: bytes) -> str:
+    """Encode inlined bytes as Kerchunk does, ASCII as is and anything else
+    in base64 with a `base64:` prefix"""
+    try:
+        return data.decode('ascii')
+    except UnicodeDecodeError:
+        return 'base64:' + base64.b64encode(data).decode()
+
+
+def get_coordinate_variables(references: Dict[str, dict]) -> Set[str]:
+    """Names of the coordinate variables, i.e. one-dimensional variables
+    named after their dimension, and of their bounds, in a reference set"""
+    refs = references.get('refs', references)
+    attributes = {}
+    for key, value in refs.items():
+        if key.endswith('/.zattrs'):
+            attributes[key[: -len('/.zattrs')]] = ujson.loads(value)
+    coordinates = {
+        variable
+        for variable, attribute in attributes.items()
+        if attribute.get('_ARRAY_DIMENSIONS') == [variable]
+    }
+    bounds = {
+        attributes[coordinate]['bounds']
+        for coordinate in coordinates
+        if attributes[coordinate].get('bounds') in attributes
+    }
+    return coordinates | bounds
+
+
+def inline_coordinates(
+    references: Dict[str, dict],
+    coordinates: Optional[Set[str]] = None,
+    remote_options: Optional[dict] = None,
+) -> Dict[str, dict]:
+    """Inline the chunks of coordinate variables in a reference set, in place
+
+    Opening a dataset decodes its coordinates, hence a reference set whose
+    coordinates are inlined opens without reading the referenced files.
+    Chunks are read with a single request per referenced file.
+
+    Parameters
+    ----------
+    references: dict
+        Kerchunk reference set, with or without the `refs` level
+    coordinates: set of str, optional
+        Variables to inline, see `get_coordinate_variables` for the default
+    remote_options: dict, optional
+        Storage options of the referenced files
+    """
+    refs = references.get('refs', references)
+    if coordinates is None:
+        coordinates = get_coordinate_variables(references)
+    ranges = {}
+    for key, value in refs.items():
+        variable, _, chunk = key.rpartition('/')
+        if variable in coordinates and not chunk.startswith('.') and isinstance(value, list) and len(value) == 3:
+            ranges[key] = value
+    if not ranges:
+        return references
+    filesystem, _ = fsspec.core.url_to_fs(next(iter(ranges.values()))[0], **(remote_options or {}))
+    keys = list(ranges)
+    data = filesystem.cat_ranges(
+        [ranges[key][0] for key in keys],
+        [ranges[key][1] for key in keys],
+        [ranges[key][1] + ranges[key][2] for key in keys],
+    )
+    for key, chunk in zip(keys, data):
+        refs[key] = encode_inline_data(chunk)
+    return references
+
+
+def get_variable_dimensions(references: Dict[str, dict]) -> Dict[str, List[str]]:
+    """Dimensions of each variable of a reference set"""
+    refs = references.get('refs', references)
+    return {
+        key[: -len('/.zattrs')]: ujson.loads(value).get('_ARRAY_DIMENSIONS', [])
+        for key, value in refs.items()
+        if key.endswith('/.zattrs') and '/' in key
+    }
+
+
+def slice_time_chunks(
+    references: Dict[str, dict],
+    file_path: Path,
+    start: int,
+    stop: int,
+    variables: Set[str],
+) -> None:
+    """Restrict the variables of a reference set to the time steps `start` to
+    `stop`, in place
+
+    The window is widened to whole chunks of the variables chunked along
+    time, whose chunks are then renumbered. Variables held in a single chunk
+    along time, ex. the `time` coordinate, are read from the file over the
+    window and inlined uncompressed.
+    """
+    refs = references.get('refs', references)
+    dimensions = get_variable_dimensions(references)
+    layouts = {}
+    for variable in variables:
+        if 'time' not in dimensions.get(variable, []) or f'{variable}/.zarray' not in refs:
+            continue
+        zarray = ujson.loads(refs[f'{variable}/.zarray'])
+        axis = dimensions[variable].index('time')
+        layouts[variable] = (zarray, axis)
+    if not layouts:
+        return
+    length = next(iter(layouts.values()))[0]['shape'][next(iter(layouts.values()))[1]]
+    chunked = {
+        zarray['chunks'][axis]
+        for zarray, axis in layouts.values()
+        if zarray['chunks'][axis] < zarray['shape'][axis]
+    }
+    alignment = math.lcm(*chunked) if chunked else 1
+    start = start // alignment * alignment
+    stop = min(math.ceil(stop / alignment) * alignment, length)
+
+    for variable, (zarray, axis) in layouts.items():
+        separator = zarray.get('dimension_separator') or '.'
+        prefix = f'{variable}/'
+        chunk_keys = [
+            key for key in refs
+            if key.startswith(prefix)
+            and all(index.isdigit() for index in key[len(prefix):].split(separator))
+        ]
+        chunk_length = zarray['chunks'][axis]
+        if chunk_length < zarray['shape'][axis]:
+            first, last = start // chunk_length, math.ceil(stop / chunk_length)
+            renamed = {}
+            for key in chunk_keys:
+                indices = [int(index) for index in key[len(prefix):].split(separator)]
+                value = refs.pop(key)
+                if first <= indices[axis] < last:
+                    indices[axis] -= first
+                    renamed[prefix + separator.join(map(str, indices))] = value
+            refs.update(renamed)
+        elif (start, stop) != (0, zarray['shape'][axis]):
+            with netCDF4.Dataset(file_path, mode='r') as dataset:
+                netcdf_variable = dataset[variable]
+                netcdf_variable.set_auto_maskandscale(False)
+                window = [slice(None)] * netcdf_variable.ndim
+                window[axis] = slice(start, stop)
+                data = np.ascontiguousarray(netcdf_variable[tuple(window)], dtype=zarray['dtype'])
+            for key in chunk_keys:
+                del refs[key]
+            refs[prefix + separator.join(['0'] * data.ndim)] = encode_inline_data(data.tobytes())
+            zarray.update(chunks=list(data.shape), compressor=None, filters=None, order='C')
+        zarray['shape'][axis] = stop - start
+        refs[f'{variable}/.zarray'] = ujson.dumps(zarray)
+
+
+def prune_references(
+    references: Dict[str, dict],
+    file_path: Path,
+    variable_set: XarrayVariableSet = XarrayVariableSet.all,
+    variables: Optional[List[str]] = None,
+    start_time: Optional[datetime] = None,
+    end_time: Optional[datetime] = None,
+) -> Optional[Dict[str, dict]]:
+    """Keep only the requested variables and time steps of a reference set
+
+    Parameters
+    ----------
+    references: dict
+        Kerchunk reference set of `file_path`, pruned in place
+    file_path: Path
+        Referenced NetCDF file
+    variable_set: XarrayVariableSet
+        Set of variables to keep, see `select_xarray_variable_set_from_dataset`
+    variables: list of str, optional
+        Variables to keep, overriding `variable_set`
+    start_time, end_time: datetime, optional
+        Time steps to keep, widened to whole chunks, see `slice_time_chunks`
+
+    Returns
+    -------
+    dict or None
+        The pruned reference set, None if no time step of the file falls in
+        the requested period. The coordinates of the dimensions of the kept
+        variables are kept as well.
+    """
+    if variable_set == XarrayVariableSet.all and not variables and start_time is None and end_time is None:
+        return references
+    with xr.open_dataset(file_path, engine='netcdf4') as dataset:
+        if variables:
+            selected = set(variables) & set(dataset.variables)
+        else:
+            selected = set(select_xarray_variable_set_from_dataset(XarrayVariableSet, variable_set, dataset))
+        window = None
+        if (start_time or end_time) and 'time' in dataset.indexes:
+            indexer = dataset.indexes['time'].slice_indexer(start_time, end_time)
+            window = indexer.indices(dataset.sizes['time'])[:2]
+            if window[0] >= window[1]:
+                return None
+
+    refs = references.get('refs', references)
+    dimensions = get_variable_dimensions(references)
+    keep = selected | {
+        dimension
+        for variable in selected
+        for dimension in dimensions.get(variable, [])
+        if dimension in dimensions
+    }
+    for key in list(refs):
+        variable = key.rpartition('/')[0]
+        while variable not in dimensions and '/' in variable:  # `/` separator
+            variable = variable.rpartition('/')[0]
+        if variable and variable not in keep:
+            del refs[key]
+    if window:
+        slice_time_chunks(references, file_path, *window, variables=keep)
+    return references
+
+
+def get_reference_options_digest(
+    inline_threshold: int = INLINE_THRESHOLD_DEFAULT,
+    inline_coordinate_variables: bool = True,
+    variable_set: XarrayVariableSet = XarrayVariableSet.all,
+    variables: Optional[List[str]] = None,
+    start_time: Optional[datetime] = None,
+    end_time: Optional[datetime] = None,
+    record_size: Optional[int] = None,
+) -> str:
+    """Digest of the options a reference is created with, so that a
+    reference created with other options is not reused"""
+    options = ujson.dumps([
+        inline_threshold,
+        inline_coordinate_variables,
+        XarrayVariableSet(variable_set).value,
+        sorted(variables or []),
+        str(start_time),
+        str(end_time),
+        record_size,
+    ])
+    return hashlib.md5(options.encode()).hexdigest()
+
+
 def create_single_reference(
     file_path: Path,
     output_directory: Path,
+    inline_threshold: int = INLINE_THRESHOLD_DEFAULT,
+    inline_coordinate_variables: bool = True,
+    variable_set: XarrayVariableSet = XarrayVariableSet.all,
+    variables: Optional[List[str]] = None,
+    start_time: Optional[datetime] = None,
+    end_time: Optional[datetime] = None,
     verbose: int = 0
 ):
-    """Helper function for create_kerchunk_reference()"""
+    """Helper function for create_kerchunk_reference()
+
+    The hash written next to a reference covers the source file and the
+    options the reference was created with."""
     filename = file_path.stem
     output_file = f"{output_directory}/{filename}.json"
     hash_file = f"{output_directory}/{filename}.json.hash"
-    generated_hash = generate_file_md5(file_path)
+    options = get_reference_options_digest(
+        inline_threshold,
+        inline_coordinate_variables,
+        variable_set,
+        variables,
+        start_time,
+        end_time,
+    )
+    generated_hash = f'{generate_file_md5(file_path)}:{options}'
     local_fs = fsspec.filesystem('file')
     if local_fs.exists(output_file) and local_fs.exists(hash_file):
         logger.debug(f'Found a reference file \'{output_file}\' and a hash \'{hash_file}\'')
@@ -73,17 +371,34 @@ def create_single_reference(
             existing_hash = hf.read().strip()
         
         if existing_hash == generated_hash:
-            pass
-    else:
-        logger.debug(f'Creating reference file \'{output_file}\' with hash \'{generated_hash}\'')
-        file_url = f"file://{file_path}"
-        with fsspec.open(file_url, mode='rb') as input_file:
-            h5chunks = SingleHdf5ToZarr(input_file, file_url, inline_threshold=0)
-            json = ujson.dumps(h5chunks.translate()).encode()
-            with local_fs.open(output_file, 'wb') as f:
-                f.write(json)
-            with local_fs.open(hash_file, 'w') as hf:
-                hf.write(generated_hash)
+            return output_file
+
+    logger.debug(f'Creating reference file \'{output_file}\' with hash \'{generated_hash}\'')
+    file_url = f"file://{file_path}"
+    with fsspec.open(file_url, mode='rb') as input_file:
+        h5chunks = SingleHdf5ToZarr(input_file, file_url, inline_threshold=inline_threshold)
+        references = h5chunks.translate()
+    references = prune_references(
+        references,
+        file_path,
+        variable_set=variable_set,
+        variables=variables,
+        start_time=start_time,
+        end_time=end_time,
+    )
+    if references is None:
+        logger.debug(f'No time step of \'{file_path}\' in the requested period')
+        return None
+    if inline_coordinate_variables:
+        inline_coordinates(references)
+    json = ujson.dumps(references).encode()
+    with atomic_output(output_file) as temporary_file:
+        with local_fs.open(str(temporary_file), 'wb') as f:
+            f.write(json)
+    with atomic_output(hash_file) as temporary_file:
+        with local_fs.open(str(temporary_file), 'w') as hf:
+            hf.write(generated_hash)
+    return output_file
 
 
 # @app.command(
@@ -96,11 +411,29 @@ def create_kerchunk_reference(
     source_directory: Annotated[Path, typer_argument_source_directory],
     output_directory: Annotated[Path, typer_argument_output_directory],
     pattern: Annotated[str, typer_option_filename_pattern] = '*.nc',
-    workers: Annotated[int, typer_option_number_of_workers] = 4,
+    workers: Annotated[Optional[int], typer_option_number_of_workers] = None,
+    executor: Annotated[Executor, typer_option_executor] = REFERENCE_EXECUTOR_DEFAULT,
+    inline_threshold: Annotated[int, typer_option_inline_threshold] = INLINE_THRESHOLD_DEFAULT,
+    inline_coordinates: Annotated[bool, typer_option_inline_coordinates] = True,
+    variable_set: Annotated[XarrayVariableSet, typer_option_reference_variable_set] = XarrayVariableSet.all,
+    variables: Annotated[Optional[List[str]], typer_option_reference_variables] = None,
+    start_time: Annotated[Optional[datetime], typer_option_reference_start_time] = None,
+    end_time: Annotated[Optional[datetime], typer_option_reference_end_time] = None,
+    journal: Annotated[Optional[Path], typer_option_journal] = None,
+    resume: Annotated[bool, typer_option_resume] = True,
     dry_run: Annotated[bool, typer_option_dry_run] = False,
     verbose: Annotated[int, typer_option_verbose] = VERBOSE_LEVEL_DEFAULT,
 ):
-    """Reference local NetCDF files using Kerchunk"""
+    """Reference local NetCDF files using Kerchunk
+
+    Files are processed largest first by worker threads by default, see
+    `reference-benchmark` to compare executors on a given filesystem. Completed files are
+    recorded in a journal, hence skipped when the command is run again after
+    an interruption with the same options.
+
+    References can be restricted to a set of variables, or to a list of
+    them, and to a period, see `prune_references`.
+    """
     # import cProfile
     # import pstats
     # profiler = cProfile.Profile()
@@ -122,19 +455,180 @@ def create_kerchunk_reference(
     
     # Map verbosity level to display mode
     mode = DisplayMode(verbose)
-    with display_context[mode]:
-        with multiprocessing.Pool(processes=workers) as pool:
-            from functools import partial
-
-            partial_create_single_reference = partial(
-                create_single_reference, output_directory=output_directory
-            )
-            results = pool.map(partial_create_single_reference, file_paths)
+    options = get_reference_options_digest(
+        inline_threshold,
+        inline_coordinates,
+        variable_set,
+        variables,
+        start_time,
+        end_time,
+    )
+    with display_context[mode], open_journal(f'reference-{options}', output_directory, journal, resume) as journal:
+        pending_file_paths = journal.pending(file_paths)
+        logger.info(f"Skipping {len(file_paths) - len(pending_file_paths)} files referenced already")
+        partial_create_single_reference = partial(
+            create_single_reference,
+            output_directory=output_directory,
+            inline_threshold=inline_threshold,
+            inline_coordinate_variables=inline_coordinates,
+            variable_set=variable_set,
+            variables=variables,
+            start_time=start_time,
+            end_time=end_time,
+        )
+        results = map_unordered(
+            partial_create_single_reference,
+            pending_file_paths,
+            workers=workers,
+            executor=executor,
+        )
+        for file_path, output_file, exception in results:
+            if exception:
+                logger.error(f"Error referencing {file_path} : {exception}")
+                continue
+            journal.record(file_path, fingerprint(file_path), output_file)
         
     # profiler.disable()
     # stats = pstats.Stats(profiler).sort_stats('cumulative')
     # stats.print_stats(10)  # Print the top 10 time-consuming functions
 
 
+def create_synthetic_archive(
+    directory: Path,
+    files: int = 100,
+    time: int = 48,
+    latitude: int = 64,
+    longitude: int = 64,
+    variables: int = 4,
+) -> List[Path]:
+    """Write an archive of small NetCDF files, each holding a few chunked and
+    compressed variables along time, latitude and longitude"""
+    directory.mkdir(parents=True, exist_ok=True)
+    random = np.random.default_rng(0)
+    file_paths = []
+    for index in range(files):
+        file_path = directory / f'synthetic_{index:05d}.nc'
+        with netCDF4.Dataset(file_path, 'w') as dataset:
+            dataset.createDimension('time', time)
+            dataset.createDimension('lat', latitude)
+            dataset.createDimension('lon', longitude)
+            dataset.createVariable('time', 'f8', ('time',))[:] = np.arange(time) + index * time
+            dataset['time'].units = 'hours since 2000-01-01'
+            dataset.createVariable('lat', 'f4', ('lat',))[:] = np.linspace(-90, 90, latitude)
+            dataset.createVariable('lon', 'f4', ('lon',))[:] = np.linspace(-180, 180, longitude)
+            for variable in range(variables):
+                data = dataset.createVariable(
+                    f'variable_{variable}',
+                    'f4',
+                    ('time', 'lat', 'lon'),
+                    zlib=True,
+                    chunksizes=(1, latitude, longitude),
+                )
+                data[:] = random.random((time, latitude, longitude), dtype='f4')
+        file_paths.append(file_path)
+    return file_paths
+
+
+def benchmark_reference_executors(
+    file_paths: List[Path],
+    executors: List[Executor],
+    workers: Optional[int] = None,
+    repeats: int = 3,
+) -> pd.DataFrame:
+    """Time referencing the same files with each executor.
+
+    References are written to a fresh temporary directory for each run, so
+    that no run skips files referenced by a previous one.
+
+    Returns
+    -------
+    pd.DataFrame
+        One row per executor, sorted by time : the best `Time` of the runs in
+        seconds, the `Throughput` in files per second and the number of
+        `Failed` files
+    """
+    rows = []
+    for executor in executors:
+        best_time = float('inf')
+        failed = 0
+        for _ in range(repeats):
+            with tempfile.TemporaryDirectory(prefix='rekx-reference-benchmark-') as output_directory:
+                partial_create_single_reference = partial(
+                    create_single_reference, output_directory=Path(output_directory)
+                )
+                start = timer.perf_counter()
+                results = map_unordered(
+                    partial_create_single_reference,
+                    file_paths,
+                    workers=workers,
+                    executor=executor,
+                )
+                failed = sum(exception is not None for _, _, exception in results)
+                best_time = min(best_time, timer.perf_counter() - start)
+        rows.append({
+            'Executor': executor.value,
+            'Time': best_time,
+            'Throughput': len(file_paths) / best_time,
+            'Failed': failed,
+        })
+    return pd.DataFrame(rows).sort_values('Time', kind='stable').reset_index(drop=True)
+
+
+def print_reference_benchmark(benchmark: pd.DataFrame, title: Optional[str] = None) -> None:
+    """Print a benchmark of reference executors"""
+    table = Table(title=title, show_header=True, header_style="bold magenta", box=SIMPLE_HEAD)
+    table.add_column("Executor", no_wrap=True)
+    table.add_column("Time", no_wrap=True)
+    table.add_column("Throughput", no_wrap=True)
+    table.add_column("Failed", no_wrap=True)
+    for _, row in benchmark.iterrows():
+        table.add_row(
+            row['Executor'],
+            f"{row['Time']:.3f} s",
+            f"{row['Throughput']:.1f} files/s",
+            str(row['Failed']),
+        )
+    console = Console()
+    console.print(table)
+
+
+def reference_benchmark(
+    source_directory: Annotated[Optional[Path], typer.Option(help='Directory of NetCDF files to reference. A synthetic archive by default')] = None,
+    pattern: Annotated[str, typer_option_filename_pattern] = '*.nc',
+    archive_directory: Annotated[Optional[Path], typer.Option(help='Directory to write the synthetic archive to, ex. on the filesystem to benchmark. A temporary directory by default')] = None,
+    files: Annotated[int, typer.Option(help='Number of files of the synthetic archive')] = 200,
+    executors: Annotated[str, typer.Option(help='Comma-separated executors to compare')] = 'thread,process,serial',
+    workers: Annotated[Optional[int], typer_option_number_of_workers] = None,
+    repeats: Annotated[int, typer.Option(help='Runs per executor, the best of which is kept')] = 3,
+    verbose: Annotated[int, typer_option_verbose] = VERBOSE_LEVEL_DEFAULT,
+):
+    """Compare the executors of `reference` on existing or synthetic files
+
+    The synthetic archive consists of many small NetCDF files, for which the
+    cost of starting workers and collecting their results weighs the most.
+    """
+    executors = [Executor(executor.strip()) for executor in executors.split(',')]
+    if archive_directory:
+        archive_directory.mkdir(parents=True, exist_ok=True)
+    with tempfile.TemporaryDirectory(prefix='rekx-synthetic-archive-', dir=archive_directory) as temporary_directory:
+        if source_directory:
+            file_paths = list(Path(source_directory).glob(pattern))
+        else:
+            file_paths = create_synthetic_archive(Path(temporary_directory), files=files)
+        if not file_paths:
+            print(f"No files matching the pattern [code]{pattern}[/code] found in [code]{source_directory}[/code]!")
+            return
+        if verbose:
+            print(f"Referencing {len(file_paths)} files {repeats} times per executor")
+        benchmark = benchmark_reference_executors(
+            file_paths,
+            executors=executors,
+            workers=workers,
+            repeats=repeats,
+        )
+    print_reference_benchmark(benchmark, title=f'Referencing {len(file_paths)} files')
+    return benchmark
+
+
 if __name__ == "__main__":
     app()
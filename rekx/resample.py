@@ -0,0 +1,136 @@
+"""Temporal aggregation of series while they are read.
+
+The series is consumed block by block along time. Each block is reduced to
+partial aggregates per period (count, sum, second moment, minimum, maximum,
+first and last value), which are merged at the end. Only the periods shared by
+consecutive blocks overlap, hence the full-resolution series is never
+materialised and memory is bounded by the block size and the number of output
+periods.
+"""
+from typing import List
+from typing import Union
+import numpy as np
+import pandas as pd
+import xarray as xr
+from .constants import STATISTICS_BLOCK_SIZE_DEFAULT
+from .statistics import iterate_blocks
+
+
+AGGREGATIONS = ('count', 'sum', 'mean', 'min', 'max', 'std', 'var', 'first', 'last')
+
+
+def parse_aggregations(how: str) -> List[str]:
+    """Parse comma-separated aggregations, ex. 'mean,max'"""
+    aggregations = [aggregation.strip() for aggregation in how.split(',') if aggregation.strip()]
+    unknown = set(aggregations) - set(AGGREGATIONS)
+    if unknown:
+        raise ValueError(f'Unknown aggregations {sorted(unknown)}, choose among {AGGREGATIONS}')
+    return aggregations
+
+
+def partial_aggregates(
+    values: np.ndarray,
+    timestamps: np.ndarray,
+    frequency: str,
+) -> dict:
+    """Reduce a block of shape (time, columns) to partial aggregates per period.
+
+    Bins of fixed frequencies, ex. '3h', are aligned to the epoch so that all
+    blocks share the same period labels. Calendar frequencies, ex. 'MS' or
+    'W', are anchored by pandas, which warns that an origin has no effect.
+    """
+    options = {}
+    if isinstance(pd.tseries.frequencies.to_offset(frequency), pd.offsets.Tick):
+        options['origin'] = 'epoch'
+    resampler = pd.DataFrame(values, index=pd.DatetimeIndex(timestamps)).resample(
+        frequency,
+        **options,
+    )
+    count = resampler.count()
+    return {
+        'count': count,
+        'sum': resampler.sum(),
+        'm2': resampler.var(ddof=0).fillna(0) * count,
+        'min': resampler.min(),
+        'max': resampler.max(),
+        'first': resampler.first(),
+        'last': resampler.last(),
+    }
+
+
+def merge_partial_aggregates(partials: List[dict]) -> dict:
+    """Merge partial aggregates of consecutive blocks"""
+    stacked = {key: pd.concat([partial[key] for partial in partials]) for key in partials[0]}
+    grouped = {key: frame.groupby(level=0, sort=True) for key, frame in stacked.items()}
+    count = grouped['count'].sum()
+    total = grouped['sum'].sum()
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = total / count.where(count > 0)
+        block_mean = stacked['sum'] / stacked['count'].where(stacked['count'] > 0)
+        deviation = stacked['count'] * (block_mean - mean.reindex(block_mean.index)) ** 2
+    m2 = (stacked['m2'] + deviation.fillna(0)).groupby(level=0).sum()
+    variance = m2 / count.where(count > 0)
+    return {
+        'count': count,
+        'sum': total.where(count > 0),
+        'mean': mean,
+        'min': grouped['min'].min(),
+        'max': grouped['max'].max(),
+        'std': np.sqrt(variance),
+        'var': variance,
+        'first': grouped['first'].first(),
+        'last': grouped['last'].last(),
+    }
+
+
+def resample_series(
+    data_array: xr.DataArray,
+    frequency: str,
+    how: Union[str, List[str]] = 'mean',
+    block_size: int = STATISTICS_BLOCK_SIZE_DEFAULT,
+) -> Union[xr.DataArray, xr.Dataset]:
+    """Aggregate a series over periods of `frequency` in a single pass.
+
+    Parameters
+    ----------
+    data_array: xr.DataArray
+        Series with `time` as the first dimension, ex. a time series over a
+        location
+    frequency: str
+        Pandas frequency alias of the periods, ex. 'D', 'MS' or '3h'
+    how: str or list of str
+        Aggregations among `AGGREGATIONS`, ex. 'mean,max'
+    block_size: int
+        Number of elements read and reduced at once
+
+    Returns
+    -------
+    xr.DataArray or xr.Dataset
+        The aggregated series for a single aggregation, otherwise a Dataset
+        with one variable per aggregation, ex. `SIS_mean` and `SIS_max`
+    """
+    aggregations = parse_aggregations(how) if isinstance(how, str) else list(how)
+    if data_array.dims[0] != 'time':
+        data_array = data_array.transpose('time', ...)
+    template = data_array.isel(time=0, drop=True)
+
+    partials = [
+        partial_aggregates(values.reshape(len(values), -1), timestamps, frequency)
+        for values, timestamps, _ in iterate_blocks(data_array, block_size)
+    ]
+    aggregates = merge_partial_aggregates(partials)
+
+    name = data_array.name or 'values'
+    results = {}
+    for aggregation in aggregations:
+        frame = aggregates[aggregation]
+        results[f'{name}_{aggregation}'] = xr.DataArray(
+            frame.to_numpy().reshape((len(frame),) + template.shape),
+            dims=('time',) + template.dims,
+            coords={**template.coords, 'time': frame.index.values},
+            name=f'{name}_{aggregation}',
+            attrs={**data_array.attrs, 'cell_methods': f'time: {aggregation} (interval: {frequency})'},
+        )
+    if len(results) == 1:
+        return next(iter(results.values()))
+    return xr.Dataset(results)
@@ -9,3 +9,5 @@ rich_help_panel_time_series = 'Time series'
 rich_help_panel_advanced_options = 'Advanced'
 rich_help_panel_output = 'Input / Output'
 rich_help_panel_plotting = 'Plot'
+rich_help_panel_caching = 'Caching'
+rich_help_panel_cache = 'Cache chunks locally'
@@ -0,0 +1,129 @@
+"""Schedule tasks over many files on a pool of workers.
+
+Multi-file commands, ex. creating references or collecting metadata, submit
+one task per file. Tasks are ordered largest file first and pulled by idle
+workers from a shared queue, hence a worker done with its tasks takes over
+the remaining ones instead of the pool waiting for a large file submitted
+last. Small tasks are sent to the workers in batches to reduce the overhead
+of communicating with them.
+
+Workers are processes, threads for I/O-bound tasks which avoid starting
+processes and pickling results, or the calling process itself.
+"""
+from functools import partial
+from pathlib import Path
+from typing import Any
+from typing import Callable
+from typing import Iterable
+from typing import Iterator
+from typing import List
+from typing import Optional
+from typing import Tuple
+from multiprocessing.pool import Pool
+from multiprocessing.pool import ThreadPool
+import os
+from .models import Executor
+
+
+MEMORY_PER_WORKER_DEFAULT = 512 * 1024 * 1024  # Python, HDF5 and Xarray
+TASKS_PER_WORKER = 4
+THREADS_PER_CPU = 4  # mostly waiting on I/O
+
+
+def get_number_of_workers(
+    workers: Optional[int] = None,
+    memory_per_worker: int = MEMORY_PER_WORKER_DEFAULT,
+    tasks: Optional[int] = None,
+) -> int:
+    """Number of worker processes, `workers` if given, else as many as the
+    CPUs and the available memory, at `memory_per_worker` bytes each, allow,
+    and no more than the number of `tasks`"""
+    if not workers:
+        import psutil
+
+        workers = os.cpu_count() or 1
+        if memory_per_worker:
+            available = psutil.virtual_memory().available
+            workers = min(workers, available // memory_per_worker)
+    if tasks is not None:
+        workers = min(workers, tasks)
+    return max(1, int(workers))
+
+
+def order_by_size(file_paths: Iterable[Path]) -> List[Path]:
+    """Order files largest first, as the largest tasks delay the completion
+    of a pool the most when run last"""
+    return sorted(file_paths, key=os.path.getsize, reverse=True)
+
+
+def get_chunksize(tasks: int, workers: int) -> int:
+    """Number of tasks sent to a worker at once, small enough for the workers
+    to balance their load at the end"""
+    return max(1, tasks // (workers * TASKS_PER_WORKER))
+
+
+def run_task(function: Callable, item: Any) -> Tuple[Any, Any, Optional[Exception]]:
+    """Run a task in a worker, returning an exception instead of raising it,
+    so that a single failing file does not abort the others"""
+    try:
+        return item, function(item), None
+    except Exception as exception:
+        return item, None, exception
+
+
+def map_unordered(
+    function: Callable,
+    file_paths: Iterable[Path],
+    workers: Optional[int] = None,
+    memory_per_worker: int = MEMORY_PER_WORKER_DEFAULT,
+    executor: Executor = Executor.process,
+) -> Iterator[Tuple[Path, Any, Optional[Exception]]]:
+    """Apply `function` to each file, largest first, in a pool of workers.
+
+    Parameters
+    ----------
+    function: Callable
+        Function of a single file path, picklable, ex. a module-level
+        function or a `functools.partial` of one
+    file_paths: Iterable[Path]
+        Input files
+    workers: int, optional
+        Number of worker processes or threads, see `get_number_of_workers`
+    memory_per_worker: int
+        Memory a worker process is expected to use, in bytes
+    executor: Executor
+        Worker processes, threads, or none for a serial execution
+
+    Yields
+    ------
+    Tuple[Path, Any, Optional[Exception]]
+        File path, result and exception, if any, in order of completion
+    """
+    file_paths = order_by_size(file_paths)
+    if not file_paths:
+        return
+    if executor == Executor.serial:
+        yield from (run_task(function, file_path) for file_path in file_paths)
+        return
+    if executor == Executor.thread:
+        workers = get_number_of_workers(
+            workers or THREADS_PER_CPU * (os.cpu_count() or 1),
+            tasks=len(file_paths),
+        )
+        pool_class = ThreadPool
+    else:
+        workers = get_number_of_workers(
+            workers,
+            memory_per_worker=memory_per_worker,
+            tasks=len(file_paths),
+        )
+        pool_class = Pool
+    if workers == 1:
+        yield from (run_task(function, file_path) for file_path in file_paths)
+        return
+    with pool_class(processes=workers) as pool:
+        yield from pool.imap_unordered(
+            partial(run_task, function),
+            file_paths,
+            chunksize=get_chunksize(len(file_paths), workers),
+        )
@@ -1,7 +1,8 @@
 from devtools import debug
-# from .log import logger
-# from .log import print_log_messages
+from .log import logger
+from .log import print_log_messages
 from typing import Any
+from typing import List
 from typing import Optional
 # from pvgisprototype import Longitude
 # from pvgisprototype import Latitude
@@ -11,6 +12,7 @@ from rekx.constants import REPETITIONS_DEFAULT
 from rekx.constants import VERBOSE_LEVEL_DEFAULT
 from rekx.utilities import select_location_time_series
 from rekx.models import MethodForInexactMatches
+from rekx.models import ArrowFormat
 from rekx.utilities import get_scale_and_offset
 from rekx.hardcodings import exclamation_mark
 from rekx.hardcodings import check_mark
@@ -37,6 +39,8 @@ from .typer_parameters import typer_argument_time_series
 from .typer_parameters import typer_argument_timestamps
 from .typer_parameters import typer_option_start_time
 from .typer_parameters import typer_option_end_time
+from .typer_parameters import typer_option_resample
+from .typer_parameters import typer_option_resample_aggregations
 from .typer_parameters import typer_option_convert_longitude_360
 from .typer_parameters import typer_option_mask_and_scale
 from .typer_parameters import typer_option_neighbor_lookup
@@ -46,13 +50,38 @@ from .typer_parameters import typer_option_in_memory
 from .typer_parameters import typer_option_statistics
 from .typer_parameters import typer_option_rounding_places
 from .typer_parameters import typer_option_csv
+from .typer_parameters import typer_option_locations
+from .typer_parameters import typer_option_locations_file
+from .typer_parameters import typer_option_statistics_output
+from .typer_parameters import typer_option_arrow
+from .typer_parameters import typer_option_arrow_format
+from .typer_parameters import typer_option_arrow_compression
+from .typer_parameters import typer_option_arrow_partition
 from .typer_parameters import typer_option_variable_name_as_suffix
 from .typer_parameters import typer_option_verbose
+from .typer_parameters import typer_option_chunk_cache_size
+from .typer_parameters import typer_option_chunk_cache_directory
+from .typer_parameters import typer_option_disk_cache_directory
+from .typer_parameters import typer_option_disk_cache_size
 from .constants import ROUNDING_PLACES_DEFAULT
+from .constants import RESAMPLE_AGGREGATIONS_DEFAULT
+from .constants import ARROW_COMPRESSION_DEFAULT
+from .constants import CHUNK_CACHE_SIZE_DEFAULT
+from .constants import DISK_CACHE_SIZE_DEFAULT
 from .constants import VERBOSE_LEVEL_DEFAULT
 from .utilities import set_location_indexers
+from .chunks import select_time_chunks
 from .statistics import print_series_statistics
+from .resample import resample_series
+from .statistics import calculate_site_statistics
+from .statistics import write_site_statistics
+from .utilities import parse_locations
 from .csv import to_csv
+from .arrow import to_arrow
+from .cache import is_reference_set
+from .cache import open_reference_mapper
+from .cache import collect_cache_statistics
+from .print import print_chunk_cache_statistics
 import kerchunk
 import fsspec
 import multiprocessing
@@ -76,6 +105,8 @@ from .progress import display_context
 import time as timer
 
 
+
+
 # app = typer.Typer(
 #     cls=OrderCommands,
 #     add_completion=True,
@@ -93,6 +124,10 @@ def read(
     tolerance: Annotated[Optional[float], typer_option_tolerance] = 0.1, # Customize default if needed
     # in_memory: Annotated[bool, typer_option_in_memory] = False,
     repetitions: Annotated[int, typer_option_repetitions] = REPETITIONS_DEFAULT,
+    chunk_cache_size: Annotated[int, typer_option_chunk_cache_size] = CHUNK_CACHE_SIZE_DEFAULT,
+    chunk_cache_directory: Annotated[Optional[Path], typer_option_chunk_cache_directory] = None,
+    disk_cache_directory: Annotated[Optional[Path], typer_option_disk_cache_directory] = None,
+    disk_cache_size: Annotated[int, typer_option_disk_cache_size] = DISK_CACHE_SIZE_DEFAULT,
     verbose: Annotated[int, typer_option_verbose] = VERBOSE_LEVEL_DEFAULT,
 ):
     """Time reading data over a location.
@@ -107,12 +142,34 @@ def read(
     ``mask_and_scale`` is always set to ``False`` to avoid errors related with
     decoding timestamps.
 
+    Kerchunk reference sets (JSON files or Parquet stores) are read via Zarr.
+    Decompressed chunks are then optionally cached and reused across
+    repetitions, see ``chunk_cache_size``, and raw byte ranges optionally
+    cached in a local directory, see ``disk_cache_directory``.
+
     """
     try:
         timings = []
         for _ in range(repetitions):
             data_retrieval_start_time = timer.perf_counter()
-            with xr.open_dataset(time_series, mask_and_scale=False) as dataset:
+            if is_reference_set(time_series):
+                mapper = open_reference_mapper(
+                    reference=time_series,
+                    chunk_cache_size=chunk_cache_size,
+                    chunk_cache_directory=chunk_cache_directory,
+                    disk_cache_directory=disk_cache_directory,
+                    disk_cache_size=disk_cache_size,
+                )
+                dataset = xr.open_dataset(
+                    mapper,
+                    engine="zarr",
+                    backend_kwargs={"consolidated": False},
+                    chunks=None,
+                    mask_and_scale=False,
+                )
+            else:
+                dataset = xr.open_dataset(time_series, mask_and_scale=False)
+            with dataset:
                 _ = (
                     dataset[variable]
                     .sel(lon=longitude, lat=latitude, method="nearest")
@@ -124,6 +181,9 @@ def read(
             return f"{average_data_retrieval_time:.3f}"
         else:
             print(f'[bold green]It worked[/bold green] and took : {average_data_retrieval_time}')
+            if is_reference_set(time_series):
+                for title, cache_statistics in collect_cache_statistics(mapper).items():
+                    print_chunk_cache_statistics(cache_statistics, title=title)
 
     except Exception as e:
         print(f"An error occurred: {e}")
@@ -196,6 +256,8 @@ def select_time_series(
     timestamps: Annotated[Optional[Any], typer_argument_timestamps] = None,
     start_time: Annotated[Optional[datetime], typer_option_start_time] = None,
     end_time: Annotated[Optional[datetime], typer_option_end_time] = None,
+    resample: Annotated[Optional[str], typer_option_resample] = None,
+    how: Annotated[str, typer_option_resample_aggregations] = RESAMPLE_AGGREGATIONS_DEFAULT,
     time: Annotated[Optional[int], typer.Option(help="New chunk size for the 'time' dimension")] = None,
     lat: Annotated[Optional[int], typer.Option(help="New chunk size for the 'lat' dimension")] = None,
     lon: Annotated[Optional[int], typer.Option(help="New chunk size for the 'lon' dimension")]= None,
@@ -206,6 +268,10 @@ def select_time_series(
     in_memory: Annotated[bool, typer_option_in_memory] = False,
     statistics: Annotated[bool, typer_option_statistics] = False,
     csv: Annotated[Path, typer_option_csv] = None,
+    arrow: Annotated[Optional[Path], typer_option_arrow] = None,
+    arrow_format: Annotated[Optional[ArrowFormat], typer_option_arrow_format] = None,
+    compression: Annotated[str, typer_option_arrow_compression] = ARROW_COMPRESSION_DEFAULT,
+    partition: Annotated[bool, typer_option_arrow_partition] = False,
     # output_filename: Annotated[Path, typer_option_output_filename] = 'series_in',  #Path(),
     variable_name_as_suffix: Annotated[bool, typer_option_variable_name_as_suffix] = True,
     rounding_places: Annotated[Optional[int], typer_option_rounding_places] = ROUNDING_PLACES_DEFAULT,
@@ -285,22 +351,14 @@ def select_time_series(
     if start_time or end_time:
         timestamps = None  # we don't need a timestamp anymore!
 
-        if start_time and not end_time:  # set `end_time` to end of series
-            end_time = location_time_series.time.values[-1]
-
-        elif end_time and not start_time:  # set `start_time` to beginning of series
-            start_time = location_time_series.time.values[0]
-
-        else:  # Convert `start_time` & `end_time` to the correct string format
-            start_time = start_time.strftime('%Y-%m-%d %H:%M:%S')
-            end_time = end_time.strftime('%Y-%m-%d %H:%M:%S')
-    
         timer_start = timer.time()
-        location_time_series = (
-            location_time_series.sel(time=slice(start_time, end_time))
+        location_time_series, time_chunks = select_time_chunks(
+            data_array=location_time_series,
+            start_time=start_time,
+            end_time=end_time,
         )
         timer_end = timer.time()
-        logger.debug(f"Time slicing with `start_time` and `end_time` took {timer_end - timer_start:.2f} seconds")
+        logger.debug(f"Time slicing with `start_time` and `end_time` over {len(time_chunks)} time chunks took {timer_end - timer_start:.2f} seconds")
 
     if timestamps is not None and not start_time and not end_time:
         if len(timestamps) == 1:
@@ -308,11 +366,13 @@ def select_time_series(
         
         try:
             timer_start = timer.time()
-            location_time_series = (
-                location_time_series.sel(time=timestamps, method=neighbor_lookup)
+            location_time_series, time_chunks = select_time_chunks(
+                data_array=location_time_series,
+                timestamps=timestamps,
+                method=neighbor_lookup,
             )
             timer_end = timer.time()
-            logger.debug(f"Time selection with `timestamps` took {timer_end - timer_start:.2f} seconds")
+            logger.debug(f"Time selection with `timestamps` over {len(time_chunks)} time chunks took {timer_end - timer_start:.2f} seconds")
 
         except KeyError:
             print(f"No data found for one or more of the given {timestamps}.")
@@ -367,11 +427,27 @@ def select_time_series(
             data_array=location_time_series,
             title='Selected series',
         )
+    if resample:
+        location_time_series = resample_series(
+            data_array=location_time_series,
+            frequency=resample,
+            how=how,
+        )
+        if verbose:
+            print(location_time_series)
     if csv:
         to_csv(
             x=location_time_series,
             path=csv,
         )
+    if arrow:
+        to_arrow(
+            x=location_time_series,
+            path=arrow,
+            output_format=arrow_format,
+            compression=compression,
+            partition=partition,
+        )
 
 
 # @app.command(
@@ -389,6 +465,8 @@ def select_time_series_from_json(
     timestamps: Annotated[Optional[Any], typer_argument_timestamps] = None,
     start_time: Annotated[Optional[datetime], typer_option_start_time] = None,
     end_time: Annotated[Optional[datetime], typer_option_end_time] = None,
+    resample: Annotated[Optional[str], typer_option_resample] = None,
+    how: Annotated[str, typer_option_resample_aggregations] = RESAMPLE_AGGREGATIONS_DEFAULT,
     time: Annotated[Optional[int], typer.Option(help="New chunk size for the 'time' dimension")] = None,
     lat: Annotated[Optional[int], typer.Option(help="New chunk size for the 'lat' dimension")] = None,
     lon: Annotated[Optional[int], typer.Option(help="New chunk size for the 'lon' dimension")]= None,
@@ -399,9 +477,17 @@ def select_time_series_from_json(
     in_memory: Annotated[bool, typer_option_in_memory] = False,
     statistics: Annotated[bool, typer_option_statistics] = False,
     csv: Annotated[Path, typer_option_csv] = None,
+    arrow: Annotated[Optional[Path], typer_option_arrow] = None,
+    arrow_format: Annotated[Optional[ArrowFormat], typer_option_arrow_format] = None,
+    compression: Annotated[str, typer_option_arrow_compression] = ARROW_COMPRESSION_DEFAULT,
+    partition: Annotated[bool, typer_option_arrow_partition] = False,
     # output_filename: Annotated[Path, typer_option_output_filename] = 'series_in',  #Path(),
     variable_name_as_suffix: Annotated[bool, typer_option_variable_name_as_suffix] = True,
     rounding_places: Annotated[Optional[int], typer_option_rounding_places] = ROUNDING_PLACES_DEFAULT,
+    chunk_cache_size: Annotated[int, typer_option_chunk_cache_size] = CHUNK_CACHE_SIZE_DEFAULT,
+    chunk_cache_directory: Annotated[Optional[Path], typer_option_chunk_cache_directory] = None,
+    disk_cache_directory: Annotated[Optional[Path], typer_option_disk_cache_directory] = None,
+    disk_cache_size: Annotated[int, typer_option_disk_cache_size] = DISK_CACHE_SIZE_DEFAULT,
     verbose: Annotated[int, typer_option_verbose] = VERBOSE_LEVEL_DEFAULT,
 ) -> None:
     """
@@ -417,11 +503,12 @@ def select_time_series_from_json(
     logger.debug(f'Starting data retrieval... {data_retrieval_start_time}')
 
     timer_start = timer.time()
-    mapper = fsspec.get_mapper(
-        "reference://",
-        fo=str(reference_file),
-        remote_protocol="file",
-        remote_options={"skip_instance_cache": True},
+    mapper = open_reference_mapper(
+        reference=reference_file,
+        chunk_cache_size=chunk_cache_size,
+        chunk_cache_directory=chunk_cache_directory,
+        disk_cache_directory=disk_cache_directory,
+        disk_cache_size=disk_cache_size,
     )
     timer_end = timer.time()
     logger.debug(f"Mapper creation took {timer_end - timer_start:.2f} seconds")
@@ -493,22 +580,14 @@ def select_time_series_from_json(
     if start_time or end_time:
         timestamps = None  # we don't need a timestamp anymore!
 
-        if start_time and not end_time:  # set `end_time` to end of series
-            end_time = location_time_series.time.values[-1]
-
-        elif end_time and not start_time:  # set `start_time` to beginning of series
-            start_time = location_time_series.time.values[0]
-
-        else:  # Convert `start_time` & `end_time` to the correct string format
-            start_time = start_time.strftime('%Y-%m-%d %H:%M:%S')
-            end_time = end_time.strftime('%Y-%m-%d %H:%M:%S')
-    
         timer_start = timer.time()
-        location_time_series = (
-            location_time_series.sel(time=slice(start_time, end_time))
+        location_time_series, time_chunks = select_time_chunks(
+            data_array=location_time_series,
+            start_time=start_time,
+            end_time=end_time,
         )
         timer_end = timer.time()
-        logger.debug(f"Time slicing with `start_time` and `end_time` took {timer_end - timer_start:.2f} seconds")
+        logger.debug(f"Time slicing with `start_time` and `end_time` over {len(time_chunks)} time chunks took {timer_end - timer_start:.2f} seconds")
 
     if timestamps is not None and not start_time and not end_time:
         if len(timestamps) == 1:
@@ -516,11 +595,13 @@ def select_time_series_from_json(
         
         try:
             timer_start = timer.time()
-            location_time_series = (
-                location_time_series.sel(time=timestamps, method=neighbor_lookup)
+            location_time_series, time_chunks = select_time_chunks(
+                data_array=location_time_series,
+                timestamps=timestamps,
+                method=neighbor_lookup,
             )
             timer_end = timer.time()
-            logger.debug(f"Time selection with `timestamps` took {timer_end - timer_start:.2f} seconds")
+            logger.debug(f"Time selection with `timestamps` over {len(time_chunks)} time chunks took {timer_end - timer_start:.2f} seconds")
 
         except KeyError:
             print(f"No data found for one or more of the given {timestamps}.")
@@ -545,6 +626,8 @@ def select_time_series_from_json(
 
     if verbose:
         print(location_time_series)
+        for title, cache_statistics in collect_cache_statistics(mapper).items():
+            print_chunk_cache_statistics(cache_statistics, title=title)
     # results = {
     #     location_time_series.name: location_time_series.to_numpy(),
     # }
@@ -568,11 +651,27 @@ def select_time_series_from_json(
             data_array=location_time_series,
             title='Selected series',
         )
+    if resample:
+        location_time_series = resample_series(
+            data_array=location_time_series,
+            frequency=resample,
+            how=how,
+        )
+        if verbose:
+            print(location_time_series)
     if csv:
         to_csv(
             x=location_time_series,
             path=csv,
         )
+    if arrow:
+        to_arrow(
+            x=location_time_series,
+            path=arrow,
+            output_format=arrow_format,
+            compression=compression,
+            partition=partition,
+        )
 
     # return location_time_series
 
@@ -591,6 +690,8 @@ def select_time_series_from_json_in_memory(
     timestamps: Annotated[Optional[Any], typer_argument_timestamps] = None,
     start_time: Annotated[Optional[datetime], typer_option_start_time] = None,
     end_time: Annotated[Optional[datetime], typer_option_end_time] = None,
+    resample: Annotated[Optional[str], typer_option_resample] = None,
+    how: Annotated[str, typer_option_resample_aggregations] = RESAMPLE_AGGREGATIONS_DEFAULT,
     list_variables: Annotated[bool, typer_option_list_variables] = False,
     time: Annotated[Optional[int], typer.Option(help="New chunk size for the 'time' dimension")] = None,
     lat: Annotated[Optional[int], typer.Option(help="New chunk size for the 'lat' dimension")] = None,
@@ -601,9 +702,17 @@ def select_time_series_from_json_in_memory(
     tolerance: Annotated[Optional[float], typer_option_tolerance] = 0.1, # Customize default if needed
     statistics: Annotated[bool, typer_option_statistics] = False,
     csv: Annotated[Path, typer_option_csv] = None,
+    arrow: Annotated[Optional[Path], typer_option_arrow] = None,
+    arrow_format: Annotated[Optional[ArrowFormat], typer_option_arrow_format] = None,
+    compression: Annotated[str, typer_option_arrow_compression] = ARROW_COMPRESSION_DEFAULT,
+    partition: Annotated[bool, typer_option_arrow_partition] = False,
     # output_filename: Annotated[Path, typer_option_output_filename] = 'series_in',  #Path(),
     variable_name_as_suffix: Annotated[bool, typer_option_variable_name_as_suffix] = True,
     rounding_places: Annotated[Optional[int], typer_option_rounding_places] = ROUNDING_PLACES_DEFAULT,
+    chunk_cache_size: Annotated[int, typer_option_chunk_cache_size] = CHUNK_CACHE_SIZE_DEFAULT,
+    chunk_cache_directory: Annotated[Optional[Path], typer_option_chunk_cache_directory] = None,
+    disk_cache_directory: Annotated[Optional[Path], typer_option_disk_cache_directory] = None,
+    disk_cache_size: Annotated[int, typer_option_disk_cache_size] = DISK_CACHE_SIZE_DEFAULT,
     verbose: Annotated[int, typer_option_verbose] = VERBOSE_LEVEL_DEFAULT,
 ) -> None:
     """
@@ -616,11 +725,12 @@ def select_time_series_from_json_in_memory(
     logger.debug(f'Command context : {print(typer.Context)}')
 
     timer_start = timer.time()
-    mapper = fsspec.get_mapper(
-        "reference://",
-        fo=str(reference_file),
-        remote_protocol="file",
-        remote_options={"skip_instance_cache": True},
+    mapper = open_reference_mapper(
+        reference=reference_file,
+        chunk_cache_size=chunk_cache_size,
+        chunk_cache_directory=chunk_cache_directory,
+        disk_cache_directory=disk_cache_directory,
+        disk_cache_size=disk_cache_size,
     )
     timer_end = timer.time()
     logger.debug(f"Mapper creation took {timer_end - timer_start:.2f} seconds")
@@ -693,22 +803,14 @@ def select_time_series_from_json_in_memory(
     if start_time or end_time:
         timestamps = None  # we don't need a timestamp anymore!
 
-        if start_time and not end_time:  # set `end_time` to end of series
-            end_time = location_time_series.time.values[-1]
-
-        elif end_time and not start_time:  # set `start_time` to beginning of series
-            start_time = location_time_series.time.values[0]
-
-        else:  # Convert `start_time` & `end_time` to the correct string format
-            start_time = start_time.strftime('%Y-%m-%d %H:%M:%S')
-            end_time = end_time.strftime('%Y-%m-%d %H:%M:%S')
-    
         timer_start = timer.time()
-        location_time_series = (
-            location_time_series.sel(time=slice(start_time, end_time))
+        location_time_series, time_chunks = select_time_chunks(
+            data_array=location_time_series,
+            start_time=start_time,
+            end_time=end_time,
         )
         timer_end = timer.time()
-        logger.debug(f"Time slicing with `start_time` and `end_time` took {timer_end - timer_start:.2f} seconds")
+        logger.debug(f"Time slicing with `start_time` and `end_time` over {len(time_chunks)} time chunks took {timer_end - timer_start:.2f} seconds")
 
     if timestamps is not None and not start_time and not end_time:
         if len(timestamps) == 1:
@@ -716,11 +818,13 @@ def select_time_series_from_json_in_memory(
         
         try:
             timer_start = timer.time()
-            location_time_series = (
-                location_time_series.sel(time=timestamps, method=neighbor_lookup)
+            location_time_series, time_chunks = select_time_chunks(
+                data_array=location_time_series,
+                timestamps=timestamps,
+                method=neighbor_lookup,
             )
             timer_end = timer.time()
-            logger.debug(f"Time selection with `timestamps` took {timer_end - timer_start:.2f} seconds")
+            logger.debug(f"Time selection with `timestamps` over {len(time_chunks)} time chunks took {timer_end - timer_start:.2f} seconds")
 
         except KeyError:
             print(f"No data found for one or more of the given {timestamps}.")
@@ -743,6 +847,10 @@ def select_time_series_from_json_in_memory(
     data_retrieval_end_time = timer.time()
     logger.debug(f"Data retrieval took {data_retrieval_end_time - data_retrieval_start_time:.2f} seconds")
 
+    if verbose and (chunk_cache_size or disk_cache_directory):
+        for title, cache_statistics in collect_cache_statistics(mapper).items():
+            print_chunk_cache_statistics(cache_statistics, title=title)
+
     results = {
         location_time_series.name: location_time_series.to_numpy(),
     }
@@ -767,10 +875,99 @@ def select_time_series_from_json_in_memory(
             data_array=location_time_series,
             title='Selected series',
         )
+    if resample:
+        location_time_series = resample_series(
+            data_array=location_time_series,
+            frequency=resample,
+            how=how,
+        )
+        if verbose:
+            print(location_time_series)
     if csv:
         to_csv(
             x=location_time_series,
             path=csv,
         )
+    if arrow:
+        to_arrow(
+            x=location_time_series,
+            path=arrow,
+            output_format=arrow_format,
+            compression=compression,
+            partition=partition,
+        )
 
     # return location_time_series
+
+
+def select_site_statistics(
+    time_series: Annotated[Path, typer_argument_time_series],
+    variable: Annotated[str, typer.Argument(help='Variable to select data from')],
+    locations: Annotated[Optional[List[str]], typer_option_locations] = None,
+    locations_file: Annotated[Optional[Path], typer_option_locations_file] = None,
+    start_time: Annotated[Optional[datetime], typer_option_start_time] = None,
+    end_time: Annotated[Optional[datetime], typer_option_end_time] = None,
+    mask_and_scale: Annotated[bool, typer_option_mask_and_scale] = False,
+    neighbor_lookup: Annotated[MethodForInexactMatches, typer_option_neighbor_lookup] = MethodForInexactMatches.nearest,
+    output: Annotated[Optional[Path], typer_option_statistics_output] = None,
+    chunk_cache_size: Annotated[int, typer_option_chunk_cache_size] = CHUNK_CACHE_SIZE_DEFAULT,
+    chunk_cache_directory: Annotated[Optional[Path], typer_option_chunk_cache_directory] = None,
+    disk_cache_directory: Annotated[Optional[Path], typer_option_disk_cache_directory] = None,
+    disk_cache_size: Annotated[int, typer_option_disk_cache_size] = DISK_CACHE_SIZE_DEFAULT,
+    verbose: Annotated[int, typer_option_verbose] = VERBOSE_LEVEL_DEFAULT,
+) -> None:
+    """Calculate the statistics of the time series over many locations at
+    once and write them as a table, one row per location.
+
+    All locations are selected with a single vectorized (pointwise) selection
+    and reduced together, see `calculate_site_statistics`.
+    """
+    coordinates = parse_locations(locations, locations_file)
+    if not coordinates:
+        raise typer.BadParameter('Provide locations via `--location` or `--locations-file`')
+
+    if is_reference_set(time_series):
+        mapper = open_reference_mapper(
+            reference=time_series,
+            chunk_cache_size=chunk_cache_size,
+            chunk_cache_directory=chunk_cache_directory,
+            disk_cache_directory=disk_cache_directory,
+            disk_cache_size=disk_cache_size,
+        )
+        dataset = xr.open_dataset(
+            mapper,
+            engine="zarr",
+            backend_kwargs={"consolidated": False},
+            chunks=None,
+            mask_and_scale=mask_and_scale,
+        )
+    else:
+        dataset = xr.open_dataset(time_series, mask_and_scale=mask_and_scale)
+
+    data_array = dataset[variable]
+    x, y = ('lon', 'lat') if 'lon' in data_array.dims else ('longitude', 'latitude')
+    longitudes, latitudes = zip(*coordinates)
+    site_time_series = data_array.sel(
+        {
+            x: xr.DataArray(list(longitudes), dims='site'),
+            y: xr.DataArray(list(latitudes), dims='site'),
+        },
+        method=neighbor_lookup,
+    )
+    if start_time or end_time:
+        site_time_series, _ = select_time_chunks(
+            data_array=site_time_series,
+            start_time=start_time,
+            end_time=end_time,
+        )
+    site_time_series = site_time_series.set_index(site=[x, y])
+
+    timer_start = timer.time()
+    site_statistics = calculate_site_statistics(site_time_series)
+    logger.debug(f"Statistics of {len(coordinates)} locations took {timer.time() - timer_start:.2f} seconds")
+
+    if output:
+        write_site_statistics(site_statistics, output)
+        print(f"{check_mark} Statistics of {len(coordinates)} locations written to [code]{output}[/code]")
+    else:
+        print(site_statistics.to_string())
@@ -1,47 +1,368 @@
-# from rich.console import Console
-# import xarray as xr
-# import numpy as np
-# from scipy.stats import mode
-# from rich.table import Table
-# from rich import box
+from rich.console import Console
+import xarray as xr
+import numpy as np
+import pandas as pd
+from pathlib import Path
+from rich.table import Table
+from rich import box
 # import csv
 # from rekx.conversions import round_float_values
+from rekx.constants import STATISTICS_BLOCK_SIZE_DEFAULT
 # from rekx.constants import ROUNDING_PLACES_DEFAULT
 
 
-def calculate_series_statistics(data_array, timestamps):
-    import xarray as xr
-    data_xarray = xr.DataArray(
-        data_array,
-        coords=[('time', timestamps)],
-    )
-    data_xarray.load()
-    statistics = {
-        'Start': data_xarray.time.values[0],
-        'End': data_xarray.time.values[-1],
-        'Count': data_xarray.count().values,
-        'Min': data_xarray.min().values,
-        '25th Percentile': np.percentile(data_xarray, 25),
-        'Mean': data_xarray.mean().values,
-        'Median': data_xarray.median().values,
-        'Mode': mode(data_xarray.values.flatten())[0],
-        'Max': data_xarray.max().values,
-        'Sum': data_xarray.sum().values,
-        'Variance': data_xarray.var().values,
-        'Standard deviation': data_xarray.std().values,
-        'Time of Min': data_xarray.idxmin('time').values,
-        'Index of Min': data_xarray.argmin().values,
-        'Time of Max': data_xarray.idxmax('time').values,
-        'Index of Max': data_xarray.argmax().values,
-        # 'Longitude of Max': data_xarray.argmax('lon').values,
-        # 'Latitude of Max': data_xarray.argmax('lat').values,
+class QuantileSketch:
+    """Mergeable approximate quantile sketch after Karnin, Lang & Liberty (KLL).
+
+    Values are kept in levels of compactors, items in level `h` weighing
+    `2**h`. A level exceeding `size` items is sorted and every other item,
+    starting at a random offset, is promoted to the next level. Memory is
+    bounded by `size` items per level, the rank error decreases with `size`.
+
+    Items are stacked along the first axis, hence a 2-D sketch holds one
+    sketch per column, ex. per site, compacted together. NaN values sort
+    last, are compacted like any other value and ignored by `quantile`.
+
+    Parameters
+    ----------
+    size: int
+        Maximum number of items per level
+    seed: int
+        Seed of the random offsets, for reproducible estimates
+    """
+
+    def __init__(self, size: int = 256, seed: int = 0):
+        self.size = size
+        self.levels = []
+        self._random = np.random.default_rng(seed)
+
+    def update(self, values: np.ndarray) -> None:
+        values = np.asarray(values, dtype='float64')
+        self._extend(0, values)
+        self.compact()
+
+    def _extend(self, level: int, items: np.ndarray) -> None:
+        if level == len(self.levels):
+            self.levels.append(items[:0])
+        self.levels[level] = np.concatenate([self.levels[level], items])
+
+    def compact(self) -> None:
+        level = 0
+        while level < len(self.levels):
+            items = self.levels[level]
+            if len(items) > self.size:
+                items = np.sort(items, axis=0)
+                if len(items) % 2:  # keep one item to promote an even number
+                    self.levels[level], items = items[-1:], items[:-1]
+                else:
+                    self.levels[level] = items[:0]
+                self._extend(level + 1, items[self._random.integers(2)::2])
+            level += 1
+
+    def merge(self, other: 'QuantileSketch') -> None:
+        for level, items in enumerate(other.levels):
+            self._extend(level, items)
+        self.compact()
+
+    def quantile(self, q: float):
+        """Return the approximate `q`-th quantile, `q` in [0, 1], per column"""
+        if not self.levels:
+            return np.nan
+        items = np.concatenate(self.levels)
+        weights = np.concatenate([
+            np.full(len(level_items), 2.0**level)
+            for level, level_items in enumerate(self.levels)
+        ])
+        weights = weights.reshape((-1,) + (1,) * (items.ndim - 1))
+        order = np.argsort(items, axis=0, kind='stable')
+        sorted_items = np.take_along_axis(items, order, axis=0)
+        sorted_weights = np.where(np.isnan(sorted_items), 0, np.take_along_axis(np.broadcast_to(weights, items.shape), order, axis=0))
+        cumulative_weights = np.cumsum(sorted_weights, axis=0)
+        position = (cumulative_weights < q * cumulative_weights[-1]).sum(axis=0)
+        quantile = np.take_along_axis(sorted_items, np.expand_dims(np.minimum(position, len(items) - 1), 0), axis=0)[0]
+        return np.where(cumulative_weights[-1] > 0, quantile, np.nan)
+
+
+class SeriesStatistics:
+    """Single-pass statistics of series consumed block by block.
+
+    Blocks are 2-D, time along the rows and one series per column, ex. one
+    column per site. All statistics are vectorized NumPy reductions along
+    the rows. Count, sum, minimum and maximum with their position and
+    timestamp are updated per block. Mean and variance are merged per block
+    with the parallel variant of Welford's algorithm (Chan et al.), which is
+    numerically stable. Quantiles are estimated by a `QuantileSketch`. NaN
+    values are ignored.
+
+    Partial statistics of separate blocks can be combined with `merge`, ex.
+    after reducing the chunks of a Dask array in parallel.
+    """
+
+    def __init__(self, sketch_size: int = 1024):
+        self.sketch_size = sketch_size
+        self.columns = None
+        self.start = None
+        self.end = None
+
+    def _initialise(self, columns: int) -> None:
+        self.columns = columns
+        self.count = np.zeros(columns, dtype='int64')
+        self.sum = np.zeros(columns)
+        self.mean = np.zeros(columns)
+        self.m2 = np.zeros(columns)  # sum of squared differences from the mean
+        self.minimum = np.full(columns, np.nan)
+        self.maximum = np.full(columns, np.nan)
+        self.index_of_minimum = np.full(columns, -1, dtype='int64')
+        self.index_of_maximum = np.full(columns, -1, dtype='int64')
+        self.time_of_minimum = None
+        self.time_of_maximum = None
+        self.sketch = QuantileSketch(size=self.sketch_size)
+
+    def update(
+        self,
+        values: np.ndarray,
+        timestamps: np.ndarray = None,
+        offset: int = 0,
+    ) -> None:
+        """Consume a block of the series.
+
+        Parameters
+        ----------
+        values: np.ndarray
+            Block of shape (time, columns), or (time,) for a single series
+        timestamps: np.ndarray, optional
+            Timestamps of the rows of the block
+        offset: int
+            Index of the first row of the block in the series
+        """
+        values = np.asarray(values, dtype='float64')
+        if values.ndim == 1:
+            values = values[:, np.newaxis]
+        if self.columns is None:
+            self._initialise(values.shape[1])
+        if timestamps is not None and len(timestamps):
+            self.start = timestamps[0] if self.start is None else self.start
+            self.end = timestamps[-1]
+        if not len(values):
+            return
+
+        missing = np.isnan(values)
+        count = len(values) - missing.sum(axis=0)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            block_sum = np.where(missing, 0, values).sum(axis=0)
+            block_mean = np.where(count > 0, block_sum / count, 0)
+            block_m2 = np.where(missing, 0, np.square(values - block_mean)).sum(axis=0)
+        self._merge_moments(count, block_sum, block_mean, block_m2)
+
+        columns = np.arange(self.columns)
+        row_of_minimum = np.where(missing, np.inf, values).argmin(axis=0)
+        row_of_maximum = np.where(missing, -np.inf, values).argmax(axis=0)
+        self._merge_extremes(
+            values[row_of_minimum, columns],
+            offset + row_of_minimum,
+            timestamps[row_of_minimum] if timestamps is not None else None,
+            values[row_of_maximum, columns],
+            offset + row_of_maximum,
+            timestamps[row_of_maximum] if timestamps is not None else None,
+        )
+        self.sketch.update(values)
+
+    def _merge_moments(self, count, block_sum, block_mean, block_m2) -> None:
+        total = self.count + count
+        with np.errstate(invalid='ignore', divide='ignore'):
+            delta = block_mean - self.mean
+            self.mean = np.where(total > 0, self.mean + delta * count / total, 0)
+            self.m2 = np.where(total > 0, self.m2 + block_m2 + delta**2 * self.count * count / total, 0)
+        self.count = total
+        self.sum = self.sum + block_sum
+
+    def _merge_extremes(
+        self,
+        minimum, index_of_minimum, time_of_minimum,
+        maximum, index_of_maximum, time_of_maximum,
+    ) -> None:
+        # Strict comparisons keep the first occurrence, NaN never replaces
+        smaller = ~(minimum >= self.minimum) & ~np.isnan(minimum)
+        self.minimum = np.where(smaller, minimum, self.minimum)
+        self.index_of_minimum = np.where(smaller, index_of_minimum, self.index_of_minimum)
+        if time_of_minimum is not None:
+            if self.time_of_minimum is None:
+                self.time_of_minimum = self._empty_times(time_of_minimum)
+            self.time_of_minimum[smaller] = time_of_minimum[smaller]
+        larger = ~(maximum <= self.maximum) & ~np.isnan(maximum)
+        self.maximum = np.where(larger, maximum, self.maximum)
+        self.index_of_maximum = np.where(larger, index_of_maximum, self.index_of_maximum)
+        if time_of_maximum is not None:
+            if self.time_of_maximum is None:
+                self.time_of_maximum = self._empty_times(time_of_maximum)
+            self.time_of_maximum[larger] = time_of_maximum[larger]
+
+    def _empty_times(self, timestamps: np.ndarray) -> np.ndarray:
+        if timestamps.dtype.kind == 'M':
+            return np.full(self.columns, np.datetime64('NaT'), dtype=timestamps.dtype)
+        return np.full(self.columns, None, dtype=object)  # ex. cftime dates
+
+    def merge(self, other: 'SeriesStatistics') -> None:
+        """Merge the statistics of a later block of the same series"""
+        if other.columns is None:
+            return
+        if self.columns is None:
+            self._initialise(other.columns)
+        self.start = other.start if self.start is None else self.start
+        self.end = other.end if other.end is not None else self.end
+        self._merge_moments(other.count, other.sum, other.mean, other.m2)
+        self._merge_extremes(
+            other.minimum, other.index_of_minimum, other.time_of_minimum,
+            other.maximum, other.index_of_maximum, other.time_of_maximum,
+        )
+        self.sketch.merge(other.sketch)
+
+    @property
+    def variance(self) -> np.ndarray:
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return np.where(self.count > 0, self.m2 / self.count, np.nan)
+
+    def statistics(self) -> dict:
+        """Return the statistics, one array item per column"""
+        empty = self.count == 0
+        return {
+            'Start': self.start,
+            'End': self.end,
+            'Count': self.count,
+            'Min': self.minimum,
+            '25th Percentile': self.sketch.quantile(0.25),
+            'Mean': np.where(empty, np.nan, self.mean),
+            'Median': self.sketch.quantile(0.5),
+            '75th Percentile': self.sketch.quantile(0.75),
+            'Max': self.maximum,
+            'Sum': self.sum,
+            'Variance': self.variance,
+            'Standard deviation': np.sqrt(self.variance),
+            'Time of Min': self.time_of_minimum if self.time_of_minimum is not None else np.full(self.columns, None),
+            'Index of Min': np.where(empty, None, self.index_of_minimum),
+            'Time of Max': self.time_of_maximum if self.time_of_maximum is not None else np.full(self.columns, None),
+            'Index of Max': np.where(empty, None, self.index_of_maximum),
+        }
+
+
+def iterate_blocks(data_array: xr.DataArray, block_size: int = STATISTICS_BLOCK_SIZE_DEFAULT):
+    """Yield (values, timestamps, offset) of consecutive blocks along the
+    first dimension. Dask-backed arrays are split along their chunks, other
+    arrays in blocks of about `block_size` elements, hence lazily indexed
+    arrays are read one block at a time."""
+    dimension = data_array.dims[0]
+    timestamps = data_array[dimension].values if dimension in data_array.coords else None
+    values_per_time = data_array.size // data_array.shape[0] if data_array.shape[0] else 0
+    if data_array.chunks:
+        bounds = np.cumsum((0,) + data_array.chunks[0])
+    else:
+        step = max(1, block_size // max(1, values_per_time))
+        bounds = list(range(0, data_array.shape[0], step)) + [data_array.shape[0]]
+    for start, stop in zip(bounds[:-1], bounds[1:]):
+        block = data_array.isel({dimension: slice(start, stop)}).values
+        yield (
+            block,
+            timestamps[start:stop] if timestamps is not None else None,
+            int(start),
+        )
+
+
+def calculate_series_statistics(
+    data_array,
+    timestamps=None,
+    block_size: int = STATISTICS_BLOCK_SIZE_DEFAULT,
+) -> dict:
+    """Calculate the statistics of a series in a single pass over its blocks.
+
+    Values of all dimensions beyond the first are pooled, the index of the
+    minimum and maximum is then the index in the flattened array.
+    """
+    if not isinstance(data_array, xr.DataArray):
+        data_array = xr.DataArray(data_array, coords=[('time', timestamps)])
+    if data_array.ndim == 0:  # single selected timestamp
+        data_array = data_array.expand_dims('time')
+    values_per_time = data_array.size // data_array.shape[0] if data_array.shape[0] else 1
+    statistics = SeriesStatistics()
+    for values, block_timestamps, offset in iterate_blocks(data_array, block_size):
+        if block_timestamps is not None and values_per_time > 1:
+            block_timestamps = np.repeat(block_timestamps, values_per_time)
+        statistics.update(values.ravel(), block_timestamps, offset * values_per_time)
+    return {
+        key: value[0] if isinstance(value, np.ndarray) else value
+        for key, value in statistics.statistics().items()
     }
-    return statistics
+
+
+def calculate_site_statistics(
+    data_array: xr.DataArray,
+    time_dimension: str = 'time',
+    block_size: int = STATISTICS_BLOCK_SIZE_DEFAULT,
+) -> pd.DataFrame:
+    """Calculate the statistics of many series at once, ex. one per site.
+
+    The array is reshaped to (time, sites), all other dimensions stacked to
+    sites, and reduced in a single pass of vectorized reductions per block.
+    The chunks of a Dask-backed array are reduced in parallel to partial
+    statistics which are then merged.
+
+    Returns
+    -------
+    pd.DataFrame
+        One row per site, indexed by the site coordinates, one column per
+        statistic
+    """
+    site_dimensions = [dimension for dimension in data_array.dims if dimension != time_dimension]
+    data_array = data_array.transpose(time_dimension, *site_dimensions)
+    if len(site_dimensions) != 1:
+        data_array = data_array.stack(site=site_dimensions)
+    site_dimension = data_array.dims[1]
+    timestamps = data_array[time_dimension].values
+
+    if data_array.chunks:
+        import dask
+
+        data = data_array.data.rechunk({1: -1})
+        bounds = np.cumsum((0,) + data.chunks[0])
+
+        def reduce_block(values, start, stop):
+            partial = SeriesStatistics()
+            partial.update(values, timestamps[start:stop], start)
+            return partial
+
+        partials = dask.compute(*[
+            dask.delayed(reduce_block)(block, start, stop)
+            for block, start, stop in zip(data.to_delayed().ravel(), bounds[:-1], bounds[1:])
+        ])
+        statistics = SeriesStatistics()
+        for partial in partials:
+            statistics.merge(partial)
+    else:
+        statistics = SeriesStatistics()
+        for values, block_timestamps, offset in iterate_blocks(data_array, block_size):
+            statistics.update(values, block_timestamps, offset)
+
+    columns = statistics.statistics()
+    columns.pop('Start'), columns.pop('End')
+    data_frame = pd.DataFrame(columns, index=data_array.get_index(site_dimension))
+    data_frame.insert(0, 'Start', timestamps[0] if len(timestamps) else None)
+    data_frame.insert(1, 'End', timestamps[-1] if len(timestamps) else None)
+    return data_frame
+
+
+def write_site_statistics(data_frame: pd.DataFrame, path: Path) -> None:
+    """Write site statistics to CSV, or Parquet for a .parquet suffix"""
+    data_frame = data_frame.reset_index()
+    if Path(path).suffix in ('.parquet', '.parq'):
+        for column in ('Time of Min', 'Time of Max', 'Index of Min', 'Index of Max'):
+            data_frame[column] = pd.Series(list(data_frame[column])).infer_objects()
+        data_frame.to_parquet(path, index=False)
+    else:
+        data_frame.to_csv(path, index=False)
 
 
 def print_series_statistics(
     data_array,
-    timestamps,
+    timestamps=None,
     title='Time series',
     rounding_places: int = None,
 ):
@@ -74,7 +395,7 @@ def print_series_statistics(
         'Time of Min',
         'Index of Min',
         'Time of Max',
-        'Index of Max', 
+        'Index of Max',
         ]
 
     # Add statistics
@@ -1,11 +1,34 @@
+from pathlib import Path
 from pydantic import BaseModel
 from pydantic import conlist
 from pydantic import field_validator
 import typer
 from rekx.typer_parameters import OrderCommands
+from typing import Dict
 from typing import List
+from typing import Optional
+from typing import Sequence
+from typing import Tuple
 import numpy as np
+import pandas as pd
 import math
+from rich.box import SIMPLE_HEAD
+from rich.console import Console
+from rich.table import Table
+from humanize import naturalsize
+from rich import print
+import xarray as xr
+from .chunks import get_chunk_sizes
+from .utilities import open_variable
+from .chunks import get_spatial_dimensions
+from .compression import get_codec_specification
+from .compression import predict_compressed_sizes
+from .compression import print_compression_predictions
+from .constants import COMPRESSION_CODECS_DEFAULT
+from .constants import COMPRESSION_SAMPLES_DEFAULT
+from .constants import SUGGEST_FRONT_SIZE_DEFAULT
+from .constants import SUGGEST_READ_THROUGHPUT_DEFAULT
+from .constants import SUGGEST_REQUEST_LATENCY_DEFAULT
 from .rich_help_panel_names import rich_help_panel_rechunking
 from typing import Annotated
 from .typer_parameters import typer_argument_variable_shape
@@ -355,6 +378,423 @@ def determine_chunking_shape_alternative_symmetrical(
     return chunk_shape
 
 
+def candidate_chunk_lengths(
+    size: int,
+    divisors: Optional[Sequence[int]] = None,
+    force_power_of_two: bool = False,
+) -> np.ndarray:
+    """Candidate chunk lengths along a dimension of `size`.
+
+    For every possible number of chunks along the dimension, the shortest
+    length that yields it, hence all lengths that do not pad the last chunk
+    more than needed, including the divisors of `size`. Powers of two are
+    added as well. Restricted to the acceptable `divisors` or to powers of two
+    if requested. A single chunk spanning the dimension is always a
+    candidate.
+    """
+    number_of_chunks = np.arange(1, size + 1)
+    candidates = np.unique(-(-size // number_of_chunks))
+    powers_of_two = 2 ** np.arange(int(np.log2(size)) + 1)
+    if force_power_of_two:
+        candidates = powers_of_two
+    else:
+        candidates = np.union1d(candidates, powers_of_two)
+    if divisors:
+        candidates = np.intersect1d(candidates, np.asarray(divisors))
+    return np.union1d(candidates, [size])
+
+
+def default_workloads(
+    variable_shape: Sequence[int],
+    series: float = 1.0,
+    maps: float = 1.0,
+    scans: float = 0.0,
+) -> Dict[str, Tuple[float, Tuple[int, ...]]]:
+    """Weighted query extents of a mix of typical reads of a (time, ...)
+    variable : full time series at a single location, single time step maps
+    and scans of the whole variable"""
+    variable_shape = tuple(variable_shape)
+    workloads = {
+        'series': (series, (variable_shape[0],) + (1,) * (len(variable_shape) - 1)),
+        'maps': (maps, (1,) + variable_shape[1:]),
+        'scans': (scans, variable_shape),
+    }
+    return {name: workload for name, workload in workloads.items() if workload[0] > 0}
+
+
+def expected_chunks_along(
+    size: int,
+    extent: int,
+    chunk_lengths: np.ndarray,
+) -> np.ndarray:
+    """Expected number of chunks a query of `extent` elements at a uniformly
+    random offset overlaps along a dimension of `size`"""
+    number_of_chunks = np.ceil(size / chunk_lengths)
+    if extent >= size:
+        return number_of_chunks
+    return np.minimum(number_of_chunks, 1 + (extent - 1) / chunk_lengths)
+
+
+def search_chunking_shapes(
+    variable_shape: Sequence[int],
+    workloads: Optional[Dict[str, Tuple[float, Sequence[int]]]] = None,
+    float_size: int = 4,
+    min_chunk_size: Optional[int] = None,
+    max_chunk_size: Optional[int] = None,
+    spatial_divisors: Optional[Sequence[int]] = None,
+    force_power_of_two: bool = False,
+    request_latency: float = SUGGEST_REQUEST_LATENCY_DEFAULT,
+    read_throughput: float = SUGGEST_READ_THROUGHPUT_DEFAULT,
+    index_ranges: Optional[np.ndarray] = None,
+    chunk_lengths: Optional[Sequence[Sequence[int]]] = None,
+) -> pd.DataFrame:
+    """Score all candidate chunking shapes against a workload.
+
+    Candidate lengths per dimension, see `candidate_chunk_lengths`, are
+    combined via broadcasting over an open grid. For each shape and query of
+    the workload, the cost model counts the chunks touched and the
+    (uncompressed) bytes they hold. Costs are averaged over the queries,
+    weighted, and converted to an estimated read time. Alternatively, the
+    queries of a log are replayed, see `replay_queries`, and costs summed.
+
+    Parameters
+    ----------
+    variable_shape: list of int
+        The shape of the variable, time first
+    workloads: dict
+        Weight and query extent per kind of query, ex.
+        {'series': (1, (8784, 1, 1)), 'maps': (1, (1, 2600, 2600))}
+    float_size: int
+        Size of a value in bytes
+    min_chunk_size, max_chunk_size: int, optional
+        Bounds of the chunk size in bytes
+    spatial_divisors: list of int, optional
+        Acceptable chunk lengths for the non-time dimensions
+    force_power_of_two: bool
+        Whether chunk lengths are powers of two
+    request_latency: float
+        Seconds per chunk read
+    read_throughput: float
+        Bytes per second
+    index_ranges: np.ndarray, optional
+        Inclusive integer index ranges of logged queries, of shape
+        (queries, dimensions, 2), replayed instead of the `workloads`
+    chunk_lengths: list of list of int, optional
+        Candidate lengths per dimension overriding the default ones, ex.
+        [[24], [10], [10]] to score a single, existing layout
+
+    Returns
+    -------
+    pd.DataFrame
+        One row per candidate within the size bounds : the chunk lengths per
+        dimension, `Chunk size` and `Chunks` of the layout, the expected
+        `Chunks read` and `Bytes read` per query, or their totals over the
+        replayed queries, and the `Estimated time`
+    """
+    variable_shape = tuple(int(size) for size in variable_shape)
+    number_of_dimensions = len(variable_shape)
+    axes = []
+    for axis, size in enumerate(variable_shape):
+        if chunk_lengths is not None:
+            lengths = np.asarray(chunk_lengths[axis])
+        else:
+            lengths = candidate_chunk_lengths(
+                size,
+                divisors=spatial_divisors if axis > 0 else None,
+                force_power_of_two=force_power_of_two,
+            )
+        shape = [1] * number_of_dimensions
+        shape[axis] = -1
+        axes.append(lengths.reshape(shape).astype(np.float64))
+
+    chunk_volume = np.prod(np.broadcast_arrays(*axes), axis=0)
+    chunk_size = chunk_volume * float_size
+    number_of_chunks = np.prod(
+        np.broadcast_arrays(*(np.ceil(size / lengths) for size, lengths in zip(variable_shape, axes))),
+        axis=0,
+    )
+    if index_ranges is not None:
+        chunks_read = replay_queries(index_ranges, [lengths.ravel() for lengths in axes])
+    else:
+        total_weight = sum(weight for weight, _ in workloads.values())
+        chunks_read = np.zeros_like(chunk_volume)
+        for weight, extent in workloads.values():
+            chunks = np.ones_like(chunk_volume)
+            for size, query_extent, lengths in zip(variable_shape, extent, axes):
+                chunks = chunks * expected_chunks_along(size, query_extent, lengths)
+            chunks_read += weight / total_weight * chunks
+    bytes_read = chunks_read * chunk_size
+
+    valid = np.ones(chunk_volume.shape, dtype=bool)
+    if min_chunk_size:
+        valid &= chunk_size >= min(min_chunk_size, np.prod(variable_shape) * float_size)
+    if max_chunk_size:
+        valid &= chunk_size <= max_chunk_size
+    positions = np.nonzero(valid)
+    candidates = pd.DataFrame({
+        f'dim_{axis}': lengths.ravel()[position].astype(np.int64)
+        for axis, (lengths, position) in enumerate(zip(axes, positions))
+    })
+    candidates['Chunk size'] = chunk_size[valid].astype(np.int64)
+    candidates['Chunks'] = number_of_chunks[valid].astype(np.int64)
+    candidates['Chunks read'] = chunks_read[valid]
+    candidates['Bytes read'] = bytes_read[valid]
+    candidates['Estimated time'] = candidates['Chunks read'] * request_latency + candidates['Bytes read'] / read_throughput
+    return candidates
+
+
+def chunks_touched(index_ranges: np.ndarray, chunk_lengths: np.ndarray) -> np.ndarray:
+    """Number of chunks of each length overlapping inclusive index ranges,
+    of shape (ranges, lengths)"""
+    first = index_ranges[:, :1] // chunk_lengths
+    last = index_ranges[:, 1:] // chunk_lengths
+    return last - first + 1
+
+
+def replay_queries(
+    index_ranges: np.ndarray,
+    chunk_lengths: Sequence[np.ndarray],
+    block_size: int = 2**22,
+) -> np.ndarray:
+    """Total number of chunks the queries read under each chunking shape.
+
+    Parameters
+    ----------
+    index_ranges: np.ndarray
+        Inclusive integer index ranges of shape (queries, dimensions, 2)
+    chunk_lengths: list of np.ndarray
+        Candidate chunk lengths per dimension
+    block_size: int
+        Number of elements of the intermediate products computed at once
+
+    Returns
+    -------
+    np.ndarray
+        Chunks read summed over the queries, for all combinations of the
+        candidate lengths, of shape (len(lengths) for lengths in chunk_lengths)
+
+    Notes
+    -----
+    A query reads the product of the chunks it overlaps along each
+    dimension. Single index selections, ex. a location, overlap a single
+    chunk whatever their position, hence are collapsed before identical
+    queries are counted once and weighted. The sum over queries of the
+    products is computed as a matrix product of the first dimension with the
+    row-wise outer products of the others.
+    """
+    index_ranges = np.array(index_ranges, dtype=np.int64)
+    points = index_ranges[..., 0] == index_ranges[..., 1]
+    index_ranges[points] = 0
+    index_ranges, counts = np.unique(index_ranges, axis=0, return_counts=True)
+    chunk_lengths = [np.asarray(lengths, dtype=np.int64) for lengths in chunk_lengths]
+    touched = [
+        chunks_touched(index_ranges[:, axis], lengths).astype(np.float64)
+        for axis, lengths in enumerate(chunk_lengths)
+    ]
+    first = touched[0] * counts[:, None]
+    other_shape = [len(lengths) for lengths in chunk_lengths[1:]]
+    other_size = int(np.prod(other_shape))
+    total = np.zeros((len(chunk_lengths[0]), other_size))
+    rows = max(1, block_size // max(other_size, 1))
+    for start in range(0, len(index_ranges), rows):
+        block = slice(start, start + rows)
+        outer = np.ones((len(first[block]), 1))
+        for other in touched[1:]:
+            outer = (outer[:, :, None] * other[block][:, None, :]).reshape(len(outer), -1)
+        total += first[block].T @ outer
+    return total.reshape([len(chunk_lengths[0])] + other_shape)
+
+
+def read_query_log(query_log: Path, variable: Optional[str] = None) -> pd.DataFrame:
+    """Read a query log from a CSV or Parquet file.
+
+    One row per query with the optional columns `variable`, `longitude` (or
+    `lon`), `latitude` (or `lat`), `start_time` and `end_time`. Missing
+    values select the full extent of the dimension, ex. a query without a
+    location reads maps. Rows of other variables than `variable` are dropped.
+    """
+    if Path(query_log).suffix.lower() in {'.parquet', '.parq'}:
+        queries = pd.read_parquet(query_log)
+    else:
+        queries = pd.read_csv(query_log)
+    if variable and 'variable' in queries:
+        queries = queries[queries['variable'] == variable]
+    return queries.reset_index(drop=True)
+
+
+def query_index_ranges(queries: pd.DataFrame, data_array: xr.DataArray) -> np.ndarray:
+    """Resolve logged queries to inclusive integer index ranges of shape
+    (queries, dimensions, 2) along the dimensions of `data_array`. Queries
+    selecting no timestamp are dropped."""
+    queries = queries.rename(columns={'lon': 'longitude', 'lat': 'latitude'})
+    number_of_queries = len(queries)
+    index_ranges = np.zeros((number_of_queries, data_array.ndim, 2), dtype=np.int64)
+    index_ranges[:, :, 1] = np.array(data_array.shape) - 1
+    x, y = get_spatial_dimensions(data_array.dims)
+    for axis, dimension in enumerate(data_array.dims):
+        index = data_array.indexes.get(dimension)
+        if dimension == 'time':
+            times = index.values
+            for column, side, bound in (('start_time', 'left', 0), ('end_time', 'right', 1)):
+                if column not in queries:
+                    continue
+                labels = pd.to_datetime(queries[column], format='ISO8601').to_numpy(dtype='datetime64[ns]')
+                positions = np.searchsorted(times, labels, side=side) - bound
+                given = ~np.isnat(labels)
+                index_ranges[given, axis, bound] = positions[given]
+        elif dimension in (x, y):
+            column = 'longitude' if dimension == x else 'latitude'
+            if column not in queries:
+                continue
+            values = queries[column].to_numpy(dtype=np.float64)
+            given = ~np.isnan(values)
+            positions = index.get_indexer(values[given], method='nearest')
+            index_ranges[given, axis] = positions[:, None]
+    empty = (index_ranges[..., 1] < index_ranges[..., 0]).any(axis=1)
+    return index_ranges[~empty]
+
+
+def pareto_front(
+    candidates: pd.DataFrame,
+    objectives: Tuple[str, str] = ('Chunks read', 'Bytes read'),
+) -> pd.DataFrame:
+    """Return the candidates not dominated in both `objectives`, ranked by
+    their `Estimated time`"""
+    first, second = (candidates[objective].to_numpy() for objective in objectives)
+    order = np.lexsort((second, first))
+    best_so_far = np.minimum.accumulate(second[order])
+    previous_best = np.concatenate(([np.inf], best_so_far[:-1]))
+    front = candidates.iloc[order[second[order] < previous_best]]
+    return front.sort_values('Estimated time', kind='stable').reset_index(drop=True)
+
+
+def print_pareto_front(front: pd.DataFrame, rows: int = SUGGEST_FRONT_SIZE_DEFAULT) -> None:
+    """Print the top `rows` of a Pareto front of chunking shapes"""
+    dimensions = [column for column in front.columns if column.startswith('dim_')]
+    table = Table(show_header=True, header_style="bold magenta", box=SIMPLE_HEAD)
+    table.add_column("Rank", style="dim", no_wrap=True)
+    table.add_column("Shape", no_wrap=True)
+    table.add_column("Chunk size", no_wrap=True)
+    table.add_column("Chunks", no_wrap=True)
+    table.add_column("Chunks read", no_wrap=True)
+    table.add_column("Bytes read", no_wrap=True)
+    table.add_column("Estimated time", no_wrap=True)
+    for rank, (_, row) in enumerate(front.head(rows).iterrows(), start=1):
+        table.add_row(
+            str(rank),
+            ' x '.join(str(int(row[dimension])) for dimension in dimensions),
+            naturalsize(row['Chunk size'], binary=True),
+            str(int(row['Chunks'])),
+            f"{row['Chunks read']:.1f}",
+            naturalsize(row['Bytes read'], binary=True),
+            f"{row['Estimated time']:.3f} s",
+        )
+    console = Console()
+    console.print(table)
+
+
+def suggest_chunking_shape_for_query_log(
+    query_log: Path,
+    time_series: Path,
+    variable: str,
+    min_chunk_size: Optional[int] = None,
+    max_chunk_size: Optional[int] = 16 * 1024**2,
+    request_latency: float = SUGGEST_REQUEST_LATENCY_DEFAULT,
+    read_throughput: float = SUGGEST_READ_THROUGHPUT_DEFAULT,
+    rows: int = SUGGEST_FRONT_SIZE_DEFAULT,
+) -> pd.DataFrame:
+    """Replay a query log against candidate chunking shapes and the current
+    layout of `variable`, print the Pareto front and the expected speed-up of
+    the recommended shape. Returns the front."""
+    data_array = open_variable(time_series, variable)
+    index_ranges = query_index_ranges(read_query_log(query_log, variable), data_array)
+    if not len(index_ranges):
+        raise typer.BadParameter(f'No query of `{query_log}` selects data of `{variable}`')
+    replay = dict(
+        variable_shape=data_array.shape,
+        float_size=data_array.dtype.itemsize,
+        request_latency=request_latency,
+        read_throughput=read_throughput,
+        index_ranges=index_ranges,
+    )
+    front = pareto_front(
+        search_chunking_shapes(
+            min_chunk_size=min_chunk_size,
+            max_chunk_size=max_chunk_size,
+            **replay,
+        )
+    )
+    current_chunk_sizes = get_chunk_sizes(data_array)
+    current_layout = [current_chunk_sizes[dimension] for dimension in data_array.dims]
+    current = search_chunking_shapes(
+        chunk_lengths=[[length] for length in current_layout],
+        **replay,
+    ).iloc[0]
+
+    print(f'Replayed {len(index_ranges)} queries of [code]{variable}[/code] {data_array.dims}')
+    print_pareto_front(front, rows=rows)
+    best = front.iloc[0]
+    best_shape = ' x '.join(str(int(best[f'dim_{axis}'])) for axis in range(data_array.ndim))
+    print(
+        f"Current layout {' x '.join(map(str, current_layout))} reads"
+        f" {current['Chunks read']:.0f} chunks, {naturalsize(current['Bytes read'], binary=True)}"
+    )
+    print(
+        f"Recommended layout {best_shape} reads {best['Chunks read']:.0f} chunks,"
+        f" {naturalsize(best['Bytes read'], binary=True)},"
+        f" an expected speed-up of {current['Estimated time'] / best['Estimated time']:.2f}x"
+    )
+    return front
+
+
+def suggest_chunking_shape_for_compression(
+    time_series: Path,
+    variable: str,
+    front: Optional[pd.DataFrame] = None,
+    min_chunk_size: Optional[int] = None,
+    max_chunk_size: Optional[int] = 16 * 1024**2,
+    rows: int = SUGGEST_FRONT_SIZE_DEFAULT,
+    samples: int = COMPRESSION_SAMPLES_DEFAULT,
+    codecs: Sequence[str] = tuple(COMPRESSION_CODECS_DEFAULT.split(',')),
+    workers: Optional[int] = None,
+) -> pd.DataFrame:
+    """Predict and print the on-disk size and decode time of the current
+    layout and codec of `variable` and of the top `rows` shapes of a Pareto
+    front, by default the one of a mix of series and map queries"""
+    data_array = open_variable(time_series, variable)
+    if front is None:
+        front = pareto_front(
+            search_chunking_shapes(
+                variable_shape=data_array.shape,
+                workloads=default_workloads(data_array.shape),
+                float_size=data_array.dtype.itemsize,
+                min_chunk_size=min_chunk_size,
+                max_chunk_size=max_chunk_size,
+            )
+        )
+    current_chunk_sizes = get_chunk_sizes(data_array)
+    current_layout = tuple(current_chunk_sizes[dimension] for dimension in data_array.dims)
+    current_codec = get_codec_specification(data_array.encoding)
+    chunk_shapes = [current_layout] + [
+        tuple(int(row[f'dim_{axis}']) for axis in range(data_array.ndim))
+        for _, row in front.head(rows).iterrows()
+    ]
+    chunk_shapes = list(dict.fromkeys(chunk_shapes))  # unique, in order
+    codecs = list(dict.fromkeys([current_codec, *codecs]))
+    predictions = predict_compressed_sizes(
+        data_array,
+        chunk_shapes=chunk_shapes,
+        codecs=codecs,
+        samples=samples,
+        workers=workers,
+    )
+    print_compression_predictions(
+        predictions,
+        title=f"Sampled {samples} chunks per shape of {variable}, currently {' x '.join(map(str, current_layout))} with {current_codec}",
+    )
+    return predictions
+
+
 # @app.command(
 #     'suggest',
 #     no_args_is_help=True,
@@ -362,11 +802,50 @@ def determine_chunking_shape_alternative_symmetrical(
 #     rich_help_panel=rich_help_panel_rechunking,
 # )
 def suggest_chunking_shape(
-    variable_shape: Annotated[VariableShapeModel, typer_argument_variable_shape],
+    variable_shape: Annotated[Optional[VariableShapeModel], typer_argument_variable_shape] = None,
     float_size: int = 4,
-    chunk_size: int = 4096
+    chunk_size: int = 4096,
+    query_log: Annotated[Optional[Path], typer.Option(help='CSV or Parquet log of queries to replay, see `read_query_log`')] = None,
+    time_series: Annotated[Optional[Path], typer.Option(help='NetCDF file or Kerchunk reference set the logged queries read')] = None,
+    variable: Annotated[Optional[str], typer.Option(help='Variable the logged queries read')] = None,
+    min_chunk_size: Annotated[Optional[int], typer.Option(help='Minimum chunk size in bytes of replayed layouts')] = None,
+    max_chunk_size: Annotated[Optional[int], typer.Option(help='Maximum chunk size in bytes of replayed layouts')] = 16 * 1024**2,
+    rows: Annotated[int, typer.Option(help='Number of chunking shapes to report')] = SUGGEST_FRONT_SIZE_DEFAULT,
+    sample_chunks: Annotated[int, typer.Option(help='Predict compressed sizes by recompressing this many sampled chunks per shape, 0 to disable')] = 0,
+    codecs: Annotated[str, typer.Option(help='Comma-separated candidate codecs, ex. [code]zlib:4+shuffle,zstd:3[/code]')] = COMPRESSION_CODECS_DEFAULT,
+    workers: Annotated[Optional[int], typer.Option(help='Number of threads sampling and recompressing chunks')] = None,
 ) -> None:
-    """ """
+    """Suggest a chunking shape for a variable shape or, given a query log,
+    the shape minimising the I/O of the logged queries. Optionally predict
+    the compressed size of candidate shapes from sampled chunks."""
+    if (query_log or sample_chunks) and (not time_series or not variable):
+        raise typer.BadParameter('Replaying a `--query-log` or sampling chunks requires the `--time-series` and the `--variable` to read')
+    front = None
+    if query_log:
+        front = suggest_chunking_shape_for_query_log(
+            query_log=query_log,
+            time_series=time_series,
+            variable=variable,
+            min_chunk_size=min_chunk_size,
+            max_chunk_size=max_chunk_size,
+            rows=rows,
+        )
+    if sample_chunks:
+        suggest_chunking_shape_for_compression(
+            time_series=time_series,
+            variable=variable,
+            front=front,
+            min_chunk_size=min_chunk_size,
+            max_chunk_size=max_chunk_size,
+            rows=rows,
+            samples=sample_chunks,
+            codecs=[codec for codec in codecs.split(',') if codec.strip()],
+            workers=workers,
+        )
+    if query_log or sample_chunks:
+        return
+    if variable_shape is None:
+        raise typer.BadParameter('Either a variable shape or a `--query-log` is required')
     good_chunking_shape = determine_chunking_shape(
         variable_shape=variable_shape,
         float_size=float_size,
@@ -429,3 +908,40 @@ def suggest_chunking_shape_alternative_symmetrical(
         spatial_divisors=spatial_divisors,
     )
     print(good_chunking_shape)
+
+
+def suggest_chunking_shapes_for_workload(
+    variable_shape: Annotated[VariableShapeModel, typer_argument_variable_shape],
+    float_size: int = 4,
+    min_chunk_size: Annotated[Optional[int], typer.Option(help='Minimum chunk size in bytes')] = None,
+    max_chunk_size: Annotated[Optional[int], typer.Option(help='Maximum chunk size in bytes')] = 16 * 1024**2,
+    series: Annotated[float, typer.Option(help='Weight of reading full time series at single locations')] = 1.0,
+    maps: Annotated[float, typer.Option(help='Weight of reading maps at single time steps')] = 1.0,
+    scans: Annotated[float, typer.Option(help='Weight of reading the whole variable')] = 0.0,
+    force_power_of_two: bool = False,
+    spatial_divisors: Annotated[Optional[List[int]], typer.Option(help='Acceptable chunk lengths of the spatial dimensions')] = None,
+    request_latency: Annotated[float, typer.Option(help='Seconds per chunk read')] = SUGGEST_REQUEST_LATENCY_DEFAULT,
+    read_throughput: Annotated[float, typer.Option(help='Bytes read per second')] = SUGGEST_READ_THROUGHPUT_DEFAULT,
+    rows: Annotated[int, typer.Option(help='Number of chunking shapes to report')] = SUGGEST_FRONT_SIZE_DEFAULT,
+) -> None:
+    """Rank the Pareto front of chunking shapes minimising the chunks and
+    bytes read by a mix of series, map and scan queries"""
+    workloads = default_workloads(variable_shape, series=series, maps=maps, scans=scans)
+    if not workloads:
+        raise typer.BadParameter('At least one of `--series`, `--maps` or `--scans` requires a positive weight')
+    candidates = search_chunking_shapes(
+        variable_shape=variable_shape,
+        workloads=workloads,
+        float_size=float_size,
+        min_chunk_size=min_chunk_size,
+        max_chunk_size=max_chunk_size,
+        spatial_divisors=spatial_divisors,
+        force_power_of_two=force_power_of_two,
+        request_latency=request_latency,
+        read_throughput=read_throughput,
+    )
+    if candidates.empty:
+        print('No chunking shape satisfies the chunk size bounds')
+        raise typer.Exit(code=1)
+    print(f'Scored {len(candidates)} chunking shapes')
+    print_pareto_front(pareto_front(candidates), rows=rows)
@@ -7,6 +7,7 @@ from rekx.rich_help_panel_names import rich_help_panel_advanced_options
 from rekx.rich_help_panel_names import rich_help_panel_output
 from rekx.rich_help_panel_names import rich_help_panel_time_series
 from rekx.rich_help_panel_names import rich_help_panel_select
+from rekx.rich_help_panel_names import rich_help_panel_caching
 from rekx.constants import LATITUDE_MINIMUM
 from rekx.constants import LATITUDE_MAXIMUM
 from rekx.constants import LONGITUDE_MINIMUM
@@ -56,6 +57,16 @@ typer_argument_latitude_in_degrees = typer.Argument(
     min=LATITUDE_MINIMUM,
     max=LATITUDE_MAXIMUM,
 )
+typer_option_locations = typer.Option(
+    '--location',
+    help="Location as [code]'longitude,latitude'[/code], ex. [yellow]'8.6,45.8'[/yellow]. Repeat for multiple locations",
+)
+typer_option_locations_file = typer.Option(
+    help='CSV file of locations, longitude and latitude in the first two columns',
+)
+typer_option_bounding_box = typer.Option(
+    help="Bounding box as [code]'west,south,east,north'[/code] in decimal degrees, ex. [yellow]'5,45,10,48'[/yellow]",
+)
 
 # # When?
 
@@ -94,6 +105,14 @@ typer_option_end_time = typer.Option(
     rich_help_panel=rich_help_panel_time_series,
     default_factory = None,
 )
+typer_option_resample = typer.Option(
+    help="Aggregate the series over periods of this frequency while reading, ex. [yellow]'D'[/yellow], [yellow]'MS'[/yellow] or [yellow]'3h'[/yellow]",
+    rich_help_panel=rich_help_panel_time_series,
+)
+typer_option_resample_aggregations = typer.Option(
+    help="Comma-separated aggregations of the resampled series among count, sum, mean, min, max, std, var, first, last",
+    rich_help_panel=rich_help_panel_time_series,
+)
 
 # Paths
 
@@ -135,6 +154,31 @@ typer_option_number_of_workers = typer.Option(
     help='Number of workers for parallel processing using `concurrent.futures`',
     rich_help_panel=rich_help_panel_advanced_options,
 )
+typer_option_reference_variable_set = typer.Option(
+    help='Set of Xarray variables to reference, along with the coordinates of their dimensions',
+)
+typer_option_reference_variables = typer.Option(
+    '--variable',
+    help='Variable to reference, along with the coordinates of its dimensions. Repeatable, overrides the variable set',
+)
+typer_option_reference_start_time = typer.Option(
+    help='Reference the time chunks from this timestamp on',
+)
+typer_option_reference_end_time = typer.Option(
+    help='Reference the time chunks up to this timestamp',
+)
+typer_option_inline_threshold = typer.Option(
+    help='Inline chunks smaller than this size in bytes in the references, 0 to disable',
+    rich_help_panel=rich_help_panel_advanced_options,
+)
+typer_option_inline_coordinates = typer.Option(
+    help='Inline the chunks of coordinate variables and their bounds regardless of their size',
+    rich_help_panel=rich_help_panel_advanced_options,
+)
+typer_option_executor = typer.Option(
+    help='Run tasks in worker threads, worker processes or serially',
+    rich_help_panel=rich_help_panel_advanced_options,
+)
 
 
 # # Time series
@@ -228,6 +272,74 @@ typer_option_csv = typer.Option(
     rich_help_panel=rich_help_panel_output,
     # default_factory='series_in',
 )
+typer_option_statistics_output = typer.Option(
+    help='CSV or Parquet (.parquet) output filename of the table of statistics per location',
+    rich_help_panel=rich_help_panel_output,
+)
+typer_option_arrow = typer.Option(
+    help='Parquet (.parquet), Feather (.feather) or Arrow IPC (.arrow) output filename, or base directory of a partitioned dataset',
+    rich_help_panel=rich_help_panel_output,
+)
+typer_option_arrow_format = typer.Option(
+    help='Columnar output format. [yellow]Inferred from the output filename suffix if not given[/yellow]',
+    rich_help_panel=rich_help_panel_output,
+)
+typer_option_arrow_compression = typer.Option(
+    help="Compression of the columnar output, ex. zstd, lz4, snappy (Parquet only) or none",
+    rich_help_panel=rich_help_panel_output,
+)
+typer_option_arrow_partition = typer.Option(
+    help='Append the series to a dataset partitioned by location',
+    rich_help_panel=rich_help_panel_output,
+)
+
+# Caching
+
+typer_option_chunk_cache_size = typer.Option(
+    help='Size in bytes of the in-memory cache of decompressed chunks shared across selections. [yellow]0 disables the cache[/yellow]',
+    rich_help_panel=rich_help_panel_caching,
+    # default_factory=CHUNK_CACHE_SIZE_DEFAULT,
+)
+typer_option_chunk_cache_directory = typer.Option(
+    help='Local directory to spill decompressed chunks evicted from the in-memory cache',
+    rich_help_panel=rich_help_panel_caching,
+    # default_factory=None,
+)
+
+typer_option_disk_cache_directory = typer.Option(
+    help='Local directory to cache raw chunk byte ranges of the source files, ex. on a fast local disk. [yellow]Not used if not given[/yellow]',
+    rich_help_panel=rich_help_panel_caching,
+    # default_factory=None,
+)
+typer_argument_disk_cache_directory = typer.Argument(
+    help='Local directory of cached raw chunk byte ranges',
+    # default_factory=None,
+)
+typer_option_disk_cache_size = typer.Option(
+    help='Maximum size in bytes of the local cache of raw chunk byte ranges',
+    rich_help_panel=rich_help_panel_caching,
+    # default_factory=DISK_CACHE_SIZE_DEFAULT,
+)
+typer_option_warming_target = typer.Option(
+    help='Warm the operating system page cache of the source files or the local cache of chunk byte ranges',
+    rich_help_panel=rich_help_panel_caching,
+)
+typer_option_disk_cache_maximum_age = typer.Option(
+    help='Evict cached byte ranges not accessed for more than this number of seconds',
+    rich_help_panel=rich_help_panel_caching,
+    # default_factory=None,
+)
+
+# Journal
+
+typer_option_journal = typer.Option(
+    help='SQLite journal of completed units of work. [yellow]In the output directory if not given[/yellow]',
+    rich_help_panel=rich_help_panel_advanced_options,
+)
+typer_option_resume = typer.Option(
+    help='Skip units of work recorded as complete in the journal whose sources did not change',
+    rich_help_panel=rich_help_panel_advanced_options,
+)
 
 # Helpers
 
@@ -3,15 +3,23 @@ from rich import print
 # import warnings
 # import typer
 # import netCDF4
-# from .log import logger
+from .log import logger
 # import xarray as xr
 from pathlib import Path
+from typing import List
+from typing import Optional
+from typing import Tuple
+import csv
+import typer
+import xarray as xr
 from rekx.constants import VERBOSE_LEVEL_DEFAULT
 from rekx.models import MethodForInexactMatches
 from rekx.hardcodings import exclamation_mark
 from rekx.hardcodings import check_mark
 # from rekx.hardcodings import x_mark
 from rekx.messages import ERROR_IN_SELECTING_DATA
+from rekx.cache import is_reference_set
+from rekx.cache import open_reference_mapper
 
 
 # def load_or_open_dataarray(function, filename_or_object, mask_and_scale):
@@ -229,3 +237,48 @@ def select_location_time_series(
         debug(locals())
 
     return location_time_series
+
+
+def parse_locations(
+    locations: Optional[List[str]] = None,
+    locations_file: Optional[Path] = None,
+) -> List[Tuple[float, float]]:
+    """Parse 'longitude,latitude' pairs and/or a CSV file of locations"""
+    parsed = [
+        tuple(float(value) for value in location.split(','))
+        for location in locations or []
+    ]
+    if locations_file:
+        with open(locations_file, newline='') as csv_file:
+            for row in csv.reader(csv_file):
+                try:
+                    parsed.append((float(row[0]), float(row[1])))
+                except (ValueError, IndexError):
+                    continue  # header or empty line
+    for location in parsed:
+        if len(location) != 2:
+            raise typer.BadParameter(f'Expected a longitude,latitude pair, got {location}')
+    return parsed
+
+
+def parse_bounding_box(bounding_box: str) -> Tuple[float, float, float, float]:
+    """Parse a 'west,south,east,north' bounding box"""
+    values = tuple(float(value) for value in bounding_box.split(','))
+    if len(values) != 4:
+        raise typer.BadParameter(f'Expected west,south,east,north, got {bounding_box}')
+    return values
+
+
+def open_variable(time_series: Path, variable: str) -> xr.DataArray:
+    """Open a variable of a NetCDF file or of a Kerchunk reference set"""
+    if is_reference_set(time_series):
+        dataset = xr.open_dataset(
+            open_reference_mapper(reference=time_series),
+            engine='zarr',
+            backend_kwargs={'consolidated': False},
+            chunks=None,
+            mask_and_scale=False,
+        )
+    else:
+        dataset = xr.open_dataset(time_series, mask_and_scale=False)
+    return dataset[variable]
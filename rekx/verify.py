@@ -0,0 +1,294 @@
+"""Verify the integrity of reference sets against their source files.
+
+A reference set goes stale when a referenced file is re-published : its
+chunks move, hence the byte ranges of the references point to the wrong
+bytes. Entries are verified without opening the dataset : the byte range of
+each chunk must lie within its file, and the bytes read must decompress with
+the codecs declared in the Zarr metadata of the variable to the size of a
+chunk. Entries are sampled, always including the last chunk of each file
+which a truncated or shrunk file fails first, or checked exhaustively.
+
+The sizes and modification times of the source files of a verified reference
+set are recorded in a `.sources.json` file next to it, so that later runs
+report files changed since.
+"""
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import as_completed
+from pathlib import Path
+from typing import Dict
+from typing import List
+from typing import NamedTuple
+from typing import Optional
+import math
+import fsspec
+import numcodecs
+import numpy as np
+import pandas as pd
+import typer
+import ujson
+from rich import print
+from rich.box import SIMPLE_HEAD
+from rich.console import Console
+from rich.table import Table
+from typing_extensions import Annotated
+from .binary_reference import is_metadata_key
+from .binary_reference import load_references
+from .binary_reference import split_chunk_key
+from .constants import VERBOSE_LEVEL_DEFAULT
+from .hardcodings import check_mark
+from .hardcodings import x_mark
+from .journal import atomic_output
+from .log import logger
+from .typer_parameters import typer_option_number_of_workers
+from .typer_parameters import typer_option_verbose
+
+
+VERIFY_SAMPLES_DEFAULT = 1000  # entries checked, 0 to check all
+VERIFY_BATCH_SIZE = 256  # byte ranges read per request
+
+
+class ChunkEntry(NamedTuple):
+    key: str
+    variable: str
+    path: str
+    offset: int
+    length: int
+
+
+def get_chunk_entries(references: dict) -> List[ChunkEntry]:
+    """Chunk references of a reference set given by a byte range"""
+    refs = references.get('refs', references)
+    separators = {
+        key[: -len('/.zarray')]: ujson.loads(value).get('dimension_separator') or '.'
+        for key, value in refs.items()
+        if key.endswith('/.zarray')
+    }
+    entries = []
+    for key, value in refs.items():
+        if is_metadata_key(key) or not isinstance(value, (list, tuple)) or len(value) != 3:
+            continue
+        variable, _ = split_chunk_key(key, separators)
+        entries.append(ChunkEntry(key, variable, value[0], int(value[1]), int(value[2])))
+    return entries
+
+
+def sample_entries(
+    entries: List[ChunkEntry],
+    samples: int = VERIFY_SAMPLES_DEFAULT,
+    seed: int = 0,
+) -> List[ChunkEntry]:
+    """Sample entries at random, plus the last chunk of each file, or all of
+    them if `samples` is 0"""
+    if not samples or samples >= len(entries):
+        return entries
+    random = np.random.default_rng(seed)
+    sampled = {entries[index] for index in random.choice(len(entries), samples, replace=False)}
+    last = {}
+    for entry in entries:
+        if entry.path not in last or entry.offset > last[entry.path].offset:
+            last[entry.path] = entry
+    sampled.update(last.values())
+    return sorted(sampled, key=lambda entry: (entry.path, entry.offset))
+
+
+def get_decoder(zarray: dict):
+    """Decode the bytes of a chunk with the compressor and filters declared
+    in the Zarr metadata of its variable, returning the number of bytes of
+    the decoded chunk"""
+    compressor = numcodecs.get_codec(zarray['compressor']) if zarray.get('compressor') else None
+    filters = [numcodecs.get_codec(config) for config in zarray.get('filters') or []]
+
+    def decode(data: bytes) -> int:
+        if compressor:
+            data = compressor.decode(data)
+        for codec in reversed(filters):
+            data = codec.decode(data)
+        return np.asarray(memoryview(data) if isinstance(data, bytes) else data).nbytes
+
+    return decode
+
+
+def get_expected_chunk_size(zarray: dict) -> Optional[int]:
+    """Size of a decoded chunk in bytes, None for variable-length types"""
+    dtype = zarray['dtype']
+    dtype = np.dtype([tuple(field) for field in dtype] if isinstance(dtype, list) else dtype)
+    if dtype.hasobject:
+        return None
+    return math.prod(zarray['chunks']) * dtype.itemsize
+
+
+def verify_file(
+    path: str,
+    entries: List[ChunkEntry],
+    zarrays: Dict[str, dict],
+    remote_options: Optional[dict] = None,
+) -> List[dict]:
+    """Verify the entries referencing a single file, reading their byte
+    ranges in batches, and return the corrupt ones"""
+    filesystem, _ = fsspec.core.url_to_fs(path, **(remote_options or {}))
+    try:
+        size = filesystem.size(path)
+    except FileNotFoundError:
+        return [{'Key': entry.key, 'Path': path, 'Problem': 'missing file'} for entry in entries]
+
+    decoders = {}
+    corrupt = []
+    readable = []
+    for entry in entries:
+        if entry.offset + entry.length > size:
+            corrupt.append({
+                'Key': entry.key,
+                'Path': path,
+                'Problem': f'byte range {entry.offset}-{entry.offset + entry.length} beyond the end of the file at {size}',
+            })
+        else:
+            readable.append(entry)
+
+    for start in range(0, len(readable), VERIFY_BATCH_SIZE):
+        batch = readable[start:start + VERIFY_BATCH_SIZE]
+        data = filesystem.cat_ranges(
+            [path] * len(batch),
+            [entry.offset for entry in batch],
+            [entry.offset + entry.length for entry in batch],
+        )
+        for entry, chunk in zip(batch, data):
+            zarray = zarrays.get(entry.variable)
+            if zarray is None:
+                continue
+            if entry.variable not in decoders:
+                try:
+                    decoders[entry.variable] = get_decoder(zarray)
+                except (KeyError, ValueError) as exception:
+                    logger.warning(f'Cannot decode chunks of {entry.variable} : {exception}')
+                    decoders[entry.variable] = None
+            decoder = decoders[entry.variable]
+            if decoder is None:
+                continue
+            try:
+                decoded_size = decoder(chunk)
+            except Exception as exception:
+                corrupt.append({'Key': entry.key, 'Path': path, 'Problem': f'cannot decompress : {exception}'})
+                continue
+            expected_size = get_expected_chunk_size(zarray)
+            if expected_size is not None and decoded_size != expected_size:
+                corrupt.append({
+                    'Key': entry.key,
+                    'Path': path,
+                    'Problem': f'decompressed to {decoded_size} bytes instead of {expected_size}',
+                })
+    return corrupt
+
+
+def verify_references(
+    references: dict,
+    samples: int = VERIFY_SAMPLES_DEFAULT,
+    workers: Optional[int] = None,
+    seed: int = 0,
+    remote_options: Optional[dict] = None,
+) -> pd.DataFrame:
+    """Verify sampled or all entries of a reference set against their
+    source files, a file per thread
+
+    Returns
+    -------
+    pd.DataFrame
+        One row per corrupt entry : its `Key`, the `Path` of its file and the
+        `Problem` found
+    """
+    refs = references.get('refs', references)
+    zarrays = {
+        key[: -len('/.zarray')]: ujson.loads(value)
+        for key, value in refs.items()
+        if key.endswith('/.zarray')
+    }
+    entries = sample_entries(get_chunk_entries(references), samples=samples, seed=seed)
+    entries_per_file = defaultdict(list)
+    for entry in entries:
+        entries_per_file[entry.path].append(entry)
+    corrupt = []
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [
+            executor.submit(verify_file, path, file_entries, zarrays, remote_options)
+            for path, file_entries in sorted(entries_per_file.items(), key=lambda item: -len(item[1]))
+        ]
+        for future in as_completed(futures):
+            corrupt.extend(future.result())
+    return pd.DataFrame(corrupt, columns=['Key', 'Path', 'Problem'])
+
+
+def get_source_fingerprints(paths: List[str], remote_options: Optional[dict] = None) -> Dict[str, dict]:
+    """Size and modification time, where available, of source files"""
+    fingerprints = {}
+    for path in paths:
+        filesystem, _ = fsspec.core.url_to_fs(path, **(remote_options or {}))
+        try:
+            info = filesystem.info(path)
+        except FileNotFoundError:
+            continue
+        modified = info.get('mtime') or info.get('LastModified') or info.get('last_modified')
+        fingerprints[path] = {'size': info['size'], 'modified': str(modified) if modified is not None else None}
+    return fingerprints
+
+
+def compare_source_fingerprints(recorded: Dict[str, dict], current: Dict[str, dict]) -> pd.DataFrame:
+    """Source files changed since their fingerprints were recorded"""
+    changed = []
+    for path, fingerprint in recorded.items():
+        if path not in current:
+            changed.append({'Key': '*', 'Path': path, 'Problem': 'missing file'})
+        elif current[path]['size'] != fingerprint['size']:
+            changed.append({'Key': '*', 'Path': path, 'Problem': f"size changed from {fingerprint['size']} to {current[path]['size']}"})
+        elif current[path]['modified'] != fingerprint['modified']:
+            changed.append({'Key': '*', 'Path': path, 'Problem': 'modified since the last verification'})
+    return pd.DataFrame(changed, columns=['Key', 'Path', 'Problem'])
+
+
+def print_corrupt_entries(corrupt: pd.DataFrame, title: Optional[str] = None) -> None:
+    """Print corrupt entries of a reference set"""
+    table = Table(title=title, show_header=True, header_style="bold magenta", box=SIMPLE_HEAD)
+    table.add_column("Key", no_wrap=True)
+    table.add_column("Path")
+    table.add_column("Problem")
+    for _, row in corrupt.iterrows():
+        table.add_row(row['Key'], row['Path'], row['Problem'])
+    console = Console()
+    console.print(table)
+
+
+def verify(
+    reference: Annotated[Path, typer.Argument(help='JSON, Parquet or binary reference set')],
+    samples: Annotated[int, typer.Option(help='Number of entries to check, chosen at random along with the last chunk of each file. 0 to check all')] = VERIFY_SAMPLES_DEFAULT,
+    seed: Annotated[int, typer.Option(help='Seed of the random choice of entries')] = 0,
+    workers: Annotated[Optional[int], typer_option_number_of_workers] = None,
+    update_sources: Annotated[bool, typer.Option(help='Record the fingerprints of the source files even if they changed since they were last recorded')] = False,
+    verbose: Annotated[int, typer_option_verbose] = VERBOSE_LEVEL_DEFAULT,
+):
+    """Verify the entries of a reference set against its source files
+
+    Exits with code 1 if any entry is corrupt or any source file changed
+    since the last verification.
+    """
+    references = load_references(reference)
+    paths = sorted({entry.path for entry in get_chunk_entries(references)})
+    sources = Path(reference).with_name(Path(reference).name + '.sources.json')
+    current = get_source_fingerprints(paths)
+    changed = pd.DataFrame(columns=['Key', 'Path', 'Problem'])
+    if sources.exists():
+        with open(sources) as sources_file:
+            changed = compare_source_fingerprints(ujson.load(sources_file), current)
+    corrupt = verify_references(references, samples=samples, workers=workers, seed=seed)
+    problems = pd.concat([changed, corrupt], ignore_index=True) if not changed.empty else corrupt
+    if verbose:
+        print(f"Checked {'all' if not samples else 'a sample of'} entries referencing {len(paths)} files")
+
+    if problems.empty or update_sources:
+        with atomic_output(sources) as temporary_sources:
+            with open(temporary_sources, 'w') as sources_file:
+                ujson.dump(current, sources_file)
+    if problems.empty:
+        print(f"{check_mark} No corrupt entry in [code]{reference}[/code]")
+        return
+    print_corrupt_entries(problems, title=f'Corrupt entries of {reference}')
+    print(f"{x_mark} {len(corrupt)} corrupt entries, {len(changed)} changed files")
+    raise typer.Exit(code=1)
@@ -0,0 +1,196 @@
+"""Warm the chunks a query will need ahead of time.
+
+Given a reference set, a variable, a set of locations or a bounding box and a
+time range, the chunks the selection will read are resolved from the chunk
+grid of the variable. Their byte ranges are then read ahead in parallel either
+into the operating system page cache, via `posix_fadvise(POSIX_FADV_WILLNEED)`
+on the local source files, or into the local cache of chunk byte ranges.
+"""
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import List
+from typing import Optional
+from typing import Tuple
+from typing_extensions import Annotated
+import os
+import fsspec
+import typer
+import xarray as xr
+from humanize import naturalsize
+from rich import print
+from .cache import open_reference_mapper
+from .chunks import coalesce_byte_ranges
+from .chunks import get_byte_ranges
+from .chunks import get_spatial_dimensions
+from .chunks import nearest_indices
+from .chunks import range_indices
+from .chunks import select_chunk_keys
+from .constants import DISK_CACHE_SIZE_DEFAULT
+from .disk_cache import ByteRangeCache
+from .disk_cache import fetch_byte_range
+from .constants import VERBOSE_LEVEL_DEFAULT
+from .hardcodings import check_mark
+from .hardcodings import x_mark
+from .log import logger
+from .models import WarmingTarget
+from .progress import DisplayMode
+from .progress import display_context
+from .typer_parameters import typer_option_bounding_box
+from .typer_parameters import typer_option_disk_cache_directory
+from .typer_parameters import typer_option_disk_cache_size
+from .typer_parameters import typer_option_dry_run
+from .typer_parameters import typer_option_end_time
+from .typer_parameters import typer_option_locations
+from .typer_parameters import typer_option_locations_file
+from .typer_parameters import typer_option_number_of_workers
+from .typer_parameters import typer_option_start_time
+from .typer_parameters import typer_option_verbose
+from .typer_parameters import typer_option_warming_target
+from .utilities import parse_locations
+from .utilities import parse_bounding_box
+
+
+READ_BLOCK_SIZE = 1024**2
+
+
+def plan_chunk_keys(
+    mapper,
+    variable: str,
+    locations: Optional[List[Tuple[float, float]]] = None,
+    bounding_box: Optional[Tuple[float, float, float, float]] = None,
+    start_time: Optional[str] = None,
+    end_time: Optional[str] = None,
+) -> List[str]:
+    """Resolve the keys of the chunks a selection of `variable` will read"""
+    with xr.open_dataset(
+        mapper,
+        engine='zarr',
+        backend_kwargs={'consolidated': False},
+        chunks=None,
+        mask_and_scale=False,
+    ) as dataset:
+        dimensions = dataset[variable].dims
+        x, y = get_spatial_dimensions(dimensions)
+        index_ranges = {}
+        points = {}
+
+        if 'time' in dimensions and (start_time or end_time):
+            time_index = dataset.indexes['time']
+            index_ranges['time'] = range_indices(
+                time_index,
+                start_time or time_index.min(),
+                end_time or time_index.max(),
+            )
+        if bounding_box:
+            west, south, east, north = bounding_box
+            index_ranges[x] = range_indices(dataset.indexes[x], west, east)
+            index_ranges[y] = range_indices(dataset.indexes[y], south, north)
+        if locations:
+            longitudes, latitudes = zip(*locations)
+            points[x] = nearest_indices(dataset.indexes[x], longitudes)
+            points[y] = nearest_indices(dataset.indexes[y], latitudes)
+
+    return select_chunk_keys(mapper, variable, index_ranges, points)
+
+
+def advise_byte_ranges(path: str, byte_ranges: List[Tuple[int, int]]) -> int:
+    """Read ahead byte ranges of a local file into the page cache.
+
+    Uses `posix_fadvise(POSIX_FADV_WILLNEED)` where available and falls back
+    to reading the ranges otherwise. Returns the number of bytes warmed.
+    """
+    warmed = 0
+    file_descriptor = os.open(path, os.O_RDONLY)
+    try:
+        for offset, length in byte_ranges:
+            if hasattr(os, 'posix_fadvise'):
+                os.posix_fadvise(file_descriptor, offset, length, os.POSIX_FADV_WILLNEED)
+            else:
+                for block in range(offset, offset + length, READ_BLOCK_SIZE):
+                    os.pread(file_descriptor, min(READ_BLOCK_SIZE, offset + length - block), block)
+            warmed += length
+    finally:
+        os.close(file_descriptor)
+    return warmed
+
+
+def warm_page_cache(
+    byte_ranges: List[Tuple[str, str, int, int]],
+    workers: int = 8,
+) -> Tuple[int, List[str]]:
+    """Read ahead the byte ranges of local source files in parallel, one
+    worker per file. Returns the bytes warmed and the skipped remote URLs."""
+    ranges_per_path = defaultdict(list)
+    skipped = set()
+    for _, url, offset, length in byte_ranges:
+        filesystem, path = fsspec.core.url_to_fs(url)
+        if 'file' not in filesystem.protocol:
+            skipped.add(url)
+            continue
+        ranges_per_path[path].append((offset, length))
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        warmed = executor.map(
+            lambda item: advise_byte_ranges(item[0], coalesce_byte_ranges(item[1])),
+            ranges_per_path.items(),
+        )
+        return sum(warmed), sorted(skipped)
+
+
+def warm(
+    reference: Annotated[Path, typer.Argument(help='JSON or Parquet Kerchunk reference set')],
+    variable: Annotated[str, typer.Argument(help='Variable to warm the chunks of')],
+    locations: Annotated[Optional[List[str]], typer_option_locations] = None,
+    locations_file: Annotated[Optional[Path], typer_option_locations_file] = None,
+    bounding_box: Annotated[Optional[str], typer_option_bounding_box] = None,
+    start_time: Annotated[Optional[str], typer_option_start_time] = None,
+    end_time: Annotated[Optional[str], typer_option_end_time] = None,
+    target: Annotated[WarmingTarget, typer_option_warming_target] = WarmingTarget.page_cache,
+    disk_cache_directory: Annotated[Optional[Path], typer_option_disk_cache_directory] = None,
+    disk_cache_size: Annotated[int, typer_option_disk_cache_size] = DISK_CACHE_SIZE_DEFAULT,
+    workers: Annotated[int, typer_option_number_of_workers] = 8,
+    dry_run: Annotated[bool, typer_option_dry_run] = False,
+    verbose: Annotated[int, typer_option_verbose] = VERBOSE_LEVEL_DEFAULT,
+):
+    """Read ahead the chunks a selection over locations or a bounding box
+    and a time range will need"""
+    if target == WarmingTarget.disk_cache and not disk_cache_directory:
+        raise typer.BadParameter('Warming the disk cache requires a `--disk-cache-directory`')
+
+    mapper = open_reference_mapper(reference=reference)
+    keys = plan_chunk_keys(
+        mapper=mapper,
+        variable=variable,
+        locations=parse_locations(locations, locations_file),
+        bounding_box=parse_bounding_box(bounding_box) if bounding_box else None,
+        start_time=start_time,
+        end_time=end_time,
+    )
+    byte_ranges = get_byte_ranges(mapper.fs.references, keys)
+    total_bytes = sum(length for *_, length in byte_ranges)
+    logger.info(f'Planned {len(keys)} chunks of {variable}, {len(byte_ranges)} byte ranges, {total_bytes} bytes')
+
+    if dry_run:
+        print(f"[bold]Dry run[/bold] of [bold]operations that would be performed[/bold]:")
+        print(f"> Warming {len(byte_ranges)} chunks of [code]{variable}[/code], {naturalsize(total_bytes, binary=True)}, into the {target.value}")
+        if verbose:
+            for key, url, offset, length in byte_ranges:
+                print(f"  {key} : {url} [{offset}, {offset + length})")
+        return  # Exit for a dry run
+
+    mode = DisplayMode(verbose)
+    with display_context[mode]:
+        if target == WarmingTarget.page_cache:
+            warmed_bytes, skipped = warm_page_cache(byte_ranges, workers=workers)
+        else:
+            skipped = []
+            cache = ByteRangeCache(cache_directory=disk_cache_directory, maximum_size=disk_cache_size)
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                warmed_bytes = sum(executor.map(lambda byte_range: len(fetch_byte_range(cache, *byte_range[1:])), byte_ranges))
+
+    print(f"{check_mark} Warmed {len(byte_ranges)} chunks of [code]{variable}[/code], {naturalsize(warmed_bytes, binary=True)}, into the {target.value}")
+    if skipped:
+        print(f"{x_mark} Skipped {len(skipped)} remote source files, consider [code]--target disk-cache[/code]")
+    if verbose and target == WarmingTarget.disk_cache:
+        print(cache.statistics())
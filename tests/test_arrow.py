@@ -0,0 +1,43 @@
+import numpy as np
+import pandas as pd
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+import xarray as xr
+from rekx.arrow import numpy_to_arrow
+from rekx.arrow import to_arrow
+
+
+def series(longitude, latitude):
+    return xr.DataArray(
+        np.arange(24, dtype='float32'),
+        dims='time',
+        coords={
+            'time': pd.date_range('2020-01-01', periods=24, freq='h'),
+            'lon': longitude,
+            'lat': latitude,
+        },
+        name='SIS',
+    )
+
+
+def test_numpy_to_arrow_does_not_copy():
+    values = np.arange(8.0)
+    array = numpy_to_arrow(values)
+    assert array.buffers()[1].address == values.ctypes.data
+    assert array.to_pylist() == values.tolist()
+
+
+def test_to_arrow_parquet(tmp_path):
+    path = tmp_path / 'series.parquet'
+    to_arrow(series(8.5, 45.5), path, compression='zstd')
+    table = pq.read_table(path)
+    assert table.column_names == ['time', 'SIS']
+    assert table.schema.metadata[b'lon'] == b'8.5'
+
+
+def test_to_arrow_partitioned_batch(tmp_path):
+    to_arrow([series(8.5, 45.5), series(9.5, 46.5)], tmp_path / 'dataset')
+    to_arrow(series(10.5, 47.5), tmp_path / 'dataset', partition=True)
+    dataset = ds.dataset(tmp_path / 'dataset', partitioning='hive')
+    assert len(dataset.files) == 3
+    assert dataset.to_table().num_rows == 72
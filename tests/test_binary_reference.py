@@ -0,0 +1,83 @@
+import json
+import numpy as np
+import pytest
+from rekx.binary_reference import BinaryReferences
+from rekx.binary_reference import convert_references
+from rekx.binary_reference import load_references
+from rekx.binary_reference import write_binary_references
+
+
+REFERENCES = {
+    'version': 1,
+    'refs': {
+        '.zgroup': '{"zarr_format":2}',
+        'time/.zarray': json.dumps({'shape': [4], 'chunks': [4], 'dtype': '<f8'}),
+        'time/.zattrs': '{"_ARRAY_DIMENSIONS":["time"]}',
+        'time/0': 'base64:AAAAAAAAAAA=',
+        'SIS/.zarray': json.dumps({'shape': [4, 10, 10], 'chunks': [1, 5, 5], 'dtype': '<f4'}),
+        'SIS/.zattrs': '{"_ARRAY_DIMENSIONS":["time","lat","lon"]}',
+        'SIS/0.0.0': ['file:///data/SISin2020.nc', 100, 80],
+        'SIS/3.1.1': ['file:///data/SISin2021.nc', 200, 90],
+        'SIS/2.0.1': ['file:///data/SISin2020.nc', 300, 70],
+    },
+}
+
+
+def test_binary_references(tmp_path):
+    output = write_binary_references(REFERENCES, tmp_path / 'references.rekx')
+    references = BinaryReferences(output)
+    assert references.paths == ['file:///data/SISin2020.nc', 'file:///data/SISin2021.nc']
+    assert references.lookup('SIS', (3, 1, 1)) == ['file:///data/SISin2021.nc', 200, 90]
+    assert references.lookup('SIS', (1, 0, 0)) is None
+    assert references['time/0'] == 'base64:AAAAAAAAAAA='
+    assert references['.zgroup'] == '{"zarr_format":2}'
+    assert 'SIS/1.0.0' not in references
+    assert len(references) == len(REFERENCES['refs'])
+    assert references.to_references() == REFERENCES
+
+
+def test_load_references(tmp_path):
+    json_references = tmp_path / 'references.json'
+    json_references.write_text(json.dumps(REFERENCES))
+    assert load_references(json_references) == REFERENCES
+    output = write_binary_references(load_references(json_references), tmp_path / 'references.rekx')
+    assert load_references(output) == REFERENCES
+
+
+def write_source(tmp_path):
+    """Write a small NetCDF file and return its Kerchunk references and values"""
+    netCDF4 = pytest.importorskip('netCDF4')
+    from kerchunk.hdf import SingleHdf5ToZarr
+
+    values = np.random.default_rng(0).random((6, 4, 5)).astype('float32')
+    source = tmp_path / 'SISin2020.nc'
+    with netCDF4.Dataset(source, 'w') as dataset:
+        for dimension, length in zip(('time', 'lat', 'lon'), values.shape):
+            dataset.createDimension(dimension, length)
+            dataset.createVariable(dimension, 'f8', (dimension,))[:] = np.arange(length)
+        variable = dataset.createVariable('SIS', 'f4', ('time', 'lat', 'lon'), chunksizes=(2, 4, 5), compression='zlib')
+        variable[:] = values
+    return SingleHdf5ToZarr(str(source), inline_threshold=0).translate(), values
+
+
+def test_convert_references_roundtrip(tmp_path):
+    import xarray as xr
+    from rekx.cache import open_reference_mapper
+    from rekx.parquet import write_parquet_references
+
+    references, values = write_source(tmp_path)
+    references = json.loads(json.dumps(references))  # as read from a JSON file
+    parquet = tmp_path / 'references.parquet'
+    write_parquet_references(references, parquet)
+    convert_references(parquet, tmp_path / 'references.json')
+    convert_references(tmp_path / 'references.json', tmp_path / 'references.rekx')
+    convert_references(tmp_path / 'references.rekx', tmp_path / 'roundtrip.parquet')
+    expected = load_references(tmp_path / 'references.json')
+    assert expected['refs'].keys() == references['refs'].keys()
+    for output in ('references.rekx', 'roundtrip.parquet'):
+        assert load_references(tmp_path / output) == expected
+
+    mapper = open_reference_mapper(tmp_path / 'references.rekx')
+    assert isinstance(mapper.fs.references, BinaryReferences)
+    with xr.open_dataset(mapper, engine='zarr', backend_kwargs={'consolidated': False}, chunks=None) as dataset:
+        np.testing.assert_array_equal(dataset['SIS'].values, values)
@@ -0,0 +1,133 @@
+import json
+import numpy as np
+import pytest
+from rekx.cache import ChunkCache
+from rekx.cache import collect_cache_statistics
+from rekx.cache import fingerprint_reference
+from rekx.cache import get_chunk_cache
+from rekx.cache import open_reference_mapper
+
+
+def test_chunk_cache_evicts_least_recently_used():
+    cache = ChunkCache(maximum_size=32)
+    cache.put(('reference', 'SIS', '0.0.0'), np.zeros(2))
+    cache.put(('reference', 'SIS', '0.0.1'), np.ones(2))
+    assert cache.get(('reference', 'SIS', '0.0.0')) is not None
+    cache.put(('reference', 'SIS', '0.0.2'), np.ones(2))
+    assert cache.get(('reference', 'SIS', '0.0.1')) is None
+    assert cache.statistics()['Evictions'] == 1
+    assert cache.hits == 1
+    assert cache.misses == 1
+
+
+def test_chunk_cache_spills_to_directory(tmp_path):
+    cache = ChunkCache(maximum_size=16, cache_directory=tmp_path)
+    cache.put(('reference', 'SIS', '0.0.0'), np.arange(2.0))
+    cache.put(('reference', 'SIS', '0.0.1'), np.arange(2.0))
+    chunk = cache.get(('reference', 'SIS', '0.0.0'))
+    assert np.array_equal(chunk, np.arange(2.0))
+    assert cache.spill_hits == 1
+
+
+def write_reference(tmp_path):
+    """Write a small NetCDF file and its Kerchunk reference set"""
+    netCDF4 = pytest.importorskip('netCDF4')
+    from kerchunk.hdf import SingleHdf5ToZarr
+
+    values = np.random.default_rng(0).random((6, 4, 5)).astype('float32')
+    source = tmp_path / 'SISin2020.nc'
+    with netCDF4.Dataset(source, 'w') as dataset:
+        for dimension, length in zip(('time', 'lat', 'lon'), values.shape):
+            dataset.createDimension(dimension, length)
+            dataset.createVariable(dimension, 'f8', (dimension,))[:] = np.arange(length)
+        variable = dataset.createVariable('SIS', 'f4', ('time', 'lat', 'lon'), chunksizes=(2, 4, 5), compression='zlib', shuffle=True)
+        variable[:] = values
+    reference = tmp_path / 'SISin2020.json'
+    reference.write_text(json.dumps(SingleHdf5ToZarr(str(source), inline_threshold=0).translate()))
+    return reference, values
+
+
+def test_decompressing_reference_store(tmp_path):
+    import xarray as xr
+
+    reference, values = write_reference(tmp_path)
+    for _ in range(2):
+        store = open_reference_mapper(reference, chunk_cache_size=1024**2)
+        with xr.open_dataset(store, engine='zarr', backend_kwargs={'consolidated': False}, chunks=None) as dataset:
+            np.testing.assert_array_equal(dataset['SIS'].values, values)
+    statistics = collect_cache_statistics(store)['Decompressed chunks']
+    assert statistics['Hits'] >= 3  # the chunks of SIS, read again
+    assert get_chunk_cache(1024**2).get((fingerprint_reference(reference), 'SIS', '0.0.0')) is not None
+
+    reference.write_text(reference.read_text() + ' ')  # regenerated
+    assert fingerprint_reference(reference) != store.reference
+
+
+def test_chunk_cache_bounds_spilled_chunks(tmp_path):
+    cache = ChunkCache(maximum_size=16, cache_directory=tmp_path, maximum_spill_size=400)
+    for index in range(8):
+        cache.put(('reference', 'SIS', f'{index}.0.0'), np.arange(2.0))
+    spilled = sum(path.stat().st_size for path in tmp_path.glob('*.npy'))
+    assert 0 < spilled <= 400
+
+
+def test_byte_range_cache_invalidates_changed_sources(tmp_path):
+    from rekx.disk_cache import ByteRangeCache
+
+    source = tmp_path / 'source.nc'
+    source.write_bytes(b'0123456789')
+    url = f'file://{source}'
+    cache = ByteRangeCache(cache_directory=tmp_path / 'cache')
+    cache.put(url, 2, 4, b'2345')
+    assert cache.get(url, 2, 4) == b'2345'
+
+    source.write_bytes(b'012345678910')
+    cache = ByteRangeCache(cache_directory=tmp_path / 'cache')
+    assert cache.get(url, 2, 4) is None
+    assert cache.invalidations == 1
+
+
+def test_caching_byte_range_store(tmp_path):
+    import xarray as xr
+
+    reference, values = write_reference(tmp_path)
+    for _ in range(2):
+        store = open_reference_mapper(reference, disk_cache_directory=tmp_path / 'cache')
+        with xr.open_dataset(store, engine='zarr', backend_kwargs={'consolidated': False}, chunks=None) as dataset:
+            np.testing.assert_array_equal(dataset['SIS'].values, values)
+    statistics = collect_cache_statistics(store)['Local byte ranges']
+    assert statistics['Misses'] == 0 and statistics['Hits'] >= 3
+
+    store = open_reference_mapper(reference, chunk_cache_size=1024**2, disk_cache_directory=tmp_path / 'cache')
+    with xr.open_dataset(store, engine='zarr', backend_kwargs={'consolidated': False}, chunks=None) as dataset:
+        np.testing.assert_array_equal(dataset['SIS'].values, values)
+    assert list(collect_cache_statistics(store)) == ['Decompressed chunks', 'Local byte ranges']
+
+
+def test_warm_disk_cache(tmp_path):
+    from rekx.disk_cache import ByteRangeCache
+    from rekx.disk_cache import warm_disk_cache
+
+    reference, _ = write_reference(tmp_path)
+    warm_disk_cache(reference, tmp_path / 'cache', variable='SIS', workers=4)
+    cache = ByteRangeCache(cache_directory=tmp_path / 'cache')
+    assert len(list(cache.entries())) == 3
+
+
+def test_warm_disk_cache_target(tmp_path):
+    from rekx.disk_cache import ByteRangeCache
+    from rekx.models import WarmingTarget
+    from rekx.warm import warm
+
+    reference, _ = write_reference(tmp_path)
+    warm(
+        reference,
+        'SIS',
+        locations=['2,1'],
+        start_time=None,
+        end_time=None,
+        target=WarmingTarget.disk_cache,
+        disk_cache_directory=tmp_path / 'cache',
+    )
+    cache = ByteRangeCache(cache_directory=tmp_path / 'cache')
+    assert len(list(cache.entries())) == 3  # a location across all time chunks
@@ -0,0 +1,72 @@
+import json
+import numpy as np
+import pandas as pd
+import pytest
+import xarray as xr
+from rekx.chunks import chunk_runs
+from rekx.chunks import coalesce_byte_ranges
+from rekx.chunks import range_indices
+from rekx.chunks import select_chunk_keys
+from rekx.chunks import select_time_chunks
+
+
+def test_select_chunk_keys():
+    mapper = {
+        'SIS/.zarray': json.dumps({'chunks': [24, 10, 10], 'shape': [48, 40, 50]}).encode(),
+        'SIS/.zattrs': json.dumps({'_ARRAY_DIMENSIONS': ['time', 'lat', 'lon']}).encode(),
+    }
+    keys = select_chunk_keys(
+        mapper,
+        'SIS',
+        index_ranges={'time': (20, 30)},
+        points={'lon': [5, 9, 45], 'lat': [0, 3, 39]},
+    )
+    assert keys == ['SIS/0.0.0', 'SIS/0.3.4', 'SIS/1.0.0', 'SIS/1.3.4']
+
+
+def test_coalesce_byte_ranges():
+    assert coalesce_byte_ranges([(10, 5), (0, 10), (20, 5)]) == [(0, 15), (20, 5)]
+    assert coalesce_byte_ranges([(10, 5), (0, 10), (20, 5)], gap=5) == [(0, 25)]
+
+
+def test_select_time_chunks():
+    time = pd.date_range('2000-01-01', periods=100, freq='h')
+    data_array = xr.DataArray(np.arange(100), dims='time', coords={'time': time})
+    data_array.encoding['chunks'] = (24,)
+
+    selection, time_chunks = select_time_chunks(data_array, time[30], time[50])
+    assert selection.equals(data_array.sel(time=slice(time[30], time[50])))
+    assert time_chunks == [1, 2]
+
+    selection, time_chunks = select_time_chunks(data_array, end_time=time[10])
+    assert selection.size == 11 and time_chunks == [0]
+
+    timestamps = [time[5] + pd.Timedelta('20min'), time[80]]
+    selection, time_chunks = select_time_chunks(data_array, timestamps=timestamps, method='nearest')
+    assert selection.equals(data_array.sel(time=timestamps, method='nearest'))
+    assert time_chunks == [0, 3]
+
+    with pytest.raises(KeyError):
+        select_time_chunks(data_array, timestamps=timestamps)
+
+    unsorted = [time[90], time[3], time[30], time[3], time[50]]
+    selection, time_chunks = select_time_chunks(data_array, timestamps=unsorted)
+    assert selection.equals(data_array.sel(time=unsorted))
+    assert time_chunks == [0, 1, 2, 3]
+
+    selection, time_chunks = select_time_chunks(data_array, timestamps=time[40])
+    assert selection.equals(data_array.sel(time=time[40])) and time_chunks == [1]
+
+
+def test_range_indices():
+    index = pd.Index([10.0, 20.0, 30.0, 40.0])
+    assert range_indices(index, 15, 40) == (1, 3)
+    assert range_indices(index[::-1], 15, 40) == (0, 2)
+    assert range_indices(pd.Index([30.0, 10.0, 40.0, 20.0]), 15, 35) == (0, 3)
+    with pytest.raises(ValueError):
+        range_indices(index, 41, 50)
+
+
+def test_chunk_runs():
+    assert chunk_runs([0, 1, 2, 5, 6, 9]) == [range(0, 3), range(5, 7), range(9, 10)]
+    assert chunk_runs([]) == []
@@ -0,0 +1,16 @@
+import netCDF4 as nc
+import numpy as np
+from rekx.cluster import estimate_rechunk_memory
+
+
+def test_estimate_rechunk_memory(tmp_path):
+    path = tmp_path / 'SISin2020.nc'
+    with nc.Dataset(path, 'w') as dataset:
+        dataset.createDimension('time', 100)
+        dataset.createDimension('lat', 10)
+        dataset.createDimension('lon', 20)
+        dataset.createVariable('time', 'f8', ('time',))[:] = np.arange(100)
+        dataset.createVariable('SIS', 'f4', ('time', 'lat', 'lon'))[:] = 1
+    assert estimate_rechunk_memory(path, memory=True) == 100 * 8 + 100 * 10 * 20 * 4
+    assert estimate_rechunk_memory(path, time=10, cache_size=0) == 10 * 10 * 20 * 4
+    assert estimate_rechunk_memory(path, time=10, cache_size=1024) == 10 * 10 * 20 * 4 + 1024
@@ -0,0 +1,71 @@
+import numpy as np
+import pytest
+import xarray as xr
+from rekx.compression import benchmark_codecs
+from rekx.compression import decode
+from rekx.compression import encode
+from rekx.compression import get_zarr_codecs
+from rekx.compression import parse_codec
+from rekx.compression import predict_compressed_sizes
+from rekx.compression import sample_blocks
+
+
+@pytest.mark.parametrize('specification', ['zlib:4+shuffle', 'zlib:1', 'zstd:3', 'blosc-lz4:5+shuffle', 'blosc-zstd:5+bitshuffle', 'none'])
+def test_codec_roundtrip(specification):
+    block = np.arange(1000, dtype='int16').reshape(10, 100)
+    pipeline = parse_codec(specification, block.dtype)
+    decoded = np.frombuffer(decode(encode(block, pipeline), pipeline), dtype='int16')
+    np.testing.assert_array_equal(decoded, block.ravel())
+
+
+@pytest.mark.parametrize('specification', ['gzip:4', 'zlib:4+bitshuffle', 'zlib:4+lsd:2'])
+def test_invalid_codec(specification):
+    with pytest.raises(ValueError):
+        parse_codec(specification, 'int16')
+
+
+def test_zarr_codecs():
+    encoding = get_zarr_codecs('zstd:3+shuffle+lsd:2', 'float32')
+    assert [(codec.codec_id, codec.level) for codec in encoding['compressors']] == [('zstd', 3)]
+    assert [codec.codec_id for codec in encoding['filters']] == ['quantize', 'shuffle']
+    assert get_zarr_codecs('none', 'int16') == {'compressors': None, 'filters': None}
+
+
+def test_zarr3_codecs():
+    from zarr.codecs import BloscCodec
+    from zarr.codecs import GzipCodec
+    from zarr.codecs import ZstdCodec
+
+    assert get_zarr_codecs('zstd:3', 'float32', zarr_format=3) == {'compressors': [ZstdCodec(level=3)], 'filters': None}
+    assert get_zarr_codecs('zlib:4', 'float32', zarr_format=3)['compressors'] == [GzipCodec(level=4)]
+    blosc, = get_zarr_codecs('blosc-lz4:5+bitshuffle', 'float32', zarr_format=3)['compressors']
+    assert isinstance(blosc, BloscCodec)
+    assert (blosc.cname.value, blosc.clevel, blosc.shuffle.value, blosc.typesize) == ('lz4', 5, 'bitshuffle', 4)
+
+
+def test_benchmark_codecs():
+    values = np.random.default_rng(1).normal(100, 10, size=(48, 40, 50)).astype('float32')
+    data_array = xr.DataArray(values, dims=('time', 'lat', 'lon'))
+    benchmark = benchmark_codecs(data_array, ['zlib:4+shuffle', 'zlib:4+shuffle+lsd:1'], chunk_shape=(24, 10, 10), repeats=1)
+    assert set(benchmark['Codec']) == {'zlib:4+shuffle', 'zlib:4+shuffle+lsd:1'}
+    lossless, lossy = (benchmark.set_index('Codec').loc[codec] for codec in ('zlib:4+shuffle', 'zlib:4+shuffle+lsd:1'))
+    assert lossless['Maximum error'] == 0
+    assert 0 < lossy['Maximum error'] <= 0.1
+    assert lossy['Ratio'] > lossless['Ratio']
+    assert (benchmark[['Compression', 'Decompression']] > 0).all(axis=None)
+
+
+def test_predict_compressed_sizes():
+    values = np.random.default_rng(0).integers(0, 1000, size=(48, 40, 50)).astype('int16')
+    values[:, :20] = 0
+    data_array = xr.DataArray(values, dims=('time', 'lat', 'lon'))
+    assert [block.shape for block in sample_blocks(data_array, (48, 40, 30), samples=5)] == [(48, 40, 30), (48, 40, 20)]
+
+    predictions = predict_compressed_sizes(data_array, [(24, 10, 10), (48, 40, 50)], ['none', 'zlib:9+shuffle'], samples=3)
+    assert list(predictions['Shape']) == ['24 x 10 x 10', '24 x 10 x 10', '48 x 40 x 50', '48 x 40 x 50']
+    uncompressed = predictions[predictions['Codec'] == 'none']
+    np.testing.assert_allclose(uncompressed['Ratio'], 1)
+    np.testing.assert_allclose(uncompressed['Predicted size'], values.nbytes)
+    compressed = predictions[predictions['Codec'] == 'zlib:9+shuffle'].iloc[1]
+    assert compressed['Ratio'] > 1.5
+    assert compressed['Predicted size'] == pytest.approx(compressed['Compressed chunk size'])
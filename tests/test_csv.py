@@ -0,0 +1,38 @@
+import numpy as np
+import pandas as pd
+import pytest
+import xarray as xr
+from rekx.csv import to_csv
+
+
+@pytest.fixture
+def dataset():
+    return xr.Dataset(
+        {
+            'SIS': ('time', np.arange(6.0)),
+            'SID': ('time', np.arange(6.0) / 2),
+        },
+        coords={
+            'time': pd.date_range('2020-01-01', periods=6, freq='h'),
+            'lon': 8.5,
+            'lat': 45.5,
+        },
+    )
+
+
+@pytest.mark.parametrize('chunks', [None, 2])
+def test_to_csv_multiple_variables(dataset, tmp_path, chunks):
+    path = tmp_path / 'series.csv'
+    if chunks:
+        to_csv(dataset.chunk(time=chunks), path).compute()
+    else:
+        to_csv(dataset, path)
+    written = pd.read_csv(path, index_col='time', parse_dates=True)
+    assert list(written.columns) == ['SIS', 'SID']
+    assert np.allclose(written['SID'], dataset.SID)
+    assert len(written) == 6
+
+
+def test_to_csv_rejects_misaligned_variables(dataset, tmp_path):
+    with pytest.raises(ValueError):
+        to_csv([dataset.SIS, dataset.SID[1:]], tmp_path / 'series.csv')
@@ -0,0 +1,39 @@
+import pytest
+from rekx.journal import Journal
+from rekx.journal import atomic_output
+from rekx.journal import fingerprint
+from rekx.journal import open_journal
+
+
+def test_atomic_output(tmp_path):
+    path = tmp_path / 'reference.json'
+    with atomic_output(path) as temporary:
+        temporary.write_text('{}')
+        assert not path.exists()
+    assert path.read_text() == '{}'
+    with pytest.raises(RuntimeError):
+        with atomic_output(path) as temporary:
+            temporary.write_text('{"partial"')
+            raise RuntimeError
+    assert path.read_text() == '{}'
+    assert list(tmp_path.iterdir()) == [path]
+
+
+def test_journal(tmp_path):
+    source = tmp_path / 'SISin2020.nc'
+    source.write_bytes(b'data')
+    output = tmp_path / 'SISin2020.json'
+    output.write_text('{}')
+    with Journal(tmp_path / 'journal.sqlite', command='reference') as journal:
+        assert journal.pending([source]) == [source]
+        journal.record(source, fingerprint(source), output)
+        assert journal.pending([source]) == []
+        output.unlink()
+        assert journal.pending([source]) == [source]
+    output.write_text('{}')
+    with open_journal('reference', tmp_path, tmp_path / 'journal.sqlite') as journal:
+        assert journal.is_complete(source, fingerprint(source))
+        source.write_bytes(b'changed data')
+        assert not journal.is_complete(source, fingerprint(source))
+    with open_journal('reference', tmp_path, tmp_path / 'journal.sqlite', resume=False) as journal:
+        assert journal.pending([source]) == [source]
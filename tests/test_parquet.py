@@ -0,0 +1,24 @@
+import json
+from rekx.parquet import get_chunk_sort_key
+from rekx.parquet import get_record_size
+
+
+def test_get_record_size():
+    references = {
+        'version': 1,
+        'refs': {
+            'time/.zarray': json.dumps({'shape': [8760], 'chunks': [8760]}),
+            'SIS/.zarray': json.dumps({'shape': [8760, 100, 100], 'chunks': [48, 50, 50]}),
+            'scalar/.zarray': json.dumps({'shape': [], 'chunks': []}),
+        },
+    }
+    assert get_record_size(references) == 183 * 2 * 2
+    references['refs']['SIS/.zarray'] = json.dumps({'shape': [8760, 2600, 2600], 'chunks': [1, 10, 10]})
+    assert get_record_size(references) == 100000
+
+
+def test_get_chunk_sort_key():
+    keys = ['SIS/10.0.0', '.zgroup', 'SIS/2.0.0', 'SIS/.zarray', 'lat/0', 'SIS/2.0.1']
+    assert sorted(keys, key=get_chunk_sort_key) == [
+        '.zgroup', 'SIS/.zarray', 'SIS/2.0.0', 'SIS/2.0.1', 'SIS/10.0.0', 'lat/0',
+    ]
@@ -0,0 +1,173 @@
+from pathlib import Path
+import numpy as np
+import pytest
+from rekx.compression import get_codec_specification
+from rekx.rechunk import build_nccopy_compression_options
+from rekx.rechunk import build_netcdf4_compression_options
+from rekx.rechunk import copy_chunks_in_parallel
+from rekx.rechunk import nccopyBackend
+from rekx.rechunk import NetCDF4Backend
+from rekx.rechunk import ZarrBackend
+
+
+@pytest.mark.parametrize('compression, level, shuffling, expected', [
+    ('zlib', 4, True, "-d 4 -s"),
+    ('none', 4, True, "-d 0"),
+    ('zstd', 3, True, "-d 0 -F '*,32015,3' -s"),
+    ('bzip2', 9, False, "-d 0 -F '*,307,9'"),
+    ('lz4', 5, True, "-d 0 -F '*,32001,0,0,0,0,5,1,1'"),
+    ('blosc_zstd', 5, False, "-d 0 -F '*,32001,0,0,0,0,5,0,5'"),
+])
+def test_nccopy_compression_options(compression, level, shuffling, expected):
+    assert build_nccopy_compression_options(compression, level, shuffling) == expected
+
+
+def test_netcdf4_compression_options():
+    assert build_netcdf4_compression_options('zlib', 4, True) == {'compression': 'zlib', 'complevel': 4, 'shuffle': True}
+    assert build_netcdf4_compression_options('zstd', 3, True) == {'compression': 'zstd', 'complevel': 3}
+    assert build_netcdf4_compression_options('blosc-lz4', 5, True, significant_digits=3) == {
+        'compression': 'blosc_lz4',
+        'complevel': 5,
+        'blosc_shuffle': 1,
+        'significant_digits': 3,
+        'quantize_mode': 'BitGroom',
+    }
+    assert build_netcdf4_compression_options('none', 4, least_significant_digit=2) == {'least_significant_digit': 2}
+    with pytest.raises(ValueError):
+        build_netcdf4_compression_options('gzip', 4)
+    with pytest.raises(ValueError):
+        build_netcdf4_compression_options('zlib', 4, least_significant_digit=2, significant_digits=3)
+
+
+def test_nccopy_command(tmp_path):
+    command = nccopyBackend().rechunk(
+        input=Path('SISin2020.nc'),
+        variables=['SIS'],
+        output_directory=tmp_path,
+        time=48,
+        latitude=32,
+        longitude=32,
+        compression='zstd',
+        compression_level=3,
+        shuffling=True,
+        dry_run=True,
+    )
+    assert "-d 0 -F '*,32015,3' -s" in command
+    assert command.endswith(str(tmp_path / 'SISin2020_48_32_32_zstd_3_shuffled.nc'))
+    with pytest.raises(ValueError):
+        nccopyBackend().rechunk(Path('SISin2020.nc'), ['SIS'], tmp_path, significant_digits=3, dry_run=True)
+
+
+@pytest.mark.parametrize('encoding, expected', [
+    ({'zlib': True, 'complevel': 4, 'shuffle': True}, 'zlib:4+shuffle'),
+    ({'zlib': False, 'zstd': True, 'complevel': 3, 'shuffle': False}, 'zstd:3'),
+    ({'zlib': False, 'blosc': {'compressor': 'blosc_lz4', 'shuffle': 2}, 'complevel': 5}, 'blosc-lz4:5+bitshuffle'),
+    ({'zlib': False}, 'none'),
+])
+def test_codec_specification(encoding, expected):
+    assert get_codec_specification(encoding) == expected
+
+
+def test_zarr_command(tmp_path):
+    command = ZarrBackend().rechunk(
+        input=Path('SISin2020.nc'),
+        variables=['SIS'],
+        output_directory=tmp_path,
+        time=48,
+        latitude=32,
+        longitude=32,
+        compression='blosc_zstd',
+        compression_level=5,
+        shuffling=True,
+        zarr_format=3,
+        shards=[480, 320, 320],
+        dry_run=True,
+    )
+    assert str(tmp_path / 'SISin2020_48_32_32_blosc_zstd_5_shuffled.zarr') in command
+    assert command.endswith('shards [480,320,320] blosc-zstd:5+shuffle')
+    with pytest.raises(ValueError):
+        ZarrBackend().rechunk(Path('SISin2020.nc'), ['SIS'], tmp_path, 48, 32, 32, shards=[100, 64, 64], zarr_format=3, dry_run=True)
+    with pytest.raises(ValueError):
+        ZarrBackend().rechunk(Path('SISin2020.nc'), ['SIS'], tmp_path, 48, 32, 32, shards=[480, 64, 64], zarr_format=2, dry_run=True)
+
+
+def test_copy_chunks_in_parallel(tmp_path):
+    h5py = pytest.importorskip('h5py')
+    values = np.random.default_rng(0).integers(0, 1000, size=(10, 7, 9)).astype('int16')
+    source, target = tmp_path / 'source.nc', tmp_path / 'target.nc'
+    with h5py.File(source, 'w') as file:
+        file.create_dataset('SIS', data=values, chunks=(1, 7, 9))
+    with h5py.File(target, 'w') as file:
+        file.create_dataset('SIS', shape=(0, 7, 9), maxshape=(None, 7, 9), dtype='int16', chunks=(4, 3, 3), compression='gzip', compression_opts=4, shuffle=True)
+    copy_chunks_in_parallel(source, target, {'SIS': ((10, 7, 9), (4, 3, 3), 'zlib:4+shuffle')}, workers=2)
+    with h5py.File(target, 'r') as file:
+        np.testing.assert_array_equal(file['SIS'][:], values)
+
+
+def write_netcdf(path):
+    netCDF4 = pytest.importorskip('netCDF4')
+    values = np.random.default_rng(0).random((10, 7, 9)).astype('float32') * 1000
+    with netCDF4.Dataset(path, 'w') as dataset:
+        for dimension, length in zip(('time', 'lat', 'lon'), values.shape):
+            dataset.createDimension(dimension, None if dimension == 'time' else length)
+            dataset.createVariable(dimension, 'f8', (dimension,))[:] = np.arange(length)
+        variable = dataset.createVariable('SIS', 'f4', ('time', 'lat', 'lon'), chunksizes=(1, 7, 9), compression='zlib')
+        variable[:] = values
+    return values
+
+
+@pytest.mark.parametrize('compression', ['zlib', 'zstd', 'bzip2', 'blosc_lz4'])
+@pytest.mark.parametrize('workers', [1, 2])
+def test_netcdf4_rechunk(tmp_path, compression, workers):
+    netCDF4 = pytest.importorskip('netCDF4')
+    values = write_netcdf(tmp_path / 'SISin2020.nc')
+    try:
+        with netCDF4.Dataset(tmp_path / 'filter.nc', 'w') as dataset:  # HDF5 plugins found
+            dataset.createDimension('x', 4)
+            dataset.createVariable('x', 'f4', ('x',), compression=compression)[:] = np.arange(4)
+    except RuntimeError:
+        pytest.skip(f'No HDF5 filter plugin for {compression}')
+    output = NetCDF4Backend().rechunk(
+        input=tmp_path / 'SISin2020.nc',
+        variables=['SIS'],
+        output_directory=tmp_path / 'rechunked',
+        time=4,
+        latitude=3,
+        longitude=3,
+        compression=compression,
+        compression_level=3,
+        shuffling=True,
+        workers=workers,
+    )
+    with netCDF4.Dataset(output) as dataset:
+        assert dataset['SIS'].chunking() == [4, 3, 3]
+        shuffled = dataset['SIS'].filters()['shuffle'] or bool(dataset['SIS'].filters()['blosc'])
+        np.testing.assert_array_equal(dataset['SIS'][:], values)
+    assert ('_shuffled' in output.name) == shuffled
+
+
+@pytest.mark.parametrize('zarr_format, compression, shards', [
+    (2, 'zlib', None),
+    (2, 'blosc_zstd', None),
+    (3, 'zstd', None),
+    (3, 'zlib', [8, 6, 6]),
+])
+def test_zarr_rechunk(tmp_path, zarr_format, compression, shards):
+    xr = pytest.importorskip('xarray')
+    values = write_netcdf(tmp_path / 'SISin2020.nc')
+    output = ZarrBackend().rechunk(
+        input=tmp_path / 'SISin2020.nc',
+        variables=['SIS'],
+        output_directory=tmp_path / 'rechunked',
+        time=4,
+        latitude=3,
+        longitude=3,
+        compression=compression,
+        compression_level=3,
+        shuffling=True,
+        zarr_format=zarr_format,
+        shards=shards,
+    )
+    with xr.open_zarr(output) as dataset:
+        assert dataset['SIS'].encoding['chunks'] == (4, 3, 3)
+        np.testing.assert_array_equal(dataset['SIS'].values, values)
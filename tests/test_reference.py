@@ -0,0 +1,128 @@
+import json
+from rekx.models import Executor
+from rekx.reference import benchmark_reference_executors
+from rekx.reference import create_single_reference
+from rekx.reference import create_synthetic_archive
+from rekx.reference import encode_inline_data
+from rekx.reference import get_coordinate_variables
+from rekx.reference import get_reference_options_digest
+from rekx.reference import inline_coordinates
+
+
+def test_create_single_reference(tmp_path):
+    file_path, = create_synthetic_archive(tmp_path / 'archive', files=1, time=4, latitude=8, longitude=8)
+    output_file = create_single_reference(file_path, tmp_path)
+    references = json.loads(open(output_file).read())
+    assert 'variable_0/.zarray' in references['refs']
+
+
+def test_benchmark_reference_executors(tmp_path):
+    file_paths = create_synthetic_archive(tmp_path, files=4, time=4, latitude=8, longitude=8, variables=1)
+    benchmark = benchmark_reference_executors(
+        file_paths,
+        executors=[Executor.thread, Executor.serial],
+        workers=2,
+        repeats=1,
+    )
+    assert set(benchmark['Executor']) == {'thread', 'serial'}
+    assert (benchmark['Failed'] == 0).all()
+
+
+def test_inline_coordinates(tmp_path):
+    data_file = tmp_path / 'data.bin'
+    data_file.write_bytes(b'header' + bytes(range(256)) + b'0123')
+    references = {
+        'version': 1,
+        'refs': {
+            '.zgroup': '{"zarr_format":2}',
+            'time/.zattrs': '{"_ARRAY_DIMENSIONS":["time"],"bounds":"time_bnds"}',
+            'time/0': [f'file://{data_file}', 6, 256],
+            'time_bnds/.zattrs': '{"_ARRAY_DIMENSIONS":["time","nv"]}',
+            'time_bnds/0.0': [f'file://{data_file}', 262, 4],
+            'SIS/.zattrs': '{"_ARRAY_DIMENSIONS":["time","lat","lon"]}',
+            'SIS/0.0.0': [f'file://{data_file}', 0, 6],
+        },
+    }
+    assert get_coordinate_variables(references) == {'time', 'time_bnds'}
+    inline_coordinates(references)
+    refs = references['refs']
+    assert refs['time/0'] == encode_inline_data(bytes(range(256)))
+    assert refs['time/0'].startswith('base64:')
+    assert refs['time_bnds/0.0'] == '0123'
+    assert refs['SIS/0.0.0'] == [f'file://{data_file}', 0, 6]
+
+
+def test_create_single_reference_pruned(tmp_path):
+    import fsspec
+    import numpy as np
+    import xarray as xr
+    from datetime import datetime
+
+    file_path, = create_synthetic_archive(tmp_path / 'archive', files=1, time=48, latitude=8, longitude=8, variables=2)
+    output_file = create_single_reference(
+        file_path,
+        tmp_path,
+        variables=['variable_0'],
+        start_time=datetime(2000, 1, 1, 10),
+        end_time=datetime(2000, 1, 1, 19),
+    )
+    references = json.loads(open(output_file).read())
+    assert not any(key.startswith('variable_1/') for key in references['refs'])
+    mapper = fsspec.filesystem('reference', fo=references).get_mapper('')
+    with xr.open_dataset(mapper, engine='zarr', consolidated=False) as dataset, xr.open_dataset(file_path) as source:
+        assert set(dataset.data_vars) == {'variable_0'}
+        expected = source['variable_0'].sel(time=slice('2000-01-01T10', '2000-01-01T19'))
+        np.testing.assert_array_equal(dataset['time'].values, expected['time'].values)
+        np.testing.assert_array_equal(dataset['variable_0'].values, expected.values)
+    assert create_single_reference(
+        file_path,
+        tmp_path / 'outside',
+        start_time=datetime(2001, 1, 1),
+    ) is None
+
+
+def test_create_parquet_stores_outside_period(tmp_path):
+    from datetime import datetime
+    from rekx.journal import open_journal
+    from rekx.parquet import create_multiple_parquet_stores
+    from rekx.parquet import create_single_parquet_store
+
+    file_paths = create_synthetic_archive(tmp_path / 'archive', files=3, time=24, latitude=8, longitude=8, variables=1)
+    assert create_single_parquet_store(
+        file_paths[0],
+        tmp_path,
+        start_time=datetime(2001, 1, 1),
+    ) is None
+    assert not list(tmp_path.glob('*.parquet'))
+
+    output_directory = tmp_path / 'parquet'
+    start_time, end_time = datetime(2000, 1, 2, 6), datetime(2000, 1, 2, 18)
+    create_multiple_parquet_stores(
+        tmp_path / 'archive',
+        output_directory,
+        start_time=start_time,
+        end_time=end_time,
+        executor=Executor.serial,
+    )
+    assert [path.name for path in output_directory.glob('*.parquet')] == [f'{file_paths[1].stem}.parquet']
+    options = get_reference_options_digest(start_time=start_time, end_time=end_time)
+    with open_journal(f'reference-multi-parquet-{options}', output_directory) as journal:
+        assert journal.pending(file_paths) == []
+
+def test_combine_kerchunk_references_options(tmp_path):
+    from rekx.combine import combine_kerchunk_references
+
+    file_paths = create_synthetic_archive(tmp_path / 'archive', files=2, time=4, latitude=8, longitude=8, variables=1)
+    (tmp_path / 'references').mkdir()
+    for file_path in file_paths:
+        create_single_reference(file_path, tmp_path / 'references', inline_threshold=0, inline_coordinate_variables=False)
+    combined_reference = tmp_path / 'combined.json'
+    combine_kerchunk_references(tmp_path / 'references', combined_reference=combined_reference)
+    assert isinstance(json.loads(combined_reference.read_text())['refs']['lat/0'], str)
+    combine_kerchunk_references(
+        tmp_path / 'references',
+        combined_reference=combined_reference,
+        inline_threshold=0,
+        inline_coordinates=False,
+    )
+    assert isinstance(json.loads(combined_reference.read_text())['refs']['lat/0'], list)
@@ -0,0 +1,41 @@
+import numpy as np
+import pandas as pd
+import pytest
+import xarray as xr
+from rekx.arrow import data_array_to_arrow_table
+from rekx.resample import resample_series
+
+
+@pytest.fixture
+def series():
+    values = np.random.default_rng(11).normal(200, 50, 24 * 100)
+    values[5] = np.nan
+    return xr.DataArray(
+        values,
+        dims='time',
+        coords={'time': pd.date_range('2000-01-01', periods=values.size, freq='h'), 'lon': 4.5, 'lat': 50.0},
+        name='SIS',
+    )
+
+
+@pytest.mark.filterwarnings('error::RuntimeWarning')
+@pytest.mark.parametrize('frequency', ['D', 'MS', '3h', 'W'])
+@pytest.mark.parametrize('chunks', [None, 500])
+def test_resample_matches_pandas(series, frequency, chunks):
+    data_array = series.chunk(time=chunks) if chunks else series
+    resampled = resample_series(data_array, frequency, how='mean,max,std,count', block_size=333)
+    expected = series.to_series().resample(frequency)
+    np.testing.assert_allclose(resampled['SIS_mean'], expected.mean())
+    np.testing.assert_allclose(resampled['SIS_max'], expected.max())
+    np.testing.assert_allclose(resampled['SIS_std'], expected.std(ddof=0))
+    np.testing.assert_array_equal(resampled['SIS_count'], expected.count())
+    np.testing.assert_array_equal(resampled.time, expected.mean().index.values)
+    assert float(resampled.lon) == 4.5
+
+
+def test_resampled_dataset_to_arrow(series):
+    resampled = resample_series(series, 'D', how='mean,max')
+    table = data_array_to_arrow_table(resampled)
+    assert table.column_names == ['time', 'SIS_mean', 'SIS_max']
+    assert table.num_rows == 100
+    assert table.schema.metadata[b'lat'] == b'50.0'
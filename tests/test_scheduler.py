@@ -0,0 +1,43 @@
+from functools import partial
+from rekx.scheduler import get_chunksize
+from rekx.scheduler import get_number_of_workers
+from rekx.scheduler import map_unordered
+from rekx.scheduler import order_by_size
+
+
+def read_size(path, fail_on=None):
+    if path.name == fail_on:
+        raise ValueError(path.name)
+    return len(path.read_bytes())
+
+
+def test_order_by_size(tmp_path):
+    paths = []
+    for name, size in (('small.nc', 1), ('large.nc', 100), ('medium.nc', 10)):
+        path = tmp_path / name
+        path.write_bytes(b'x' * size)
+        paths.append(path)
+    assert [path.name for path in order_by_size(paths)] == ['large.nc', 'medium.nc', 'small.nc']
+
+
+def test_get_number_of_workers():
+    assert get_number_of_workers(3) == 3
+    assert get_number_of_workers(8, tasks=2) == 2
+    assert get_number_of_workers(tasks=0) == 1
+    assert 1 <= get_number_of_workers(memory_per_worker=1) <= get_number_of_workers(memory_per_worker=0)
+    assert get_chunksize(1000, 4) == 62
+    assert get_chunksize(3, 4) == 1
+
+
+def test_map_unordered(tmp_path):
+    paths = []
+    for size in range(1, 9):
+        path = tmp_path / f'{size}.nc'
+        path.write_bytes(b'x' * size)
+        paths.append(path)
+    function = partial(read_size, fail_on='5.nc')
+    results = {path: (result, exception) for path, result, exception in map_unordered(function, paths, workers=2)}
+    assert set(results) == set(paths)
+    assert results[tmp_path / '3.nc'] == (3, None)
+    assert isinstance(results[tmp_path / '5.nc'][1], ValueError)
+    assert list(map_unordered(function, [], workers=2)) == []
@@ -0,0 +1,58 @@
+import numpy as np
+import pandas as pd
+import pytest
+import xarray as xr
+from rekx.statistics import QuantileSketch
+from rekx.statistics import calculate_series_statistics
+from rekx.statistics import calculate_site_statistics
+
+
+@pytest.fixture
+def series():
+    values = np.random.default_rng(7).normal(100, 20, 10_000)
+    values[10] = np.nan
+    return xr.DataArray(
+        values,
+        dims='time',
+        coords={'time': pd.date_range('2000-01-01', periods=values.size, freq='h')},
+    )
+
+
+@pytest.mark.parametrize('chunks', [None, 999])
+def test_streaming_statistics_match_numpy(series, chunks):
+    data_array = series.chunk(time=chunks) if chunks else series
+    statistics = calculate_series_statistics(data_array, block_size=1234)
+    values = series.values
+    assert statistics['Count'] == np.count_nonzero(~np.isnan(values))
+    assert statistics['Min'] == np.nanmin(values)
+    assert statistics['Max'] == np.nanmax(values)
+    assert np.isclose(statistics['Mean'], np.nanmean(values))
+    assert np.isclose(statistics['Variance'], np.nanvar(values))
+    assert statistics['Index of Max'] == np.nanargmax(values)
+    assert statistics['Time of Min'] == series.time.values[np.nanargmin(values)]
+    assert statistics['Start'] == series.time.values[0]
+    assert statistics['End'] == series.time.values[-1]
+
+
+def test_quantile_sketch():
+    values = np.random.default_rng(3).uniform(0, 1, 100_000)
+    sketch = QuantileSketch(size=512)
+    for block in np.array_split(values, 37):
+        sketch.update(block)
+    assert sum(level.size for level in sketch.levels) < 512 * len(sketch.levels)
+    for q in (0.1, 0.5, 0.9):
+        assert abs(sketch.quantile(q) - np.quantile(values, q)) < 0.02
+
+
+@pytest.mark.parametrize('chunks', [None, 1000])
+def test_site_statistics_match_per_series(series, chunks):
+    sites = xr.concat([series, series * 2, series - 50], dim='site').transpose('time', 'site')
+    sites['site'] = ['a', 'b', 'c']
+    data_array = sites.chunk(time=chunks) if chunks else sites
+    table = calculate_site_statistics(data_array, block_size=777)
+    assert list(table.index) == ['a', 'b', 'c']
+    for site in table.index:
+        expected = calculate_series_statistics(sites.sel(site=site))
+        for key in ('Count', 'Min', 'Max', 'Index of Min', 'Time of Max'):
+            assert table.loc[site, key] == expected[key]
+        assert np.isclose(table.loc[site, 'Variance'], expected['Variance'])
@@ -0,0 +1,82 @@
+import numpy as np
+import pandas as pd
+import xarray as xr
+from rekx.suggest import candidate_chunk_lengths
+from rekx.suggest import default_workloads
+from rekx.suggest import pareto_front
+from rekx.suggest import query_index_ranges
+from rekx.suggest import replay_queries
+from rekx.suggest import search_chunking_shapes
+
+
+def test_candidate_chunk_lengths():
+    lengths = candidate_chunk_lengths(100)
+    assert {1, 4, 20, 25, 32, 34, 50, 64, 100} <= set(lengths)
+    assert 30 not in lengths  # 4 chunks as with 25, padding more
+    assert list(candidate_chunk_lengths(100, divisors=[10, 30, 64])) == [10, 64, 100]
+
+
+def test_search_chunking_shapes():
+    variable_shape = (48, 40, 50)
+    candidates = search_chunking_shapes(
+        variable_shape,
+        default_workloads(variable_shape, series=1, maps=0),
+        max_chunk_size=16384,
+    )
+    assert (candidates['Chunk size'] <= 16384).all()
+    row = candidates.query('dim_0 == 24 and dim_1 == 10 and dim_2 == 10').iloc[0]
+    assert row['Chunks'] == 2 * 4 * 5
+    assert row['Chunks read'] == 2  # a full series at one location
+    assert row['Bytes read'] == 2 * 24 * 10 * 10 * 4
+
+
+def test_pareto_front():
+    variable_shape = (48, 40, 50)
+    candidates = search_chunking_shapes(variable_shape, default_workloads(variable_shape))
+    front = pareto_front(candidates)
+    chunks, bytes_read = candidates['Chunks read'].to_numpy(), candidates['Bytes read'].to_numpy()
+    for _, row in front.iterrows():
+        dominating = (chunks <= row['Chunks read']) & (bytes_read <= row['Bytes read'])
+        dominating &= (chunks < row['Chunks read']) | (bytes_read < row['Bytes read'])
+        assert not dominating.any()
+    assert np.all(np.diff(front['Estimated time']) >= 0)
+
+
+def test_replay_queries():
+    rng = np.random.default_rng(5)
+    variable_shape = (48, 40, 50)
+    starts = rng.integers(0, variable_shape, size=(30, 3))
+    stops = np.minimum(starts + rng.integers(0, 30, size=(30, 3)), np.array(variable_shape) - 1)
+    index_ranges = np.stack([starts, stops], axis=-1)
+    chunk_lengths = [np.array([1, 7, 24]), np.array([10, 40]), np.array([3, 50])]
+    chunks_read = replay_queries(index_ranges, chunk_lengths, block_size=7)
+    for i, j, k in np.ndindex(chunks_read.shape):
+        lengths = (chunk_lengths[0][i], chunk_lengths[1][j], chunk_lengths[2][k])
+        expected = sum(
+            np.prod([stop // length - start // length + 1 for (start, stop), length in zip(query, lengths)])
+            for query in index_ranges
+        )
+        assert chunks_read[i, j, k] == expected
+
+
+def test_query_index_ranges():
+    data_array = xr.DataArray(
+        np.zeros((48, 4, 5)),
+        dims=('time', 'lat', 'lon'),
+        coords={
+            'time': pd.date_range('2020-01-01', periods=48, freq='h'),
+            'lat': [30, 40, 50, 60],
+            'lon': [0, 10, 20, 30, 40],
+        },
+    )
+    queries = pd.DataFrame({
+        'lon': [21, np.nan, 0],
+        'lat': [39, np.nan, 30],
+        'start_time': ['2020-01-01 02:30', '2020-01-02', '2021-01-01'],
+        'end_time': [None, '2020-01-02', None],
+    })
+    index_ranges = query_index_ranges(queries, data_array)
+    assert index_ranges.tolist() == [
+        [[3, 47], [1, 1], [2, 2]],
+        [[24, 24], [0, 3], [0, 4]],
+    ]  # the last query selects no timestamp
@@ -0,0 +1,60 @@
+import json
+import zlib
+import numpy as np
+from rekx.verify import get_chunk_entries
+from rekx.verify import sample_entries
+from rekx.verify import verify_references
+
+
+def write_source(path, chunks):
+    """Write compressed chunks one after the other, returning their
+    `(offset, length)`"""
+    ranges = []
+    with open(path, 'wb') as source:
+        for chunk in chunks:
+            data = zlib.compress(chunk.tobytes())
+            ranges.append((source.tell(), len(data)))
+            source.write(data)
+    return ranges
+
+
+def get_references(path, ranges):
+    return {
+        'version': 1,
+        'refs': {
+            '.zgroup': '{"zarr_format":2}',
+            'SIS/.zarray': json.dumps({
+                'shape': [len(ranges), 4],
+                'chunks': [1, 4],
+                'dtype': '<f4',
+                'compressor': {'id': 'zlib', 'level': 1},
+                'filters': None,
+            }),
+            **{
+                f'SIS/{index}.0': [str(path), offset, length]
+                for index, (offset, length) in enumerate(ranges)
+            },
+        },
+    }
+
+
+def test_verify_references(tmp_path):
+    source = tmp_path / 'SISin2020.nc'
+    chunks = [np.arange(4, dtype='<f4') * index for index in range(3)]
+    references = get_references(source, write_source(source, chunks))
+    assert verify_references(references, samples=0).empty
+
+    references['refs']['SIS/1.0'][1] += 1  # moved chunk
+    references['refs']['SIS/2.0'][2] += 1000  # beyond the end of the file
+    corrupt = verify_references(references, samples=0)
+    assert sorted(corrupt['Key']) == ['SIS/1.0', 'SIS/2.0']
+
+
+def test_sample_entries_includes_last_chunk(tmp_path):
+    source = tmp_path / 'SISin2020.nc'
+    chunks = [np.zeros(4, dtype='<f4')] * 10
+    entries = get_chunk_entries(get_references(source, write_source(source, chunks)))
+    sampled = sample_entries(entries, samples=2)
+    assert len(sampled) in (2, 3)
+    assert entries[-1] in sampled
+    assert sample_entries(entries, samples=0) == entries